@@ -1,8 +1,12 @@
+import os
+
 import cv2
 import torch
 import numpy as np
 from PIL import Image
 
+from utils.zones import Zones, load_zones
+
 # Load YOLOv5 model
 model = torch.hub.load('ultralytics/yolov5', 'custom', path='best.pt', source='github')
 
@@ -12,29 +16,40 @@ cap = cv2.VideoCapture(0)
 # Define the classes you want to detect
 classes = ['Drone']
 
-# Initialize the rectangle coordinates
-rectangle_coords = [(50, 50), (250, 50), (250, 250), (50, 250)]
-rectangle_drag = False
-drag_corner = -1
+# Initialize the restricted zones, from a zones JSON file (pixel or normalized coordinates) or one default rectangle
+zone_list = load_zones(os.environ['DRONE_ZONES']) if os.getenv('DRONE_ZONES') else \
+    [{"name": "restricted", "points": [(50, 50), (250, 50), (250, 250), (50, 250)]}]
+zone_list = [{**zone, "points": [tuple(p) for p in zone["points"]]} for zone in zone_list]  # draggable corners
+zones = Zones(zone_list)  # summed-area tables, rebuilt only when a corner is moved
+zone_drag = False
+drag_corner = (-1, -1)
+frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))  # (h, w) for corners
 
 # Function to handle mouse events
 def mouse_event(event, x, y, flags, param):
-    global rectangle_coords, rectangle_drag, drag_corner
+    global zone_drag, drag_corner
 
     if event == cv2.EVENT_LBUTTONDOWN:
-        # Check if the mouse click is near any of the rectangle corners
-        for i, corner in enumerate(rectangle_coords):
-            if abs(corner[0] - x) <= 10 and abs(corner[1] - y) <= 10:
-                rectangle_drag = True
-                drag_corner = i
+        # Check if the mouse click is near any of the zone corners
+        for i, points in enumerate(zones.polygons(frame_shape)):
+            for j, corner in enumerate(points):
+                if abs(corner[0] - x) <= 10 and abs(corner[1] - y) <= 10:
+                    zone_drag = True
+                    drag_corner = (i, j)
+                    break
+            if zone_drag:
                 break
 
     elif event == cv2.EVENT_LBUTTONUP:
-        rectangle_drag = False
+        if zone_drag:
+            zones.set(zone_list)  # rasterize the moved zone once
+        zone_drag = False
 
     elif event == cv2.EVENT_MOUSEMOVE:
-        if rectangle_drag:
-            rectangle_coords[drag_corner] = (x, y)
+        if zone_drag:
+            i, j = drag_corner
+            h, w = frame_shape[:2]
+            zone_list[i]["points"][j] = (x / w, y / h) if zone_list[i].get("normalized") else (x, y)
 
 # Create a window and set the mouse event callback function
 cv2.namedWindow('frame')
@@ -43,6 +58,7 @@ cv2.setMouseCallback('frame', mouse_event)
 while True:
     # Read frame from video source
     ret, frame = cap.read()
+    frame_shape = frame.shape
 
     # Convert the frame to a format that YOLOv5 can process
     img = Image.fromarray(frame[...,::-1])
@@ -50,8 +66,15 @@ while True:
     # Run inference on the frame
     results = model(img, size=640)
 
+    # Box overlap with every zone in O(1) per box and zone, from the summed-area tables
+    if zone_drag:
+        zones.set(zone_list)  # follow the corner being dragged
+    detections = results.xyxy[0].cpu().numpy()
+    hits = zones.hits(detections, frame.shape)
+    restricted = np.zeros(len(zones), dtype=bool)
+
     # Process the results and draw bounding boxes on the frame
-    for result in results.xyxy[0]:
+    for result, hit in zip(detections, hits):
         x1, y1, x2, y2, conf, cls = result.tolist()
         if conf > 0.5 and classes[int(cls)] in classes:
             # Draw the bounding box
@@ -65,20 +88,14 @@ while True:
             text_coords = "({}, {})".format(int((x1 + x2) / 2), int(y2))
             cv2.putText(frame, text_coords, (int(x1), int(y2) + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
 
-            # Check if the drone intersects with or is inside the rectangle
-            if rectangle_coords[0] != rectangle_coords[1]:
-                if any(rectangle_coords[0][0] <= x <= rectangle_coords[2][0] and rectangle_coords[0][1] <= y <= rectangle_coords[2][1] for x, y in
-                    [(x1, y1), (x1, y2), (x2, y1), (x2, y2)]) or \
-                        any(rectangle_coords[0][0] <= x <= rectangle_coords[2][0] and rectangle_coords[0][1] <= y <= rectangle_coords[2][1] for x in range(int(x1), int(x2))
-                            for y in range(int(y1), int(y2))):
-                    # Display a warning message
-                    cv2.putText(frame, "Warning: Drone Detected Under Restricted Area!", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
+            # Check if the drone intersects with or is inside any zone
+            restricted |= hit
 
-    # Draw the rectangle
-    for i in range(4):
-        cv2.circle(frame, rectangle_coords[i], 5, (0, 255, 0), -1)
-        cv2.line(frame, rectangle_coords[i], rectangle_coords[(i+1)%4], (0, 255, 0), 2)
+    # Draw the zones with their draggable corners, and a warning for zones with a drone inside
+    zones.draw(frame, restricted)
+    for points in zones.polygons(frame.shape):
+        for corner in points:
+            cv2.circle(frame, tuple(corner.tolist()), 5, (0, 255, 0), -1)
 
     # Display the resulting frame
     cv2.imshow('frame', frame)
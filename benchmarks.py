@@ -0,0 +1,360 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Benchmark the real-time drone detection path end to end, from simulated cameras to detection decisions.
+
+`detect.run` is driven by 1, 4 and 16 simulated cameras replaying deterministic synthetic video (a sky with moving
+drone-like targets) or recorded video files, at a fixed frame rate. Each camera count runs in its own process and is
+measured after a warmup:
+    sustained FPS       frames decided per second, all cameras together
+    latency p50/p99     glass-to-decision, from a frame leaving its camera to its tracks, events and recording state
+    dropped frames      frames the cameras produced that never got a decision
+    RSS, CPU            peak and mean resident memory, and CPU time of all threads over wall time (100% = one core)
+and the p50/p99 latency of every stage (letterbox, forward, nms, track, ...).
+
+Results are written as JSON. Against the JSON of an earlier run (--baseline), a sustained FPS drop, p99 latency rise or
+dropped frame ratio rise beyond --tolerance is a regression, and the benchmark exits with status 1.
+
+Usage:
+    $ python benchmarks.py --weights best.pt --cameras 1 4 16 --seconds 30
+    $ python benchmarks.py --weights best.pt --replay site1.mp4 site2.mp4 --fps 25 --device 0 --pipeline
+    $ python benchmarks.py --weights best.pt --baseline runs/benchmarks/baseline.json --tolerance 0.1
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import psutil
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
+
+from utils.general import LOGGER, check_requirements, cv2, git_describe, print_args
+from utils.telemetry import METRICS
+
+
+def write_video(path, frames, fps):
+    """Writes BGR `frames` to MJPG video `path` at `fps`, through a temporary file so that interrupted writes are not
+    mistaken for cached videos.
+    """
+    tmp = path.with_name(f"{path.stem}.part{path.suffix}")
+    writer = None
+    for im in frames:
+        if writer is None:
+            writer = cv2.VideoWriter(str(tmp), cv2.VideoWriter_fourcc(*"MJPG"), fps, (im.shape[1], im.shape[0]))
+        writer.write(im)
+    writer.release()
+    tmp.replace(path)
+    return path
+
+
+def synthetic_frames(seconds, fps=30, size=(1280, 720), targets=3, seed=0):
+    """Yields the deterministic frames of a sky with clouds and `targets` drone-like shapes moving on smooth paths."""
+    rng = np.random.RandomState(seed)
+    w, h = size
+    sky = np.linspace((235, 190, 140), (245, 235, 225), h).astype(np.uint8)  # BGR, blue above a pale horizon
+    background = np.ascontiguousarray(np.repeat(sky[:, None], w, axis=1))
+    for x, y, a, b in rng.uniform(0, 1, (8, 4)):  # clouds
+        cv2.ellipse(background, (int(x * w), int(y * h * 0.8)), (int(40 + a * w / 6), int(10 + b * h / 20)), 0, 0, 360,
+                    (250, 250, 250), -1)
+    background = cv2.GaussianBlur(background, (0, 0), 15)
+    paths = rng.uniform(0, 1, (targets, 6))  # x and y frequency and phase, size, shade
+    for n in range(int(seconds * fps)):
+        im, t = background.copy(), n / fps
+        for fx, px, fy, py, s, shade in paths:
+            x = int(w * (0.5 + 0.4 * math.sin(2 * math.pi * ((0.02 + 0.08 * fx) * t + px))))
+            y = int(h * (0.4 + 0.3 * math.sin(2 * math.pi * ((0.02 + 0.08 * fy) * t + py))))
+            r, c = int(6 + 14 * s), (int(20 + 60 * shade),) * 3
+            cv2.line(im, (x - r, y - r // 3), (x + r, y + r // 3), c, 2)  # rotor arms
+            cv2.line(im, (x - r, y + r // 3), (x + r, y - r // 3), c, 2)
+            cv2.circle(im, (x, y), max(r // 3, 2), c, -1)  # body
+        yield im
+
+
+def replay_frames(source, seconds, fps):
+    """Yields `seconds` of the frames of video file `source` at `fps`, looping it and repeating or skipping frames to
+    convert its frame rate.
+    """
+    cap = cv2.VideoCapture(str(source))
+    assert cap.isOpened(), f"Failed to open {source}"
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or fps
+    frames = []
+    while True:
+        success, im = cap.read()
+        if not success:
+            break
+        frames.append(im)
+    cap.release()
+    assert frames, f"No frames in {source}"
+    for n in range(int(seconds * fps)):
+        yield frames[int(n * src_fps / fps) % len(frames)]
+
+
+def prepare_sources(mode, cameras, seconds, fps, size, replay, cache):
+    """Returns the .streams file of `cameras` cached MJPG videos of `mode` 'synthetic' or 'replay', long enough for
+    `seconds`; cameras beyond the distinct videos reuse them.
+    """
+    cache.mkdir(parents=True, exist_ok=True)
+    videos = []
+    for i in range(min(cameras, len(replay) if mode == "replay" else 4)):  # up to 4 distinct synthetic cameras
+        if mode == "replay":
+            path = cache / f"replay_{Path(replay[i]).stem}_{fps}fps_{seconds}s.avi"
+            frames = replay_frames(replay[i], seconds, fps)  # generators, only read if the video is not cached
+        else:
+            path = cache / f"synthetic_{size[0]}x{size[1]}_{fps}fps_{seconds}s_{i}.avi"
+            frames = synthetic_frames(seconds, fps, size, seed=i)
+        if not path.exists():
+            LOGGER.info(f"Writing {path}...")
+            write_video(path, frames, fps)
+        videos.append(path.resolve())
+    streams = cache / f"{mode}_{cameras}.streams"
+    streams.write_text("\n".join(str(videos[i % len(videos)]) for i in range(cameras)) + "\n")
+    return streams
+
+
+def totals(snapshot, name, by=None):
+    """Returns the sum over all labels of counter `name` in a METRICS snapshot, or {label value: sum} by label `by`."""
+    if by is None:
+        return sum(c["value"] for c in snapshot["counters"] if c["name"] == name)
+    out = {}
+    for c in snapshot["counters"]:
+        if c["name"] == name:
+            out[c.get(by)] = out.get(c.get(by), 0) + c["value"]
+    return out
+
+
+def histogram_state():
+    """Returns {name: (window counts, count, sum)} of the METRICS histograms, summed over labels."""
+    state = {}
+    for (name, _), h in list(METRICS.histograms.items()):
+        counts, count, total = state.get(name, (0, 0, 0.0))
+        state[name] = (counts + h.window_counts(), count + h.count, total + h.sum)
+    return state
+
+
+def latencies(before, after):
+    """Returns {name: {count, mean, p50, p99 ms}} of the observations between two `histogram_state()`s."""
+    out = {}
+    for name, (counts, count, total) in after.items():
+        counts0, count0, total0 = before.get(name, (0, 0, 0.0))
+        n = count - count0
+        if n:
+            h = next(h for (k, _), h in METRICS.histograms.items() if k == name)  # all have the same buckets
+            p = h.quantiles((0.5, 0.99), counts - counts0)
+            out[name] = {"count": n, "mean": round((total - total0) / n * 1e3, 3),
+                         "p50": round(p[0] * 1e3, 3), "p99": round(p[1] * 1e3, 3)}
+    return out
+
+
+def measure(source, cameras, fps, seconds, warmup, out, **kwargs):
+    """Runs `detect.run` on `source` in this process until `warmup` + `seconds` of frames were decided, writing the
+    measurements of the last `seconds` to JSON `out`; `kwargs` are passed to `detect.run`.
+    """
+    import detect  # imported by the worker only, after the parent set up its environment
+
+    METRICS.window = 10 * (warmup + seconds) + 3600  # histogram windows never expire during the measurement
+    proc, stop, result = psutil.Process(), threading.Event(), {}
+
+    def sample():
+        while not stop.is_set() and not totals(METRICS.snapshot(), "frames_processed"):
+            stop.wait(0.2)  # model loading and stream startup
+        if stop.wait(warmup):
+            return
+        snapshot, hists, cpu, t0 = METRICS.snapshot(), histogram_state(), proc.cpu_times(), time.time()
+        rss = []
+        while not stop.wait(0.5) and time.time() - t0 < seconds:
+            rss.append(proc.memory_info().rss)
+        elapsed, cpu1, snapshot1 = time.time() - t0, proc.cpu_times(), METRICS.snapshot()
+        processed = totals(snapshot1, "frames_processed") - totals(snapshot, "frames_processed")
+        dropped, dropped1 = totals(snapshot, "frames_dropped", "stage"), totals(snapshot1, "frames_dropped", "stage")
+        offered = cameras * fps * elapsed
+        stages = latencies(hists, histogram_state())
+        result.update(
+            seconds=round(elapsed, 3),
+            framesOffered=round(offered),
+            framesProcessed=round(processed),
+            sustainedFps=round(processed / elapsed, 2),
+            perCameraFps=round(processed / elapsed / cameras, 2),
+            framesDropped=max(round(offered - processed), 0),
+            droppedRatio=round(max(1 - processed / offered, 0), 4),
+            droppedByStage={k: round(v - dropped.get(k, 0)) for k, v in dropped1.items()},
+            framesRepeated=round(totals(snapshot1, "frames_repeated") - totals(snapshot, "frames_repeated")),
+            latencyMs=stages.pop("latency", None),
+            stagesMs=stages,
+            rssMb={"peak": round(max(rss, default=0) / 2**20, 1), "mean": round(np.mean(rss or [0]) / 2**20, 1)},
+            cpuPercent=round((cpu1.user + cpu1.system - cpu.user - cpu.system) / elapsed * 100, 1),
+        )
+        stop.set()
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    detect.run(source=source, view_img=False, stop_event=stop, **kwargs)
+    stop.set()  # the run ended early, i.e. a stream failed
+    thread.join()
+    if torch.cuda.is_available():
+        result["gpuMemMb"] = round(torch.cuda.max_memory_allocated() / 2**20, 1)
+    Path(out).write_text(json.dumps(result or {"error": "run ended before the measurement completed"}, indent=2))
+
+
+def compare(results, baseline, tolerance=0.1):
+    """Returns the regressions of `results` against the results of `baseline` with the same mode and cameras."""
+    old = {(r["mode"], r["cameras"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = old.get((r["mode"], r["cameras"]))
+        if b is None or "error" in r or "error" in b:
+            continue
+        name = f"{r['mode']} x{r['cameras']}"
+        if r["sustainedFps"] < b["sustainedFps"] * (1 - tolerance):
+            regressions.append(f"{name}: sustained FPS {r['sustainedFps']} < baseline {b['sustainedFps']}")
+        p99, p99b = (x["latencyMs"]["p99"] if x.get("latencyMs") else None for x in (r, b))
+        if p99 is not None and p99b is not None and p99 > p99b * (1 + tolerance):
+            regressions.append(f"{name}: p99 latency {p99} ms > baseline {p99b} ms")
+        if r["droppedRatio"] > b["droppedRatio"] + tolerance:
+            regressions.append(f"{name}: dropped ratio {r['droppedRatio']} > baseline {b['droppedRatio']}")
+    return regressions
+
+
+def run(
+    weights=ROOT / "best.pt",  # model path
+    cameras=(1, 4, 16),  # simulated camera counts
+    replay=(),  # recorded video files replayed as cameras, synthetic video only if empty
+    synthetic=None,  # also benchmark synthetic video with replay files, default: only without them
+    fps=30,  # camera frame rate
+    seconds=30,  # measured seconds per camera count
+    warmup=10,  # seconds run before measuring
+    size=(1280, 720),  # synthetic video width, height
+    imgsz=(640, 640),  # inference size (height, width)
+    conf_thres=None,  # confidence threshold, default: DRONE_CONF_THRESHOLD
+    max_det=1000,  # maximum detections per image
+    device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+    half=False,  # use FP16 half-precision inference
+    pipeline=False,  # run the detection stages concurrently
+    motion_gate=False,  # skip inference on frames without motion
+    project=ROOT / "runs/benchmarks",  # results, videos and logs directory
+    output=None,  # results JSON, default: project/benchmark_<time>.json
+    baseline=None,  # results JSON of an earlier run to compare with
+    tolerance=0.1,  # relative FPS drop and p99 latency rise (absolute dropped ratio rise) that is a regression
+):
+    """Benchmarks `detect.run` at each camera count on synthetic and/or replayed video; returns the results dict."""
+    project = Path(project)
+    modes = ["synthetic"] * (synthetic if synthetic is not None else not replay) + ["replay"] * bool(replay)
+    length = math.ceil(warmup + seconds + 120)  # videos outlast model loading, warmup and a slow start
+    results = []
+    for mode in modes:
+        for n in cameras:
+            streams = prepare_sources(mode, n, length, fps, size, replay, project / "videos")
+            name = f"{mode}_{n}"
+            LOGGER.info(f"Benchmarking {mode} video x{n} cameras at {fps} FPS for {warmup}+{seconds}s...")
+            config = dict(source=str(streams), cameras=n, fps=fps, seconds=seconds, warmup=warmup,
+                          out=str(project / f"{name}.json"), weights=str(weights), imgsz=list(imgsz),
+                          conf_thres=conf_thres, max_det=max_det, device=device, half=half, pipeline=pipeline,
+                          motion_gate=motion_gate)
+            config = {k: v for k, v in config.items() if v is not None}
+            (project / f"{name}.json").unlink(missing_ok=True)
+            (project / f"{name}.config.json").write_text(json.dumps(config))
+            env = {**os.environ, "DRONE_PROJECT_ROOT": str((project / "detect").resolve())}  # recordings, events
+            with open(project / f"{name}.log", "w") as log:
+                try:
+                    subprocess.run([sys.executable, str(FILE), "--worker", str(project / f"{name}.config.json")],
+                                   env=env, stdout=log, stderr=subprocess.STDOUT, timeout=length + 600)
+                except subprocess.TimeoutExpired:
+                    pass
+            out = project / f"{name}.json"
+            result = json.loads(out.read_text()) if out.exists() else {"error": f"worker failed, see {name}.log"}
+            results.append({"mode": mode, "cameras": n, "fps": fps, **result})
+            LOGGER.info(summary(results[-1]))
+
+    report = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "system": {
+            "git": git_describe(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu": platform.processor() or platform.machine(),
+            "cpuCount": os.cpu_count(),
+            "ramGb": round(psutil.virtual_memory().total / 2**30, 1),
+            "gpu": torch.cuda.get_device_name(0) if torch.cuda.is_available() and device != "cpu" else None,
+        },
+        "config": dict(weights=str(weights), imgsz=list(imgsz), device=device, half=half, pipeline=pipeline,
+                       motion_gate=motion_gate, replay=[str(x) for x in replay], size=list(size)),
+        "results": results,
+    }
+    if baseline:
+        report["baseline"] = str(baseline)
+        report["regressions"] = compare(results, json.loads(Path(baseline).read_text()), tolerance)
+        for r in report["regressions"]:
+            LOGGER.warning(f"WARNING ⚠️ Regression {r}")
+    output = Path(output or project / f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    output.write_text(json.dumps(report, indent=2))
+    LOGGER.info(f"Results saved to {output}")
+    return report
+
+
+def summary(r):
+    """Returns a one-line summary of benchmark result `r`."""
+    if "error" in r:
+        return f"{r['mode']} x{r['cameras']}: {r['error']}"
+    lat = r["latencyMs"] or {"p50": float("nan"), "p99": float("nan")}
+    return (f"{r['mode']} x{r['cameras']}: {r['sustainedFps']:.1f} FPS ({r['perCameraFps']:.1f}/camera), "
+            f"latency p50/p99 {lat['p50']:.1f}/{lat['p99']:.1f} ms, dropped {r['framesDropped']} "
+            f"({r['droppedRatio']:.1%}), RSS {r['rssMb']['peak']:.0f} MB, CPU {r['cpuPercent']:.0f}%")
+
+
+def parse_opt():
+    """Parses command-line arguments for the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", type=str, default=ROOT / "best.pt", help="model path")
+    parser.add_argument("--cameras", nargs="+", type=int, default=[1, 4, 16], help="simulated camera counts")
+    parser.add_argument("--replay", nargs="*", default=[], help="recorded video files replayed as cameras")
+    parser.add_argument("--synthetic", action="store_true", default=None, help="also benchmark synthetic video")
+    parser.add_argument("--fps", type=int, default=30, help="camera frame rate")
+    parser.add_argument("--seconds", type=float, default=30, help="measured seconds per camera count")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds run before measuring")
+    parser.add_argument("--size", nargs=2, type=int, default=[1280, 720], help="synthetic video width height")
+    parser.add_argument("--imgsz", "--img", "--img-size", nargs="+", type=int, default=[640], help="inference size h,w")
+    parser.add_argument("--conf-thres", type=float, default=None, help="confidence threshold, default from env")
+    parser.add_argument("--max-det", type=int, default=1000, help="maximum detections per image")
+    parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
+    parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
+    parser.add_argument("--pipeline", action="store_true", help="run the detection stages concurrently")
+    parser.add_argument("--motion-gate", action="store_true", help="skip inference on frames without motion")
+    parser.add_argument("--project", default=ROOT / "runs/benchmarks", help="results, videos and logs directory")
+    parser.add_argument("--output", default=None, help="results JSON, default: project/benchmark_<time>.json")
+    parser.add_argument("--baseline", default=None, help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative regression tolerance")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)  # measure one configuration, internal
+    opt = parser.parse_args()
+    opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
+    if not opt.worker:
+        print_args(vars(opt))
+    return opt
+
+
+def main(opt):
+    """Runs the benchmark, or one measurement in a worker process, exiting with status 1 on regressions."""
+    if opt.worker:
+        return measure(**json.loads(Path(opt.worker).read_text()))
+    check_requirements(ROOT / "requirements.txt", exclude=("tensorboard", "thop"))
+    Path(opt.project).mkdir(parents=True, exist_ok=True)
+    report = run(**{k: v for k, v in vars(opt).items() if k != "worker"})
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
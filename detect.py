@@ -4,18 +4,19 @@ Run YOLOv5 detection inference on webcam for drone detection.
 """
 
 import argparse
+import itertools
 import os
-import platform
+import signal
 import sys
+import threading
 from pathlib import Path
-import json
 from datetime import datetime
 import time
-from collections import deque
 import numpy as np
 import cv2
 import torch
-import random
+from flask import Flask
+from flask_cors import CORS
 
 # Setup base directories
 FILE = Path(__file__).resolve()
@@ -41,8 +42,26 @@ from utils.general import (
     print_args,
     scale_boxes,
 )
+from utils.dvr import SegmentRing
+from utils.events import EventBus, add_event_routes
+from utils.eventstore import EventStore, add_store_routes
+from utils.logs import RateLimitedLogger, setup_logging
+from utils.motion import MotionGate
+from utils.pipeline import Pipeline
+from utils.preroll import PrerollBuffer
+from utils.recorder import AsyncRecorder
+from utils.retention import RetentionManager, add_retention_routes, recording_files
+from utils.roi import RoiScheduler
+from utils.snapshots import SnapshotWriter
+from utils.streaming import FrameBroadcaster, add_stream_routes, serve
+from utils.stride import StrideController
+from utils.telemetry import METRICS, add_metrics_routes
+from utils.tiling import Tiler, crop_batch, merge_crops
+from utils.tracker import Tracker
 from utils.plots import Annotator, colors
 from utils.torch_utils import select_device, smart_inference_mode
+from utils.viewer import Viewer
+from utils.zones import Zones, load_zones
 
 # Constants
 CONF_THRESHOLD = float(os.getenv('DRONE_CONF_THRESHOLD', '0.5'))  # 50% confidence threshold
@@ -50,91 +69,148 @@ BUFFER_SECONDS = int(os.getenv('DRONE_BUFFER_SECONDS', '15'))  # Buffer duration
 POST_DETECTION_SECONDS = int(os.getenv('DRONE_POST_DETECTION_SECONDS', '7'))  # Post-detection recording
 RECORDING_EXTENSION = int(os.getenv('DRONE_RECORDING_EXTENSION', '7'))  # Additional recording time
 EXTENSION_WINDOW = int(os.getenv('DRONE_EXTENSION_WINDOW', '2'))  # Extension check window
-SNAPSHOT_PROBABILITY = float(os.getenv('DRONE_SNAPSHOT_PROBABILITY', '0.75'))  # Snapshot probability
+SNAPSHOT_COUNT = int(os.getenv('DRONE_SNAPSHOT_COUNT', '3'))  # Best snapshots kept per recording
+SNAPSHOT_MIN_GAP = int(os.getenv('DRONE_SNAPSHOT_MIN_GAP', '15'))  # Min frames between snapshots of a recording
+PREROLL_BUDGET_MB = int(os.getenv('DRONE_PREROLL_BUDGET_MB', '256'))  # Pre-roll buffer memory budget per camera
+PREROLL_FORMAT = os.getenv('DRONE_PREROLL_FORMAT', 'jpeg')  # Pre-roll storage: 'jpeg', 'raw' or 'dvr' (disk)
+DVR_SECONDS = int(os.getenv('DRONE_DVR_SECONDS', '600'))  # Seconds of video kept on disk per camera with 'dvr'
+DVR_SEGMENT_SECONDS = float(os.getenv('DRONE_DVR_SEGMENT_SECONDS', '4'))  # Duration of each DVR segment file
+DVR_BUDGET_MB = int(os.getenv('DRONE_DVR_BUDGET_MB', '4096'))  # Disk budget of the DVR segments per camera
+LOGS_BUDGET_MB = int(os.getenv('DRONE_LOGS_BUDGET_MB', '0'))  # Disk budget of recordings in LOGS_DIR, 0 for no limit
+LOGS_MAX_AGE_DAYS = float(os.getenv('DRONE_LOGS_MAX_AGE_DAYS', '0'))  # Days recordings are kept, 0 for no limit
+SNAPSHOT_BUDGET_MB = int(os.getenv('DRONE_SNAPSHOT_BUDGET_MB', '0'))  # Disk budget of snapshots, 0 for no limit
+SNAPSHOT_MAX_AGE_DAYS = float(os.getenv('DRONE_SNAPSHOT_MAX_AGE_DAYS', '0'))  # Days snapshots are kept, 0 for no limit
+RECORDER_QUEUE_SIZE = int(os.getenv('DRONE_RECORDER_QUEUE_SIZE', '120'))  # Max frames queued for the recorder
+POSTER_WIDTH = int(os.getenv('DRONE_POSTER_WIDTH', '640'))  # Max width of recording poster JPEGs, 0 to disable
+SPRITE_FRAMES = int(os.getenv('DRONE_SPRITE_FRAMES', '10'))  # Frames in recording preview sprite strips, 0 to disable
+SPRITE_WIDTH = int(os.getenv('DRONE_SPRITE_WIDTH', '160'))  # Width of each sprite strip frame
+RECORD_ANNOTATED = os.getenv('DRONE_RECORD_ANNOTATED', 'true').lower() == 'true'  # Draw detections into recordings
+VIEWER_FPS = float(os.getenv('DRONE_VIEWER_FPS', '15'))  # Max frames per second shown by the viewer
+EVENT_HISTORY = int(os.getenv('DRONE_EVENT_HISTORY', '1000'))  # Events kept for replay to reconnecting clients
+EVENT_UPDATE_INTERVAL = float(os.getenv('DRONE_EVENT_UPDATE_INTERVAL', '1.0'))  # Min seconds between detection updates
+STREAM_FPS = float(os.getenv('DRONE_STREAM_FPS', '15'))  # Max frames per second published to live stream clients
+MOTION_WIDTH = int(os.getenv('DRONE_MOTION_WIDTH', '320'))  # Width of the downscaled frame compared for motion
+MOTION_THRESHOLD = float(os.getenv('DRONE_MOTION_THRESHOLD', '0.0005'))  # Changed-pixel fraction counted as motion
+MOTION_PIXEL_THRESHOLD = int(os.getenv('DRONE_MOTION_PIXEL_THRESHOLD', '25'))  # Gray level change of a moving pixel
+MOTION_FORCE_EVERY = int(os.getenv('DRONE_MOTION_FORCE_EVERY', '30'))  # Frames between forced inferences without motion
+MOTION_HOLD = int(os.getenv('DRONE_MOTION_HOLD', '15'))  # Frames inferred regardless of motion after a detection
+MAX_STRIDE = int(os.getenv('DRONE_MAX_STRIDE', '8'))  # Highest vid_stride the latency controller may select
+STRIDE_HOLD = int(os.getenv('DRONE_STRIDE_HOLD', '30'))  # Frames kept at full rate after a detection
+TILE_OVERLAP = float(os.getenv('DRONE_TILE_OVERLAP', '0.2'))  # Overlap between neighbouring tiles (fraction)
+MAX_TILES = int(os.getenv('DRONE_MAX_TILES', '16'))  # Max tiles per frame, tiles grow beyond --tile-size to stay within
+TILE_FULL_FRAME = os.getenv('DRONE_TILE_FULL_FRAME', 'true').lower() == 'true'  # Add a full-frame view of the frame
+TILE_MERGE = os.getenv('DRONE_TILE_MERGE', 'nms')  # Merge of boxes across tiles: 'nms' or 'fuse' (weighted average)
+TRACK_IOU = float(os.getenv('DRONE_TRACK_IOU', '0.2'))  # Min IoU between a track's predicted box and its detection
+TRACK_MIN_HITS = int(os.getenv('DRONE_TRACK_MIN_HITS', '2'))  # Matched frames before a track is confirmed
+TRACK_MAX_AGE = int(os.getenv('DRONE_TRACK_MAX_AGE', '30'))  # Frames without a match before a track is lost
+ZONE_RESOLUTION = int(os.getenv('DRONE_ZONE_RESOLUTION', '960'))  # Long side of the rasterized zone masks (pixels)
+ZONE_RECORDING = os.getenv('DRONE_ZONE_RECORDING', 'all')  # Drones triggering recordings: 'all' or 'zones' (inside)
+ROI_MAX_CROPS = int(os.getenv('DRONE_ROI_MAX_CROPS', '4'))  # Max target crops per frame, else a full frame
+RECONNECT_MIN = float(os.getenv('DRONE_RECONNECT_MIN', '0.5'))  # Seconds before reopening a lost stream, then doubled
+RECONNECT_MAX = float(os.getenv('DRONE_RECONNECT_MAX', '30'))  # Max seconds between attempts to reopen a lost stream
+STREAM_DEAD_AFTER = float(os.getenv('DRONE_STREAM_DEAD_AFTER', '0'))  # Seconds down before a stream is dropped, 0 never
+PIPELINE_QUEUE_SIZE = int(os.getenv('DRONE_PIPELINE_QUEUE_SIZE', '4'))  # Max packets queued before each pipeline stage
+PIPELINE_STATS_INTERVAL = float(os.getenv('DRONE_PIPELINE_STATS_INTERVAL', '10'))  # Seconds between stage stats logs
+LOG_INTERVAL = float(os.getenv('DRONE_LOG_INTERVAL', '10'))  # Seconds per log rate-limit window, 0 to disable
+LOG_BURST = int(os.getenv('DRONE_LOG_BURST', '5'))  # Track and zone messages per camera and window before sampling
+LOG_FORMAT = os.getenv('DRONE_LOG_FORMAT', 'text')  # Log line format: 'text' or 'json' (structured)
+LOG_QUEUE_SIZE = int(os.getenv('DRONE_LOG_QUEUE_SIZE', '10000'))  # Records queued for the async log writer, 0 for sync
 
 # Directory paths - Using relative paths from project root
 PROJECT_ROOT = Path(os.getenv('DRONE_PROJECT_ROOT', str(FILE.parent)))
 LOGS_DIR = PROJECT_ROOT / 'logs'  # Directory for storing detection videos
 SNAPSHOT_DIR = PROJECT_ROOT / 'drone-detection-app Frontend/public/Image logs'  # Directory for storing snapshots
-
-# Global variables for recording state
-is_recording = False
-recording_start_time = None
-current_video_writer = None
-current_video_path = None
-frames_to_record = 0
-last_detection_time = None
-max_drones_spotted = 0  # New variable to track maximum drones
-
-def save_snapshot(frame, drone_type, confidence, detection_coords=None, frame_info=None):
-    """Save a snapshot of the drone detection with metadata."""
-    try:
-        # Create directories if they don't exist
-        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
-        
-        # Generate filename with timestamp and detection info
-        current_time = datetime.now()
-        timestamp = current_time.strftime("%Y%m%d_%H%M%S")
-        threat_level = "High" if confidence > 0.8 else "Medium" if confidence > 0.65 else "Low"
-        filename = f"drone_snapshot_{timestamp}_{drone_type}_{threat_level}_{confidence:.2f}.jpg"
-        filepath = SNAPSHOT_DIR / filename
-        
-        # Ensure the frame is in the correct format
-        if len(frame.shape) == 2:  # If grayscale
-            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-        
-        # Save the image
-        success = cv2.imwrite(str(filepath), frame)
-        if not success:
-            LOGGER.error(f"Failed to save image to {filepath}")
-            return
-            
-        LOGGER.info(f"Successfully saved snapshot to {filepath}")
-        
-        # Create metadata
-        metadata = {
-            "image": {
-                "filename": filename,
-                "timestamp": current_time.isoformat(),
-                "dimensions": {
-                    "width": frame.shape[1],
-                    "height": frame.shape[0],
-                    "channels": frame.shape[2]
-                },
-                "format": "jpg"
-            },
-            "detection": {
-                "droneType": drone_type,
-                "confidence": float(confidence),
-                "threatLevel": threat_level,
-                "coordinates": detection_coords if detection_coords is not None else [],
-                "frameInfo": frame_info if frame_info is not None else {}
-            },
-            "system": {
-                "captureTime": current_time.isoformat(),
-                "deviceInfo": {
-                    "platform": platform.system(),
-                    "version": platform.version(),
-                    "machine": platform.machine()
-                },
-                "detectionSystem": "YOLOv5"
-            }
-        }
-        
-        # Save metadata with the same name as the image but with .json extension
-        meta_filepath = filepath.with_suffix('.json')
-        with open(meta_filepath, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        LOGGER.info(f"Successfully saved metadata to {meta_filepath}")
-            
-    except Exception as e:
-        LOGGER.error(f"Error saving snapshot: {str(e)}")
-        import traceback
-        LOGGER.error(traceback.format_exc())
-
-def should_extend_recording(frames_to_record, fps):
+EVENT_DB = os.getenv('DRONE_EVENT_DB', str(LOGS_DIR / 'events.db'))  # Indexed event store, empty to disable
+
+# Per-frame and per-detection messages are sampled per key and aggregated over LOG_INTERVAL windows
+RLOGGER = RateLimitedLogger(LOGGER, LOG_INTERVAL)
+
+class RecordingState:
+    """Recording state machine of one camera, updated by record_frame() for every processed frame.
+
+    A camera is `idle` until a drone is tracked, then `recording` for POST_DETECTION_SECONDS, `extended` by
+    RECORDING_EXTENSION seconds while drones keep being detected, and back to `idle` when the recording is handed to the
+    background recorder. Every transition emits a recording-started, recording-extended or recording-stopped event.
+    States share nothing, so any number of cameras can record concurrently in one process.
+    """
+
+    TRANSITIONS = {"idle": ("recording",), "recording": ("extended", "idle"), "extended": ("extended", "idle")}
+    LIFECYCLE_EVENTS = {"recording": "recording-started", "extended": "recording-extended", "idle": "recording-stopped"}
+
+    def __init__(self, name=""):
+        self.name = name  # camera name, appended to recording filenames when set
+        self.phase = "idle"
+        self.extensions = 0  # Extensions of the current recording
+        self.recording_start_time = None
+        self.current_video_path = None
+        self.frames_to_record = 0
+        self.last_detection_time = None
+        self.max_drones_spotted = 0  # Maximum drones tracked at once during the current recording
+        self.track_ids = set()  # Ids of the drones tracked during the current recording
+        self.zones = set()  # Restricted zones entered during the current recording
+        self.last_event_time = None  # Time of the last detection event pushed to the event feed
+
+    @property
+    def is_recording(self):
+        return self.phase != "idle"
+
+    def transition(self, phase, events=None, **data):
+        """Moves to `phase`, pushing the matching lifecycle event with `data` to the EventBus `events` if given."""
+        assert phase in self.TRANSITIONS[self.phase], f"invalid recording transition {self.phase} -> {phase}"
+        previous, self.phase = self.phase, phase
+        if events is not None:
+            events.emit(self.LIFECYCLE_EVENTS[phase], camId=self.name, recording=self.current_video_path.name,
+                        previous=previous, **data)
+
+
+def preroll_buffer(name, fps, on_clip=None):
+    """Returns the pre-roll buffer of camera `name`: a disk-backed DVR SegmentRing with PREROLL_FORMAT 'dvr', calling
+    `on_clip(path, info)` after each clip, else an in-memory PrerollBuffer.
+    """
+    if PREROLL_FORMAT == "dvr":
+        return SegmentRing(LOGS_DIR / "dvr" / (name or "0"), fps, DVR_SEGMENT_SECONDS, DVR_SECONDS, DVR_BUDGET_MB << 20,
+                           name=f"dvr-{name}" if name else "dvr", on_clip=on_clip)
+    return PrerollBuffer(BUFFER_SECONDS, fps, budget=PREROLL_BUDGET_MB << 20, fmt=PREROLL_FORMAT)
+
+
+def stream_metrics(stream, frame_buffer, recorder):
+    """Registers the pull-based metrics of stream `stream`: pre-roll memory (or DVR disk) bytes, recorder queue depth
+    and frames dropped by the recorder and DVR queues.
+    """
+    dvr = isinstance(frame_buffer, SegmentRing)
+    METRICS.gauge("dvr_disk_bytes" if dvr else "preroll_memory_bytes", lambda: frame_buffer.nbytes, stream=stream)
+    METRICS.gauge("queue_depth", lambda: len(recorder.queue), stream=stream, queue="recorder")
+    METRICS.counter("frames_dropped", lambda: recorder.queue.dropped, stream=stream, stage="recorder")
+    if dvr:
+        METRICS.counter("frames_dropped", lambda: frame_buffer.queue.dropped, stream=stream, stage="dvr")
+
+
+def retention_manager():
+    """Returns the RetentionManager keeping LOGS_DIR and SNAPSHOT_DIR within their byte and age budgets."""
+    return RetentionManager(LOGS_DIR / "retention.db", {
+        LOGS_DIR: (LOGS_BUDGET_MB << 20, LOGS_MAX_AGE_DAYS),
+        SNAPSHOT_DIR: (SNAPSHOT_BUDGET_MB << 20, SNAPSHOT_MAX_AGE_DAYS),
+    })
+
+
+def retain_recording(retention, path, meta):
+    """Adds the files of the finalized recording at `path` with metadata `meta` to `retention`."""
+    retention.add(LOGS_DIR, path.stem, recording_files(path, meta), meta.get("threatLevel"))
+
+
+def retain_clip(retention, path):
+    """Adds the DVR clip at `path` to the retention item of its recording."""
+    retention.add(LOGS_DIR, path.stem[: -len("_dvr")], [path])
+
+
+def retain_snapshot(retention, metadata):
+    """Adds the snapshot with `metadata` and its metadata JSON to `retention`."""
+    path = SNAPSHOT_DIR / metadata["image"]["filename"]
+    retention.add(SNAPSHOT_DIR, path.stem, [path, path.with_suffix(".json")], metadata["detection"]["threatLevel"])
+
+
+def should_extend_recording(frames_to_record, fps, last_detection_time):
     """Check if recording should be extended based on recent detections."""
-    global last_detection_time
     if last_detection_time is None:
         return False
     
@@ -144,6 +220,195 @@ def should_extend_recording(frames_to_record, fps):
     
     return seconds_since_last_detection <= EXTENSION_WINDOW and remaining_seconds <= EXTENSION_WINDOW
 
+def preprocess(im, model):
+    """Converts a letterboxed uint8 numpy image or batch into a normalized input tensor on the model device."""
+    im = torch.from_numpy(im).to(model.device)
+    im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
+    im /= 255  # 0 - 255 to 0.0 - 1.0
+    if len(im.shape) == 3:
+        im = im[None]  # expand for batch dim
+    return im
+
+
+def frame_summary(det, shape, names):
+    """Returns the per-image summary string counting the detections `det` of an inference at `shape`."""
+    counts = [(int((det[:, 5] == c).sum()), names[int(c)]) for c in det[:, 5].unique()] if len(det) else []
+    return "%gx%g " % shape[2:] + "".join(f"{n} {name}{'s' * (n > 1)}, " for n, name in counts)
+
+
+def annotate_frame(det, tracks, shape, im0, names, line_thickness=2, draw=True):
+    """Draws the confirmed `tracks` (x1, y1, x2, y2, conf, cls, id in `im0` coordinates) on `im0` if `draw`."""
+    if draw and len(tracks):
+        annotator = Annotator(im0, line_width=line_thickness, example=str(names))
+        for *xyxy, conf, cls, track_id in reversed(tracks.tolist()):
+            c = int(cls)  # integer class
+            # Calculate center coordinates
+            x1, y1, x2, y2 = map(int, xyxy)
+            center_x = (x1 + x2) // 2
+            center_y = (y1 + y2) // 2
+
+            # Draw box and label with class, track id, confidence, and coordinates
+            label = f"{names[c]} #{int(track_id)} {conf:.2f} ({center_x}, {center_y})"
+            annotator.box_label(xyxy, label, color=colors(c, True))
+
+
+def log_track_events(track_events, names, tracks=(), name=""):
+    """Logs drones whose track was just confirmed or lost and warns of drones entering restricted zones, at most
+    LOG_BURST messages of each kind per camera `name` and LOG_INTERVAL, and aggregates the detections of the confirmed
+    `tracks` into one message per track and LOG_INTERVAL.
+    """
+    prefix = f"{name}: " if name else ""
+    for e in track_events:
+        if e["event"] == "new":
+            x1, y1, x2, y2 = map(int, e["box"])
+            RLOGGER.info(
+                ("new", name), "%sDrone detected! Track #%d, Type: %s, Confidence: %.2f, Position: (%d, %d)",
+                prefix, e["id"], names[e["cls"]], e["conf"], (x1 + x2) // 2, (y1 + y2) // 2,
+                burst=LOG_BURST, camId=name, trackId=e["id"],
+            )
+        elif e["event"] == "lost":
+            RLOGGER.info(("lost", name), "%sDrone track #%d lost after %d frames, max confidence %.2f", prefix, e["id"],
+                         e["frames"], e["maxConf"], burst=LOG_BURST, camId=name, trackId=e["id"])
+        elif e["event"] == "zone-entry":
+            RLOGGER.warning(("zone", name, e["zone"]), "WARNING ⚠️ %sDrone track #%d entered restricted zone '%s' "
+                            "(%.0f%% of its box inside)", prefix, e["id"], e["zone"], e["overlap"] * 100,
+                            burst=LOG_BURST, camId=name, trackId=e["id"], zone=e["zone"])
+    msg = "%(prefix)sDrone track #%(trackId)d: %(count)d detections in last %(seconds).0fs, max confidence %(max).2f"
+    for *_, conf, cls, track_id in tracks.tolist() if len(tracks) else ():
+        RLOGGER.count(("track", name, int(track_id)), msg, value=conf, prefix=prefix, camId=name, trackId=int(track_id))
+
+
+def record_frame(
+    state, im0, tracks, track_events, names, fps, frame, frame_buffer, recorder, events=None, snapshots=None
+):
+    """Starts, extends or stops the recording of the camera `state` from the frame's confirmed `tracks` and
+    `track_events` (see Tracker.update() and Zones.update()); `im0` is the annotated frame, `frame_buffer` the pre-roll,
+    `events` an optional EventBus receiving detection and zone events and `snapshots` an optional SnapshotWriter
+    selecting the recording's snapshots.
+    """
+    new = [e for e in track_events if e["event"] == "new"]
+    entries = [e for e in track_events if e["event"] == "zone-entry"]
+    changed = new or entries or any(e["event"] == "lost" for e in track_events)
+    state.zones.update(e["zone"] for e in entries)
+    if len(tracks):
+        # Update max_drones_spotted if more drones are tracked at once than before
+        state.max_drones_spotted = max(state.max_drones_spotted, len(tracks))
+        state.track_ids.update(int(x) for x in tracks[:, 6])
+        max_conf = float(tracks[:, 4].max())
+        state.last_detection_time = datetime.now()
+
+        if not state.is_recording:
+            # Start new recording, named after the most confident tracked drone
+            *_, conf, cls, track_id = tracks[tracks[:, 4].argmax()].tolist()
+            c = int(cls)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            threat_level = "High" if max_conf > 0.8 else "Medium" if max_conf > 0.65 else "Low"
+            suffix = f"_{state.name}" if state.name else ""
+            video_filename = f"drone_detection_{timestamp}_{names[c]}_{threat_level}{suffix}.mp4"
+            state.current_video_path = LOGS_DIR / video_filename
+
+            # Start the recording; the recorder flushes the buffered frames on its own thread
+            w, h = im0.shape[1], im0.shape[0]
+            meta = {
+                "timestamp": datetime.now().isoformat(),
+                "droneType": names[c],
+                "confidence": float(max_conf),
+                "threatLevel": threat_level,
+                "detectionCount": len(tracks),
+                "maxDronesSpotted": state.max_drones_spotted,
+                "coordinates": tracks[:, :4].tolist(),
+                "trackIds": tracks[:, 6].int().tolist(),
+                "zones": sorted(state.zones),
+            }
+            recorder.open(state.current_video_path, fps, (w, h), preroll=frame_buffer.snapshot(), meta=meta)
+
+            state.recording_start_time = datetime.now()
+            state.frames_to_record = int(POST_DETECTION_SECONDS * fps)
+            state.extensions = 0
+            state.transition("recording", events, frame=frame, seconds=POST_DETECTION_SECONDS)
+            if events is not None:
+                events.emit("detection-start", camId=state.name, recording=video_filename, frame=frame, **meta)
+                state.last_event_time = time.time()
+
+        elif events is not None and (changed or time.time() - state.last_event_time >= EVENT_UPDATE_INTERVAL):
+            # Push an update when a track starts or ends, otherwise at most every EVENT_UPDATE_INTERVAL seconds
+            events.emit(
+                "detection-update",
+                camId=state.name,
+                recording=state.current_video_path.name,
+                frame=frame,
+                confidence=max_conf,
+                detectionCount=len(tracks),
+                maxDronesSpotted=state.max_drones_spotted,
+                coordinates=tracks[:, :4].tolist(),
+                trackIds=tracks[:, 6].int().tolist(),
+                zones=sorted(state.zones),
+                tracks=track_events,
+            )
+            state.last_event_time = time.time()
+
+    # Alert dashboard clients of drones entering restricted zones
+    if events is not None:
+        recording = state.current_video_path.name if state.is_recording else None
+        for e in entries:
+            events.emit("zone-intrusion", camId=state.name, recording=recording, frame=frame, trackId=e["id"],
+                        zone=e["zone"], overlap=e["overlap"])
+
+    # Offer the frame as a snapshot candidate of the recording; the best ones are written when it ends
+    if snapshots is not None and state.is_recording and len(tracks):
+        frame_info = {
+            "fps": fps,
+            "frameNumber": frame,
+            "recordingFile": state.current_video_path.name,
+            "trackIds": tracks[:, 6].int().tolist(),
+            "camId": state.name,
+        }
+        snapshots.offer((state.name, state.current_video_path.name), im0, tracks, names, frame_info)
+
+    # Write frame if recording
+    if state.is_recording:
+        recorder.write(im0, float(tracks[:, 4].max()) if len(tracks) else None)
+        state.frames_to_record -= 1
+
+        # Check for recording extension
+        prefix = f"{state.name}: " if state.name else ""
+        if should_extend_recording(state.frames_to_record, fps, state.last_detection_time):
+            state.frames_to_record = int(RECORDING_EXTENSION * fps)
+            state.extensions += 1
+            state.transition("extended", events, frame=frame, seconds=RECORDING_EXTENSION, extensions=state.extensions)
+            RLOGGER.info(("extended", state.name), "%sExtending recording by %d seconds due to recent detection",
+                         prefix, RECORDING_EXTENSION, camId=state.name)
+
+        # Report remaining time, once per LOG_INTERVAL
+        RLOGGER.info(("remaining", state.name), "%sRecording remaining: %ds (recorder queue %.0f%%)", prefix,
+                     state.frames_to_record // fps, recorder.pressure * 100, camId=state.name)
+
+        # Check if recording should end
+        if state.frames_to_record <= 0:
+            close_recording(state, recorder, events, snapshots, frame_buffer, frame=frame)
+            LOGGER.info(f"{prefix}Recording finalizing in background")
+
+
+def close_recording(state, recorder, events=None, snapshots=None, frame_buffer=None, **data):
+    """Finalizes the recording of the camera `state` and its snapshots in the background, pushing a recording-stopped
+    event with `data` to `events` if given, and resets its per-recording statistics. With a DVR `frame_buffer`, the
+    recording with BUFFER_SECONDS of pre-roll is also cut from its segments into `<recording>_dvr.avi`.
+    """
+    if snapshots is not None:
+        snapshots.end((state.name, state.current_video_path.name))
+    stats = dict(maxDronesSpotted=state.max_drones_spotted, tracksSeen=len(state.track_ids), zones=sorted(state.zones))
+    if isinstance(frame_buffer, SegmentRing):
+        clip = state.current_video_path.with_name(f"{state.current_video_path.stem}_dvr.avi")
+        frame_buffer.clip(clip, state.recording_start_time.timestamp() - BUFFER_SECONDS, time.time())
+        stats["dvrClip"] = clip.name
+    recorder.close(**stats)
+    duration = (datetime.now() - state.recording_start_time).total_seconds()
+    state.transition("idle", events, durationSeconds=round(duration, 2), extensions=state.extensions, **stats, **data)
+    state.max_drones_spotted = 0
+    state.track_ids = set()
+    state.zones = set()
+
+
 @smart_inference_mode()
 def run(
     weights=ROOT / "best.pt",  # model path
@@ -163,11 +428,19 @@ def run(
     half=False,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
     vid_stride=1,  # video frame-rate stride
+    pipeline=False,  # run capture/preprocess/infer/postprocess/record as concurrent stages
+    stop_event=None,  # threading.Event stopping the run when set, i.e. by an embedding service
+    stream_port=0,  # serve annotated frames as MJPEG over HTTP on this port, 0 to disable
+    motion_gate=False,  # skip inference on frames without motion
+    latency_budget=0,  # adapt vid_stride per stream to keep end-to-end latency (ms) within this budget, 0 to disable
+    tile_size=0,  # run tiled inference on native-resolution tiles of this size, 0 to disable
+    roi_every=0,  # run full-frame inference every roi_every frames and target crops in between, 0 to disable
+    zones=None,  # restricted zones JSON file, see utils.zones.load_zones()
 ):
-    global is_recording, recording_start_time, current_video_writer, current_video_path, frames_to_record, last_detection_time, max_drones_spotted
-    
     source = str(source)
-    webcam = source.isnumeric()
+    is_file = Path(source).suffix[1:] in (IMG_FORMATS + VID_FORMATS)
+    is_url = source.lower().startswith(("rtsp://", "rtmp://", "http://", "https://"))
+    webcam = source.isnumeric() or source.endswith(".streams") or (is_url and not is_file)  # one stream per source
 
     # Create directories
     try:
@@ -186,187 +459,350 @@ def run(
 
     # Dataloader
     if webcam:
-        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride,
+                              headless=True,  # 'q' is handled by the Viewer
+                              reconnect=(RECONNECT_MIN, RECONNECT_MAX), dead_after=STREAM_DEAD_AFTER,
+                              # batches in use at once: filling, being captured, queued for and in preprocessing
+                              buffers=PIPELINE_QUEUE_SIZE + 3 if pipeline else 2)
         bs = len(dataset)
     else:
         dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
         bs = 1
 
-    # Initialize frame buffer
-    frame_buffer = deque(maxlen=BUFFER_SECONDS * 30)  # Assuming 30 FPS
-
-    # Create CV2 window
-    cv2.namedWindow("Drone Detection", cv2.WINDOW_NORMAL)
-    cv2.resizeWindow("Drone Detection", 1280, 720)
+    # Detection events pushed to dashboard clients, served next to the live stream, and kept in the event store
+    store = EventStore(EVENT_DB) if EVENT_DB else None
+    events = EventBus(EVENT_HISTORY, store) if stream_port or store else None
+
+    # Per-stream frame buffers, sized from the stream fps, recording state machines and background recorders, so
+    # every stream records independently; streams are named by index when there are several. Only every vid_stride-th
+    # frame is delivered, so buffers, recordings and their countdowns run at the delivered fps; frames read at a higher
+    # stride by the latency controller are held in the pre-roll for their capture interval
+    fpss = dataset.fps if webcam else [(dataset.cap.get(cv2.CAP_PROP_FPS) if dataset.cap else 30) or 30]
+    fpss = [fps / vid_stride for fps in fpss]
+    # Recordings and snapshots are indexed as they are written and evicted beyond their byte and age budgets
+    retention = retention_manager()
+    retention.enforce()
+
+    states = [RecordingState(str(i) if bs > 1 else "") for i in range(bs)]
+    frame_buffers = [preroll_buffer(state.name, fps, lambda path, info: retain_clip(retention, path))
+                     for state, fps in zip(states, fpss)]
+
+    def recording_finalized(name):
+        def on_close(path, meta):
+            # Called on the recorder thread once the video and its metadata JSON are on disk
+            retain_recording(retention, path, meta)
+            if events:
+                events.emit("recording-finalized", camId=name, recording=path.name, **meta)
+
+        return on_close
+
+    recorders = [
+        AsyncRecorder(maxsize=RECORDER_QUEUE_SIZE, name=f"recorder-{state.name}" if state.name else "recorder",
+                      on_close=recording_finalized(state.name), poster_width=POSTER_WIDTH,
+                      sprite_frames=SPRITE_FRAMES, sprite_width=SPRITE_WIDTH)
+        for state in states
+    ]
+
+    def snapshot_saved(key, metadata):
+        # Called on the snapshot writer thread once a snapshot and its metadata JSON are on disk
+        retain_snapshot(retention, metadata)
+        if events:
+            events.emit("snapshot-saved", camId=key[0], recording=key[1], **metadata)
+
+    snapshots = SnapshotWriter(SNAPSHOT_DIR, SNAPSHOT_COUNT, SNAPSHOT_MIN_GAP, on_save=snapshot_saved)
+
+    # Stop on SIGINT/SIGTERM or stop_event so that recordings are finalized; a second signal interrupts immediately
+    stop_event = stop_event or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        def on_signal(signum, frame):
+            if stop_event.is_set():
+                raise KeyboardInterrupt
+            LOGGER.info(f"{signal.Signals(signum).name} received, stopping...")
+            stop_event.set()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, on_signal)
+
+    # Optional viewer, sampling annotated frames at display rate on its own thread
+    viewer = Viewer("Drone Detection", fps=VIEWER_FPS, stop_event=stop_event) if view_img else None
+
+    # Optional MJPEG live stream with one broadcaster per source, i.e. /video_feed/0, /camera_status/0, and event feed
+    broadcasters = [FrameBroadcaster(fps=STREAM_FPS) for _ in range(bs)] if stream_port else []
+    if stream_port:
+        def lookup(cam_id):
+            i = 0 if cam_id is None else int(cam_id) if cam_id.isnumeric() else -1
+            return broadcasters[i] if 0 <= i < len(broadcasters) else None
+
+        app = add_event_routes(add_stream_routes(Flask(__name__), lookup), events)
+        if store:
+            add_store_routes(app, store)
+        add_retention_routes(app, retention, {"recordings": LOGS_DIR, "snapshots": SNAPSHOT_DIR})
+        add_metrics_routes(app)
+        CORS(app)  # the dashboard is served from another origin
+        http = serve(app, port=stream_port)
+    consumers = ([viewer] if viewer else []) + broadcasters  # frame consumers that need annotations
+
+    # Optional motion gate per stream, skipping the model on static frames
+    gates = [MotionGate(MOTION_WIDTH, MOTION_THRESHOLD, MOTION_PIXEL_THRESHOLD, MOTION_FORCE_EVERY, MOTION_HOLD)
+             for _ in range(bs)] if motion_gate else []
+
+    # Optional tiled inference on overlapping native-resolution tiles, plus a downscaled full-frame view
+    tiler = None
+    if tile_size:
+        tiler = Tiler(check_img_size(tile_size, s=stride), TILE_OVERLAP, MAX_TILES, TILE_FULL_FRAME, TILE_MERGE)
+
+    # Optional per-stream ROI scheduling, inferring crops around followed targets between full-frame inferences
+    crop_size = tiler.size if tiler else check_img_size(max(imgsz), s=stride)  # model input size of crop batches
+    rois = [RoiScheduler(roi_every, crop_size, ROI_MAX_CROPS, CONF_THRESHOLD) for _ in range(bs)] if roi_every else []
+
+    # Optional per-stream vid_stride controllers keeping latency within budget
+    controllers = [StrideController(latency_budget, vid_stride, max(MAX_STRIDE, vid_stride), STRIDE_HOLD)
+                   for _ in range(bs)] if latency_budget else []
+
+    # Per-stream trackers giving each drone a persistent id; recordings, snapshots and events follow its track events
+    trackers = [Tracker(CONF_THRESHOLD, TRACK_IOU, TRACK_MIN_HITS, TRACK_MAX_AGE) for _ in range(bs)]
+
+    # Optional restricted zones per stream, raising alerts and optionally limiting recordings to drones inside them
+    zone_maps = [Zones(load_zones(zones), ZONE_RESOLUTION) for _ in range(bs)] if zones else []
+
+    def log_stats():
+        LOGGER.info(METRICS.summary())
+        if pipeline:
+            LOGGER.info(frames.summary())
+        for i, parts in enumerate(itertools.zip_longest(trackers, zone_maps, gates, rois, controllers)):
+            prefix = f"{i}: " if webcam else ""
+            LOGGER.info(prefix + ", ".join(x.summary() for x in parts if x is not None))
 
     # Run inference
     model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
-    seen, dt = 0, (Profile(), Profile(), Profile())
-    
+    for i, (frame_buffer, recorder) in enumerate(zip(frame_buffers, recorders)):
+        stream_metrics(str(i), frame_buffer, recorder)
+        if webcam:  # frames overwritten on the capture thread before inference could take them, and stream health
+            METRICS.counter("frames_dropped", lambda i=i: dataset.dropped[i], stream=i, stage="capture")
+            METRICS.counter("stream_reconnects", lambda i=i: dataset.reconnects[i], stream=i)
+            METRICS.gauge("stream_live", lambda i=i: dataset.states[i] == "live", stream=i)
+    METRICS.gauge("queue_depth", lambda: len(snapshots.queue), queue="snapshots")
+    if store:
+        METRICS.gauge("queue_depth", lambda: len(store.queue), queue="eventstore")
+
+    # Stages, each taking and returning one frame packet (a dict) so they can run serially or as a Pipeline
+    def capture(item):
+        path, im, im0s, vid_cap, s = item
+        fps = ((vid_cap.get(cv2.CAP_PROP_FPS) if vid_cap else 30) or 30) / vid_stride
+        t, fresh, health = time.time(), [True], ["live"]
+        times = [t]  # capture time of each stream's frame
+        if webcam:  # streams with a new frame; the end-to-end latency counts from the oldest one's capture
+            fresh, health, times = dataset.fresh, list(dataset.states), list(dataset.capture_times)
+            for i, x in enumerate(times):
+                if fresh[i]:
+                    METRICS.observe("frame_age", t - x, stream=i)
+            t = min(x for x, f in zip(times, fresh) if f)
+        return dict(path=path, im=im, im0s=im0s if webcam else [im0s], fps=fps, s=s, skip=False, t=t, times=times,
+                    fresh=fresh, health=health, frame=dataset.count if webcam else getattr(dataset, "frame", 0))
+
+    def is_new(packet, i):
+        # Frames repeated in a batch, or left over from a degraded, reconnecting or dead stream, are neither buffered,
+        # recorded nor streamed
+        return packet["fresh"][i] and packet["health"][i] == "live"
+
+    def gate_stage(packet):
+        # Infer the whole batch if any stream needs it; every gate sees its frame to keep its background current
+        packet["skip"] = not any([gate.check(im0) for gate, im0 in zip(gates, packet["im0s"])])
+        return packet
+
+    @smart_inference_mode()
+    def preprocess_stage(packet):
+        if packet["skip"]:
+            return packet
+        # Per-frame ROI crops between full-frame inferences; None selects the full frame
+        im0s, fresh = packet["im0s"], packet["fresh"]
+        packet["regions"] = [roi.plan(im0.shape, packet["frame"]) if f else None
+                             for roi, im0, f in zip(rois, im0s, fresh)] or [None] * bs
+        if tiler is not None or any(r is not None for r in packet["regions"]):
+            # Native-resolution crops of the original frames replace the letterboxed frames, full frames being
+            # tiled or letterboxed to the crop size
+            with METRICS.time("letterbox"):
+                regions = [
+                    r if r is not None else tiler.regions(im0.shape) if tiler else [(0, 0, im0.shape[1], im0.shape[0])]
+                    for r, im0 in zip(packet["regions"], im0s)
+                ]
+                regions = [r if f else [] for r, f in zip(regions, fresh)]  # no crops, hence no detections, if stale
+                im, packet["crops"] = crop_batch(im0s, regions, crop_size)
+        else:
+            im = packet["im"]  # letterboxed by the dataloader, timed as part of the capture wait
+            if not all(packet["fresh"]):  # streams without a new frame, i.e. slower or dead ones, are not inferred
+                im = im[[i for i, fresh in enumerate(packet["fresh"]) if fresh]]
+        with METRICS.time("h2d", device=model.device):
+            packet["im"] = preprocess(im, model)
+        return packet
+
+    @smart_inference_mode()
+    def infer_stage(packet):
+        if packet["skip"]:
+            packet["pred"] = [torch.zeros((0, 6), device=model.device) for _ in packet["im0s"]]
+            return packet
+        if "crops" in packet:
+            forward, nms = Profile(device=model.device), Profile(device=model.device)  # summed over crop batches
+            pred = []
+            batches = [packet["im"]] if pt or model.jit else packet["im"][:, None]  # one by one on fixed batch backends
+            for im in batches:
+                with forward:
+                    p = model(im)
+                with nms:
+                    pred.extend(non_max_suppression(p, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det))
+            with nms:
+                packet["pred"] = merge_crops(pred, packet["crops"], len(packet["im0s"]), crop_size, iou_thres,
+                                             agnostic_nms, max_det, TILE_MERGE)
+            METRICS.observe("forward", forward.t)
+            METRICS.observe("nms", nms.t)
+            packet["infer_ms"] = (forward.t + nms.t) * 1E3
+            return packet
+        with METRICS.time("forward", device=model.device) as forward:
+            pred = model(packet["im"], augment=False, visualize=False)
+        packet["infer_ms"] = forward.dt * 1E3
+        with METRICS.time("nms"):
+            pred = iter(non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det))
+            packet["pred"] = [next(pred) if fresh else torch.zeros((0, 6), device=model.device)
+                              for fresh in packet["fresh"]]
+        return packet
+
+    @smart_inference_mode()
+    def postprocess_stage(packet):
+        # Render annotations only when the viewer or a stream is about to sample a frame, or into frames that may be
+        # recorded (a drone is tracked or a recording is open) when recordings are annotated
+        sampled = any(c.wants_frame() for c in consumers)
+        shape = (1, *packet["im"].shape[-3:])  # (1, 3, h, w) whether or not the frame was preprocessed
+        packet["tracks"], packet["track_events"], packet["zone_hits"], packet["drawn"] = [], [], [], []
+        shapes = []  # inference shape of each image, for the frame summary
+        for i, det in enumerate(packet["pred"]):  # per image
+            im0 = packet["im0s"][i]
+            if is_new(packet, i):  # a repeated frame is already buffered (and recorded)
+                with METRICS.time("encode", stream=i):
+                    frame_buffers[i].append(im0, packet["times"][i])  # the un-annotated frame, for the pre-roll
+            if len(det) and "crops" not in packet:  # detections from crops are already in frame coordinates
+                det[:, :4] = scale_boxes(shape[2:], det[:, :4], im0.shape).round()  # img_size to im0 size
+            if packet["skip"] or not packet["fresh"][i]:  # tracks are neither matched nor aged on frames the model
+                tracks, track_events = det.new_zeros((0, 7)).cpu(), []  # did not see, or saw in an earlier batch
+                METRICS.inc("frames_skipped" if packet["skip"] else "frames_repeated", stream=i)
+            else:
+                with METRICS.time("track", stream=i):
+                    tracks, track_events = trackers[i].update(det)
+            if packet["fresh"][i]:
+                METRICS.inc("frames_processed", stream=i)
+            draw = sampled or RECORD_ANNOTATED and (len(tracks) > 0 or states[i].is_recording)
+            if draw:  # annotations are drawn in place, keep the loader's frame intact
+                im0 = packet["im0s"][i] = im0.copy()
+            packet["drawn"].append(draw)
+            annotate = Profile()  # zones and boxes, observed once per frame
+            if zone_maps:  # (tracks, zones) hits, entries added to the track events
+                lost = [e["id"] for e in track_events if e["event"] == "lost"]
+                hits, entries = zone_maps[i].update(tracks, im0.shape, lost)
+                track_events += entries
+                packet["zone_hits"].append(hits)
+                if draw:
+                    with annotate:
+                        zone_maps[i].draw(im0, hits.any(0), line_thickness)
+            log_track_events(track_events, names, tracks, states[i].name)
+            packet["tracks"].append(tracks)
+            packet["track_events"].append(track_events)
+            shapes.append((1, 3, *im0.shape[:2]) if "crops" in packet else shape)
+            with annotate:
+                annotate_frame(det, tracks, shapes[-1], im0, names, line_thickness, draw=draw)
+            METRICS.observe("annotate", annotate.t, stream=i)
+            if gates and not packet["skip"]:
+                gates[i].update(len(tracks))
+            if rois and not packet["skip"] and packet["fresh"][i]:
+                rois[i].update(det, packet["frame"], packet["regions"][i])
+        def summary():
+            # Built only when the frame message is emitted, once per LOG_INTERVAL
+            s = packet["s"] + "".join(f"{i}: " * webcam + frame_summary(det, shape, names)
+                                      for i, (det, shape) in enumerate(zip(packet["pred"], shapes)))
+            if packet["skip"]:
+                return f"{s}(no motion, inference skipped)"
+            return f"{s}{'' if len(packet['pred'][-1]) else '(no detections), '}{packet['infer_ms']:.1f}ms"
+
+        # Print time (inference-only)
+        RLOGGER.info("frame", summary)
+        return packet
+
+    def record_stage(packet):
+        for i, (im0, tracks, track_events) in enumerate(zip(packet["im0s"], packet["tracks"], packet["track_events"])):
+            if not is_new(packet, i):  # recordings and their post-detection countdown advance with new frames only
+                if states[i].is_recording and packet["health"][i] in ("reconnecting", "dead"):
+                    LOGGER.warning(f"WARNING ⚠️ {states[i].name}: stream lost, closing its recording")
+                    close_recording(states[i], recorders[i], events, snapshots, frame_buffers[i],
+                                    frame=packet["frame"], reason="stream-lost")
+                continue
+            if zone_maps and ZONE_RECORDING == "zones":  # only drones inside a zone start and extend recordings
+                tracks = tracks[torch.from_numpy(packet["zone_hits"][i].any(1))]
+            fps = fpss[i] if webcam else packet["fps"]
+            record_frame(states[i], im0, tracks, track_events, names, fps, packet["frame"], frame_buffers[i],
+                         recorders[i], events, snapshots)
+        return packet
+
+    def detect_stage(packet):
+        for stage in (gate_stage,) * bool(gates) + (preprocess_stage, infer_stage, postprocess_stage):
+            packet = stage(packet)
+        return packet
+
+    def serial(item):
+        return record_stage(detect_stage(capture(item)))
+
+    if pipeline:
+        policy = "drop_oldest" if webcam else "block"  # live streams drop their oldest frames rather than lag behind
+        if gates or rois:
+            # Motion gates and ROI schedulers decide on each frame from the detections of the previous one, so gating
+            # to postprocessing run as one stage, in frame order on one thread
+            stages = [("detect", detect_stage, PIPELINE_QUEUE_SIZE, policy)]
+        else:
+            stages = [
+                ("preprocess", preprocess_stage, PIPELINE_QUEUE_SIZE, policy),
+                ("infer", infer_stage, PIPELINE_QUEUE_SIZE, "block"),
+                ("postprocess", postprocess_stage, PIPELINE_QUEUE_SIZE, "block"),
+            ]
+        frames = Pipeline(
+            map(capture, METRICS.iterate(dataset, "capture_wait")),
+            [*stages, ("record", record_stage, PIPELINE_QUEUE_SIZE, "block")],
+            out_size=1,
+            out_policy="drop_oldest",
+        )
+        for q in frames.queues:
+            METRICS.gauge("queue_depth", q.__len__, queue=q.name)
+            METRICS.counter("frames_dropped", lambda q=q: q.dropped, stage=q.name)
+    else:
+        frames = (serial(x) for x in METRICS.iterate(dataset, "capture_wait"))
+
     try:
-        for path, im, im0s, vid_cap, s in dataset:
-            with dt[0]:
-                im = torch.from_numpy(im).to(model.device)
-                im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
-                im /= 255  # 0 - 255 to 0.0 - 1.0
-                if len(im.shape) == 3:
-                    im = im[None]  # expand for batch dim
-
-            # Inference
-            with dt[1]:
-                pred = model(im, augment=False, visualize=False)
-
-            # NMS
-            with dt[2]:
-                pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
-
-            # Process predictions
-            for i, det in enumerate(pred):  # per image
-                seen += 1
-                if webcam:  # batch_size >= 1
-                    p, im0, frame = path[i], im0s[i].copy(), dataset.count
-                    s += f"{i}: "
+        t = time.time()
+        for packet in frames:
+            # Hand annotated frames to the viewer and live streams, if any
+            if viewer is not None and packet["drawn"][-1] and is_new(packet, len(packet["im0s"]) - 1):
+                viewer.submit(packet["im0s"][-1])
+            for i, (broadcaster, im0) in enumerate(zip(broadcasters, packet["im0s"])):
+                if packet["drawn"][i] and broadcaster.wants_frame() and is_new(packet, i):
+                    broadcaster.publish(im0)
+
+            # Adapt each stream's vid_stride to the end-to-end latency of its own frame, at full rate while a drone is
+            # detected or the stream is recording, so recordings keep the fps they were opened at
+            now = time.time()
+            METRICS.observe("latency", now - packet["t"])
+            for i, (controller, tracks) in enumerate(zip(controllers, packet["tracks"])):
+                if not packet["fresh"][i]:  # no new frame of this stream in the batch
+                    continue
+                tracking = len(tracks) > 0 or states[i].is_recording
+                stride = controller.update(now - packet["times"][i], tracking=tracking)
+                if webcam:
+                    dataset.vid_strides[i] = stride
                 else:
-                    p, im0, frame = path, im0s.copy(), getattr(dataset, "frame", 0)
-
-                # Add frame to buffer
-                frame_buffer.append((im0.copy(), datetime.now()))
-
-                p = Path(p)  # to Path
-                s += "%gx%g " % im.shape[2:]  # print string
-                annotator = Annotator(im0, line_width=line_thickness, example=str(names))
-
-                # Check if drone is detected with high confidence
-                drone_detected = False
-                max_conf = 0.0
-                if len(det) > 0:
-                    max_conf = float(det[:, 4].max())
-                    drone_detected = max_conf >= CONF_THRESHOLD
-                    # Update max_drones_spotted if current detection count is higher
-                    current_drone_count = len([d for d in det if float(d[4]) >= CONF_THRESHOLD])
-                    global max_drones_spotted
-                    max_drones_spotted = max(max_drones_spotted, current_drone_count)
-
-                if len(det):
-                    # Rescale boxes from img_size to im0 size
-                    det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
-
-                    # Print results
-                    for c in det[:, 5].unique():
-                        n = (det[:, 5] == c).sum()  # detections per class
-                        s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
-
-                    # Write results
-                    for *xyxy, conf, cls in reversed(det):
-                        if conf >= CONF_THRESHOLD:
-                            c = int(cls)  # integer class
-                            # Calculate center coordinates
-                            x1, y1, x2, y2 = map(int, xyxy)
-                            center_x = (x1 + x2) // 2
-                            center_y = (y1 + y2) // 2
-                            
-                            # Create label with class, confidence, and coordinates
-                            label = f"{names[c]} {conf:.2f} ({center_x}, {center_y})"
-                            
-                            # Draw box and label
-                            annotator.box_label(xyxy, label, color=colors(c, True))
-                            
-                            # Log detection
-                            LOGGER.info(f"Drone detected! Type: {names[c]}, Confidence: {conf:.2f}, Position: ({center_x}, {center_y})")
-
-                            # Handle recording
-                            if drone_detected:
-                                last_detection_time = datetime.now()
-                                
-                                if not is_recording:
-                                    # Start new recording
-                                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                    threat_level = "High" if max_conf > 0.8 else "Medium" if max_conf > 0.65 else "Low"
-                                    video_filename = f"drone_detection_{timestamp}_{names[c]}_{threat_level}.mp4"
-                                    current_video_path = LOGS_DIR / video_filename
-                                    
-                                    # Initialize video writer
-                                    fps = vid_cap.get(cv2.CAP_PROP_FPS) if vid_cap else 30
-                                    w, h = im0.shape[1], im0.shape[0]
-                                    current_video_writer = cv2.VideoWriter(
-                                        str(current_video_path),
-                                        cv2.VideoWriter_fourcc(*'mp4v'),
-                                        fps,
-                                        (w, h)
-                                    )
-                                    
-                                    # Write buffered frames
-                                    for buffered_frame, _ in frame_buffer:
-                                        current_video_writer.write(buffered_frame)
-                                    
-                                    is_recording = True
-                                    recording_start_time = datetime.now()
-                                    frames_to_record = POST_DETECTION_SECONDS * int(fps)
-                                    
-                                    # Take random snapshot
-                                    if random.random() < SNAPSHOT_PROBABILITY:
-                                        detection_coords = det[:, :4].tolist()
-                                        frame_info = {
-                                            "fps": fps,
-                                            "frameNumber": frame,
-                                            "recordingFile": video_filename
-                                        }
-                                        save_snapshot(
-                                            im0.copy(),
-                                            names[c],
-                                            float(conf),
-                                            detection_coords,
-                                            frame_info
-                                        )
-                                    
-                                    # Save metadata
-                                    meta = {
-                                        "timestamp": datetime.now().isoformat(),
-                                        "droneType": names[c],
-                                        "confidence": float(max_conf),
-                                        "threatLevel": threat_level,
-                                        "detectionCount": len(det),
-                                        "maxDronesSpotted": max_drones_spotted,
-                                        "coordinates": det[:, :4].tolist()
-                                    }
-                                    meta_filename = video_filename.replace(".mp4", ".json")
-                                    with open(LOGS_DIR / meta_filename, "w") as f:
-                                        json.dump(meta, f, indent=2)
-
-                # Write frame if recording
-                if is_recording and current_video_writer is not None:
-                    current_video_writer.write(im0)
-                    frames_to_record -= 1
-                    
-                    # Check for recording extension
-                    fps = vid_cap.get(cv2.CAP_PROP_FPS) if vid_cap else 30
-                    if should_extend_recording(frames_to_record, fps):
-                        frames_to_record = RECORDING_EXTENSION * int(fps)
-                        print(f"\nExtending recording by {RECORDING_EXTENSION} seconds due to recent detection")
-                    
-                    # Display remaining time
-                    remaining_seconds = int(frames_to_record / fps)
-                    print(f"\rRecording remaining: {remaining_seconds}s", end="")
-                    
-                    # Check if recording should end
-                    if frames_to_record <= 0:
-                        current_video_writer.release()
-                        current_video_writer = None
-                        is_recording = False
-                        print("\nRecording saved successfully")
-
-                # Stream results
-                im0 = annotator.result()
-                
-                # Show results in CV2 window
-                cv2.imshow("Drone Detection", im0)
-                
-                # Break if 'q' is pressed
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    raise KeyboardInterrupt
-
-            # Print time (inference-only)
-            LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1E3:.1f}ms")
+                    dataset.vid_stride = stride
+
+            # Stop on signal, stop_event or 'q' in the viewer
+            if stop_event.is_set():
+                break
+
+            if time.time() - t > PIPELINE_STATS_INTERVAL:
+                t = time.time()
+                log_stats()
 
     except KeyboardInterrupt:
         LOGGER.info("Keyboard interrupt received. Cleaning up...")
@@ -374,19 +810,39 @@ def run(
         LOGGER.error(f"Error during execution: {e}")
     finally:
         # Clean up
-        if current_video_writer is not None:
-            current_video_writer.release()
-        cv2.destroyAllWindows()
+        if pipeline:
+            frames.stop()
+            frames.join()
+        log_stats()
+        RLOGGER.flush()
+        for state, recorder, frame_buffer in zip(states, recorders, frame_buffers):
+            if state.is_recording:
+                close_recording(state, recorder, events, snapshots, frame_buffer)
+            recorder.shutdown()  # flush queued frames and finalize files
+            if isinstance(frame_buffer, SegmentRing):
+                frame_buffer.shutdown()  # finish the current segment and pending clips
+        snapshots.shutdown()
+        if viewer is not None:
+            viewer.close()
+        if stream_port:
+            for broadcaster in broadcasters:
+                broadcaster.close()
+            events.close()
+            http.shutdown()
+        if store:
+            store.close()  # after the recorder and snapshot threads emitted their last events
 
 def main(opt):
     check_requirements(ROOT / "requirements.txt", exclude=("tensorboard", "thop"))
+    setup_logging(LOGGER, LOG_FORMAT, LOG_QUEUE_SIZE)
     
-    # Enable view_img by default
-    opt.view_img = True
-    
+    # Show the viewer unless running headless or without a display
+    opt.view_img = not opt.headless and check_imshow(warn=True)
+    del opt.headless
+
     print("* Starting drone detection...")
     print(f"* Confidence threshold set to {CONF_THRESHOLD*100}%")
-    print("* Press 'q' to quit")
+    print("* Press 'q' in the viewer to quit" if opt.view_img else "* Send SIGINT (Ctrl+C) or SIGTERM to quit")
     
     try:
         # Run the detection
@@ -405,7 +861,8 @@ def parse_opt():
     parser.add_argument("--iou-thres", type=float, default=0.45, help="NMS IoU threshold")
     parser.add_argument("--max-det", type=int, default=1000, help="maximum detections per image")
     parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
-    parser.add_argument("--view-img", action="store_true", help="show results")
+    parser.add_argument("--view-img", action="store_true", help="show results (default unless --headless)")
+    parser.add_argument("--headless", action="store_true", help="run without the OpenCV viewer, i.e. as a service")
     parser.add_argument("--classes", nargs="+", type=int, help="filter by class: --classes 0, or --classes 0 2 3")
     parser.add_argument("--agnostic-nms", action="store_true", help="class-agnostic NMS")
     parser.add_argument("--line-thickness", default=2, type=int, help="bounding box thickness (pixels)")
@@ -414,6 +871,14 @@ def parse_opt():
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
+    parser.add_argument("--stream-port", type=int, default=0, help="serve live stream and events on port, 0 to disable")
+    parser.add_argument("--motion-gate", action="store_true", help="skip inference on frames without motion")
+    parser.add_argument("--latency-budget", type=float, default=0, help="adapt vid-stride to this latency (ms), 0 off")
+    parser.add_argument("--tile-size", type=int, default=0, help="tiled inference tile size (pixels), 0 to disable")
+    parser.add_argument("--roi-every", type=int, default=0, help="full frame every N frames, target crops between")
+    parser.add_argument("--zones", type=str, default=None, help="restricted zones JSON file, see utils/zones.py")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run capture/preprocess/infer/postprocess/record stages concurrently")
     opt = parser.parse_args()
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
@@ -0,0 +1,635 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Run a long-lived multi-camera drone detection server that shares one YOLOv5 model across all cameras.
+
+Frames from all cameras are letterboxed to the same inference size on their capture threads and grouped into dynamic
+batches: a batch is run as soon as every camera has a new frame, `--max-batch` frames are waiting, or the oldest
+waiting frame is `--max-latency` ms old. Pre-roll buffers, recorders and recording state stay per camera.
+
+Usage:
+    $ python detect_server.py --weights best.pt --source 0 rtsp://camera-ip --port 8000
+
+Cameras are added and removed at runtime over HTTP:
+    $ curl -X POST localhost:8000/cameras -H "Content-Type: application/json" -d '{"camId": "cam2", "source": "rtsp://..."}'
+    $ curl -X DELETE localhost:8000/cameras/cam2
+    $ curl localhost:8000/cameras
+
+Annotated frames of each camera are streamed as MJPEG:
+    $ curl localhost:8000/video_feed/cam2?width=640
+    $ curl localhost:8000/camera_status/cam2
+
+Restricted zones (see utils/zones.py) are set per camera when adding it, or replaced at runtime:
+    $ curl -X PUT localhost:8000/cameras/cam2/zones -d '{"zones": [{"name": "runway", "points": [[0, 0.5], [1, 0.5], [1, 1], [0, 1]], "normalized": true}]}'
+
+Detection, recording, zone and snapshot events of all cameras are pushed as Server-Sent Events:
+    $ curl -N localhost:8000/events?since=0
+
+All events are archived in an indexed SQLite store (DRONE_EVENT_DB) and queried page by page, newest first:
+    $ curl "localhost:8000/events/query?camId=cam2&level=High&start=2024-05-01T00:00:00&limit=50"
+    $ curl "localhost:8000/events/query?camId=cam2&level=High&start=2024-05-01T00:00:00&limit=50&before=<next>"
+
+Recordings and snapshots are kept within byte and age budgets (DRONE_LOGS_BUDGET_MB, DRONE_SNAPSHOT_BUDGET_MB, ...);
+exported items are evicted first and the current eviction plan is reported without deleting anything:
+    $ curl localhost:8000/retention
+    $ curl -X POST localhost:8000/retention/recordings/exported -d '{"keys": ["drone_detection_20240501_120000_drone_High"]}'
+
+Per-stage latency histograms (p50/p95/p99), frame counters and queue/buffer gauges are scraped in the Prometheus text
+format, or as JSON:
+    $ curl localhost:8000/metrics
+    $ curl localhost:8000/metrics?format=json
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
+
+from flask import Flask, jsonify, request
+from flask_cors import CORS
+
+from detect import (
+    EVENT_HISTORY,
+    CONF_THRESHOLD,
+    LOG_FORMAT,
+    LOG_QUEUE_SIZE,
+    EVENT_DB,
+    LOGS_DIR,
+    MAX_STRIDE,
+    POSTER_WIDTH,
+    RECONNECT_MAX,
+    RECONNECT_MIN,
+    RECORDER_QUEUE_SIZE,
+    RECORD_ANNOTATED,
+    SNAPSHOT_COUNT,
+    SNAPSHOT_DIR,
+    SNAPSHOT_MIN_GAP,
+    SPRITE_FRAMES,
+    SPRITE_WIDTH,
+    STREAM_DEAD_AFTER,
+    STREAM_FPS,
+    STRIDE_HOLD,
+    TRACK_IOU,
+    TRACK_MAX_AGE,
+    TRACK_MIN_HITS,
+    ZONE_RECORDING,
+    ZONE_RESOLUTION,
+    RLOGGER,
+    RecordingState,
+    annotate_frame,
+    close_recording,
+    log_track_events,
+    preroll_buffer,
+    retain_clip,
+    retain_recording,
+    retain_snapshot,
+    retention_manager,
+    preprocess,
+    record_frame,
+    stream_metrics,
+)
+from models.common import DetectMultiBackend
+from utils.augmentations import letterbox
+from utils.dvr import SegmentRing
+from utils.events import EventBus, add_event_routes
+from utils.eventstore import EventStore, add_store_routes
+from utils.general import (
+    LOGGER,
+    check_img_size,
+    check_requirements,
+    cv2,
+    non_max_suppression,
+    print_args,
+    scale_boxes,
+)
+from utils.logs import setup_logging
+from utils.pipeline import STOP, StageQueue
+from utils.recorder import AsyncRecorder
+from utils.retention import add_retention_routes
+from utils.snapshots import SnapshotWriter
+from utils.stride import StrideController
+from utils.streaming import FrameBroadcaster, add_stream_routes
+from utils.telemetry import METRICS, add_metrics_routes
+from utils.torch_utils import select_device, smart_inference_mode
+from utils.tracker import Tracker
+from utils.zones import Zones, load_zones
+
+MAX_BATCH = int(os.getenv("DRONE_MAX_BATCH", "8"))  # Max frames per inference batch
+MAX_LATENCY_MS = float(os.getenv("DRONE_MAX_LATENCY_MS", "25"))  # Max ms a frame waits for its batch to fill up
+
+
+def is_live(source):
+    """Returns True for webcams and network streams, whose frames may be skipped, and False for video files."""
+    source = str(source)
+    return source.isnumeric() or urlparse(source).scheme.lower() in ("rtsp", "rtmp", "http", "https", "udp", "tcp")
+
+
+class Camera:
+    """
+    One camera of a DetectionServer: a capture thread letterboxing frames into a single-frame slot, and a postprocess
+    thread annotating batch results and driving the per-camera pre-roll buffer, recorder and RecordingState.
+
+    Live sources overwrite an unconsumed slot (counted in `dropped`), video files wait until it is consumed.
+    """
+
+    def __init__(self, server, cam_id, source, zones=None):
+        """Opens `source` and starts the camera's capture and postprocess threads; `zones` defaults to the server's."""
+        self.server = server
+        self.id = cam_id
+        self.source = str(source)
+        self.live = is_live(source)
+        self.cap = cv2.VideoCapture(int(self.source) if self.source.isnumeric() else self.source)
+        assert self.cap.isOpened(), f"{cam_id}: failed to open {source}"
+        fps = self.cap.get(cv2.CAP_PROP_FPS)  # warning: may return 0 or nan
+        self.fps = max((fps if np.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
+
+        self.state = RecordingState(cam_id)
+        self.frame_buffer = preroll_buffer(cam_id, self.fps, lambda path, info: retain_clip(server.retention, path))
+        self.recorder = AsyncRecorder(
+            maxsize=RECORDER_QUEUE_SIZE, name=f"recorder-{cam_id}", on_close=self._recording_finalized,
+            poster_width=POSTER_WIDTH, sprite_frames=SPRITE_FRAMES, sprite_width=SPRITE_WIDTH,
+        )
+        self.results = StageQueue(4, "drop_oldest" if self.live else "block", name=cam_id)
+
+        self.slot = None  # (im, im0, capture time, frame number) waiting to be batched, guarded by server.cond
+        self.finished = False  # capture ended, no more frames will be produced
+        self.stopping = threading.Event()
+        self.frame, self.processed, self.dropped, self.reconnects = 0, 0, 0, 0
+        self.latency = 0.0  # exponential moving average of capture-to-result latency in seconds
+        self.tracker = Tracker(CONF_THRESHOLD, TRACK_IOU, TRACK_MIN_HITS, TRACK_MAX_AGE)
+        self.zones = Zones(server.zones if zones is None else zones, ZONE_RESOLUTION)  # restricted zones
+        self.last_detections = []  # [x1, y1, x2, y2, conf, cls, track id] of the last processed frame
+        self.stride = 1  # frames read per frame batched, adapted by the controller when a latency budget is set
+        self.controller = None
+        if server.latency_budget:
+            self.controller = StrideController(server.latency_budget, max_stride=MAX_STRIDE, hold=STRIDE_HOLD)
+        self.broadcaster = FrameBroadcaster(fps=STREAM_FPS)  # MJPEG live stream of annotated frames
+
+        self.capture_thread = threading.Thread(target=self._capture, name=f"capture-{cam_id}", daemon=True)
+        self.post_thread = threading.Thread(target=self._postprocess, name=f"postprocess-{cam_id}", daemon=True)
+        self.capture_thread.start()
+        self.post_thread.start()
+
+    def _capture(self):
+        """Reads, letterboxes and publishes frames to the slot until stopped or the source ends; a lost live source is
+        reopened with the exponential backoff of LoadStreams.
+        """
+        server, cond = self.server, self.server.cond
+        delay, down = RECONNECT_MIN, None  # next backoff, time the stream went down
+        while not self.stopping.is_set():
+            if not self.live:
+                with cond:
+                    cond.wait_for(lambda: self.slot is None or self.stopping.is_set())
+                if self.stopping.is_set():
+                    break
+            with METRICS.time("capture_wait", stream=self.id):
+                for _ in range(self.stride - 1):
+                    self.cap.grab()  # skip frames without decoding them
+                ok, im0 = self.cap.read()
+            if not ok:
+                if not self.live:
+                    break  # end of video file
+                down = down or time.time()
+                if STREAM_DEAD_AFTER and time.time() - down > STREAM_DEAD_AFTER:
+                    LOGGER.warning(f"WARNING ⚠️ {self.id}: {self.source} down for over {STREAM_DEAD_AFTER:.0f}s")
+                    break
+                LOGGER.warning(f"WARNING ⚠️ {self.id}: stream unresponsive, reopening in {delay:.1f}s")
+                self.stopping.wait(delay)
+                self.reconnects += 1
+                self.cap.release()
+                self.cap.open(int(self.source) if self.source.isnumeric() else self.source)
+                delay = min(delay * 2, RECONNECT_MAX)
+                continue
+            delay, down = RECONNECT_MIN, None
+            with METRICS.time("letterbox", stream=self.id):
+                im = letterbox(im0, server.imgsz, stride=server.stride, auto=False)[0]  # fixed shape for batching
+                im = np.ascontiguousarray(im.transpose((2, 0, 1))[::-1])  # HWC to CHW, BGR to RGB
+            self.frame += 1
+            with cond:
+                if self.slot is not None:
+                    self.dropped += 1  # overwritten before being batched
+                self.slot = (im, im0, time.time(), self.frame)
+                cond.notify_all()
+        self.cap.release()
+        with cond:
+            self.finished = True
+            cond.notify_all()
+
+    @smart_inference_mode()
+    def _postprocess(self):
+        """Annotates batch results and updates the camera's pre-roll and recording until the results queue stops."""
+        names = self.server.names
+        try:
+            while True:
+                item = self.results.get()
+                if item is STOP:
+                    break
+                (_, im0, t, frame), det, shape = item
+                with METRICS.time("encode", stream=self.id):
+                    self.frame_buffer.append(im0, t)  # un-annotated frame for the pre-roll buffer
+                if len(det):
+                    det[:, :4] = scale_boxes(shape[2:], det[:, :4], im0.shape).round()
+                with METRICS.time("track", stream=self.id):
+                    tracks, track_events = self.tracker.update(det)
+                lost = [e["id"] for e in track_events if e["event"] == "lost"]
+                hits, entries = self.zones.update(tracks, im0.shape, lost)
+                track_events += entries
+                log_track_events(track_events, names, tracks, self.id)
+                # Render annotations only for a frame the live stream samples or, with annotated recordings, one that
+                # may be recorded
+                sampled = self.broadcaster.wants_frame()
+                if sampled or RECORD_ANNOTATED and (len(tracks) > 0 or self.state.is_recording):
+                    with METRICS.time("annotate", stream=self.id):
+                        annotate_frame(det, tracks, shape, im0, names, self.server.line_thickness)
+                        self.zones.draw(im0, hits.any(0), self.server.line_thickness)
+                if ZONE_RECORDING == "zones" and len(self.zones):  # only drones inside a zone trigger recordings
+                    tracks = tracks[torch.from_numpy(hits.any(1))]
+                record_frame(
+                    self.state, im0, tracks, track_events, names, self.fps, frame, self.frame_buffer, self.recorder,
+                    self.server.events, self.server.snapshots,
+                )
+                self.last_detections = tracks.tolist()
+                if sampled:
+                    self.broadcaster.publish(im0)
+                self.processed += 1
+                METRICS.inc("frames_processed", stream=self.id)
+                METRICS.observe("latency", time.time() - t, stream=self.id)
+                self.latency += 0.1 * (time.time() - t - self.latency)
+                if self.controller is not None:  # full rate while recording, so recordings keep their opening fps
+                    tracking = len(tracks) > 0 or self.state.is_recording
+                    self.stride = self.controller.update(time.time() - t, tracking=tracking)
+        except Exception as e:
+            LOGGER.error(f"{self.id}: postprocess error: {e}")
+        finally:
+            if self.state.is_recording:
+                close_recording(
+                    self.state, self.recorder, self.server.events, self.server.snapshots, self.frame_buffer
+                )
+            self.recorder.shutdown()
+            if isinstance(self.frame_buffer, SegmentRing):
+                self.frame_buffer.shutdown()
+            self.broadcaster.close()
+            self.stopping.set()  # also stop capturing when postprocessing failed, so the camera can be added again
+            with self.server.cond:
+                self.server.cond.notify_all()
+            self.server._forget(self)
+
+    def _recording_finalized(self, path, meta):
+        """Indexes the recording for retention and pushes a recording-finalized event once the recorder has written the
+        video and its metadata.
+        """
+        retain_recording(self.server.retention, path, meta)
+        self.server.events.emit("recording-finalized", camId=self.id, recording=path.name, **meta)
+
+    def register_metrics(self):
+        """Registers the camera's pull-based metrics, once it is added to the server under its id."""
+        stream_metrics(self.id, self.frame_buffer, self.recorder)
+        METRICS.gauge("queue_depth", self.results.__len__, stream=self.id, queue="results")
+        METRICS.counter("frames_dropped", lambda: self.dropped, stream=self.id, stage="capture")
+        METRICS.counter("frames_dropped", lambda: self.results.dropped, stream=self.id, stage="results")
+        METRICS.counter("stream_reconnects", lambda: self.reconnects, stream=self.id)
+
+    def stop(self, timeout=5.0):
+        """Stops capture and postprocessing, finalizing any recording in progress."""
+        self.stopping.set()
+        with self.server.cond:
+            self.server.cond.notify_all()
+        self.results.put(STOP, force=True)
+        self.capture_thread.join(timeout)
+        self.post_thread.join(timeout)
+
+    def stats(self):
+        """Returns a JSON-serializable status dict for this camera."""
+        return {
+            "camId": self.id,
+            "source": self.source,
+            "live": self.live,
+            "fps": self.fps,
+            "frames": self.frame,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "latencyMs": round(self.latency * 1e3, 1),
+            "stride": self.stride,
+            "isRecording": self.state.is_recording,
+            "recordingPhase": self.state.phase,
+            "recording": str(self.state.current_video_path) if self.state.is_recording else None,
+            "maxDronesSpotted": self.state.max_drones_spotted,
+            "detections": self.last_detections,
+            "tracker": self.tracker.stats(),
+            "zones": self.zones.stats(),
+            "recorder": self.recorder.stats(),
+            "stream": self.broadcaster.status(),
+        }
+
+
+class DetectionServer:
+    """
+    Owns one DetectMultiBackend and a set of Cameras, running batched inference across cameras on one thread.
+
+        server = DetectionServer("best.pt").start()
+        server.add_camera("cam0", 0)
+        server.remove_camera("cam0")
+        server.stop()
+    """
+
+    def __init__(
+        self,
+        weights=ROOT / "best.pt",  # model path
+        data=ROOT / "data/coco128.yaml",  # dataset.yaml path
+        imgsz=(640, 640),  # inference size (height, width)
+        conf_thres=CONF_THRESHOLD,  # confidence threshold
+        iou_thres=0.45,  # NMS IoU threshold
+        max_det=1000,  # maximum detections per image
+        device="",  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+        classes=None,  # filter by class: --classes 0, or --classes 0 2 3
+        agnostic_nms=False,  # class-agnostic NMS
+        line_thickness=2,  # bounding box thickness (pixels)
+        half=False,  # use FP16 half-precision inference
+        dnn=False,  # use OpenCV DNN for ONNX inference
+        max_batch=MAX_BATCH,  # max frames per inference batch
+        max_latency=MAX_LATENCY_MS,  # max ms the oldest frame waits for its batch to fill up
+        latency_budget=0,  # adapt each camera's frame stride to keep capture-to-result latency (ms) within budget
+        zones=None,  # default restricted zones JSON file of cameras added without zones
+    ):
+        """Loads and warms up the model once for all cameras."""
+        LOGS_DIR.mkdir(parents=True, exist_ok=True)
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        self.device = select_device(device)
+        self.model = DetectMultiBackend(weights, device=self.device, dnn=dnn, data=data, fp16=half)
+        self.stride, self.names = self.model.stride, self.model.names
+        self.imgsz = check_img_size(imgsz, s=self.stride)
+        self.model.warmup(imgsz=(1 if self.model.pt or self.model.triton else max_batch, 3, *self.imgsz))
+        self.nms = dict(conf_thres=conf_thres, iou_thres=iou_thres, classes=classes, agnostic=agnostic_nms,
+                        max_det=max_det)
+        self.line_thickness = line_thickness
+        self.max_batch = max_batch
+        self.max_latency = max_latency / 1e3
+        self.latency_budget = latency_budget
+        self.zones = load_zones(zones) if zones else []
+        self.dynamic = self.model.pt or self.model.jit  # backends accepting any batch size
+
+        self.cameras = {}
+        self.cond = threading.Condition()  # guards cameras and their slots
+        self.store = EventStore(EVENT_DB) if EVENT_DB else None  # indexed archive of all events
+        self.events = EventBus(EVENT_HISTORY, self.store)  # detection events of all cameras, tagged with camId
+        self.retention = retention_manager()  # byte and age budgets of recordings and snapshots
+        self.retention.enforce()
+        self.snapshots = SnapshotWriter(  # best snapshots of every recording, written on one background thread
+            SNAPSHOT_DIR, SNAPSHOT_COUNT, SNAPSHOT_MIN_GAP, on_save=self._snapshot_saved
+        )
+        self.stopping = threading.Event()
+        self.thread = None
+        self.batches, self.batched_frames, self.infer_t = 0, 0, 0.0
+        METRICS.gauge("queue_depth", lambda: len(self.snapshots.queue), queue="snapshots")
+        if self.store:
+            METRICS.gauge("queue_depth", lambda: len(self.store.queue), queue="eventstore")
+
+    def _snapshot_saved(self, key, metadata):
+        """Indexes the snapshot for retention and pushes a snapshot-saved event once it is written."""
+        retain_snapshot(self.retention, metadata)
+        self.events.emit("snapshot-saved", camId=key[0], recording=key[1], **metadata)
+
+    def start(self):
+        """Starts the batching inference thread."""
+        self.thread = threading.Thread(target=self._infer, name="infer", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops all cameras, finalizing their recordings, then the inference thread."""
+        for cam_id in list(self.cameras):
+            self.remove_camera(cam_id)
+        self.stopping.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(5.0)
+        self.snapshots.shutdown()
+        self.events.close()
+        if self.store:
+            self.store.close()
+        RLOGGER.flush()
+
+    def add_camera(self, cam_id, source, zones=None):
+        """Opens `source` as camera `cam_id` with optional restricted `zones` and adds it to batching; raises
+        ValueError if the id is in use.
+        """
+        cam_id = str(cam_id)
+        with self.cond:
+            if cam_id in self.cameras:
+                raise ValueError(f"camera '{cam_id}' already exists")
+        camera = Camera(self, cam_id, source, zones)
+        with self.cond:
+            added = cam_id not in self.cameras  # re-checked, another request may have added the id while opening
+            if added:
+                self.cameras[cam_id] = camera
+                self.cond.notify_all()
+        if not added:
+            camera.stop()
+            raise ValueError(f"camera '{cam_id}' already exists")
+        camera.register_metrics()
+        LOGGER.info(f"{cam_id}: added {source} at {camera.fps:.2f} FPS")
+        return camera
+
+    def remove_camera(self, cam_id):
+        """Stops and removes camera `cam_id`; raises KeyError if it does not exist."""
+        camera = self.cameras[str(cam_id)]
+        camera.stop()
+        self._forget(camera)
+        LOGGER.info(f"{cam_id}: removed")
+
+    def _forget(self, camera):
+        """Drops `camera` from the camera table if it is still registered."""
+        with self.cond:
+            if self.cameras.get(camera.id) is camera:
+                del self.cameras[camera.id]
+                METRICS.remove(stream=camera.id)
+                METRICS.remove(recorder=camera.recorder.name)
+
+    def _next_batch(self):
+        """Waits for a batch of fresh frames, returning [(camera, slot)], oldest first, or None when stopping."""
+        with self.cond:
+            while not self.stopping.is_set():
+                cameras = list(self.cameras.values())
+                for cam in cameras:  # end-of-stream is queued behind the camera's last result
+                    if cam.finished and cam.slot is None and not cam.results.closed:
+                        cam.results.put(STOP, force=True)
+                        cam.results.close()
+                ready = sorted((c for c in cameras if c.slot is not None), key=lambda c: c.slot[2])
+                active = [c for c in cameras if not c.finished and not c.stopping.is_set()]
+                if ready:
+                    wait = ready[0].slot[2] + self.max_latency - time.time()
+                    if len(ready) >= min(max(len(active), 1), self.max_batch) or wait <= 0:
+                        batch = [(c, c.slot) for c in ready[: self.max_batch]]
+                        for c, _ in batch:
+                            c.slot = None
+                        self.cond.notify_all()  # wake video file captures waiting for their slot
+                        return batch
+                    self.cond.wait(wait)
+                else:
+                    self.cond.wait(1.0)
+        return None
+
+    @smart_inference_mode()
+    def _infer(self):
+        """Runs batched inference and NMS, dispatching each result to its camera's postprocess queue."""
+        while True:
+            with METRICS.time("batch_wait"):
+                batch = self._next_batch()
+            if batch is None:
+                break
+            try:
+                t = time.time()
+                ims = np.stack([slot[0] for _, slot in batch])
+                preds = []
+                for chunk in [ims] if self.dynamic else ims[:, None]:  # fixed batch size backends run one by one
+                    with METRICS.time("h2d", device=self.device):
+                        im = preprocess(chunk, self.model)
+                    with METRICS.time("forward", device=self.device):
+                        pred = self.model(im)
+                    with METRICS.time("nms"):
+                        preds.extend(non_max_suppression(pred, **self.nms))
+                self.infer_t += time.time() - t
+                self.batches += 1
+                self.batched_frames += len(batch)
+                for (cam, slot), det in zip(batch, preds):
+                    cam.results.put((slot, det, im.shape))
+            except Exception as e:
+                LOGGER.error(f"inference error on batch of {len(batch)}: {e}")
+
+    def stats(self):
+        """Returns a JSON-serializable status dict for the server and all cameras."""
+        with self.cond:
+            cameras = list(self.cameras.values())
+        return {
+            "batches": self.batches,
+            "meanBatchSize": round(self.batched_frames / max(self.batches, 1), 2),
+            "inferMs": round(self.infer_t / max(self.batches, 1) * 1e3, 1),
+            "eventStore": self.store.stats() if self.store else None,
+            "retention": self.retention.stats(),
+            "logging": RLOGGER.stats(),
+            "cameras": [c.stats() for c in cameras],
+        }
+
+
+def create_app(server):
+    """Creates the Flask app exposing camera management and per-camera MJPEG streams for `server`."""
+    app = Flask(__name__)
+    CORS(app)  # the dashboard is served from another origin
+
+    def lookup(cam_id):
+        """Returns the broadcaster of camera `cam_id`, or of the first camera if None."""
+        with server.cond:
+            camera = next(iter(server.cameras.values()), None) if cam_id is None else server.cameras.get(cam_id)
+        return camera.broadcaster if camera else None
+
+    add_stream_routes(app, lookup)
+    add_event_routes(app, server.events)
+    if server.store:
+        add_store_routes(app, server.store)
+    add_retention_routes(app, server.retention, {"recordings": LOGS_DIR, "snapshots": SNAPSHOT_DIR})
+    add_metrics_routes(app)
+
+    @app.route("/cameras", methods=["GET"])
+    def list_cameras():
+        """Lists cameras with their status."""
+        return jsonify(server.stats())
+
+    @app.route("/cameras", methods=["POST"])
+    def add_camera():
+        """Adds a camera from a JSON body {"camId": ..., "source": ..., "zones": [...] (optional)}."""
+        body = request.get_json(force=True, silent=True) or {}
+        if "camId" not in body or "source" not in body:
+            return jsonify(error="camId and source are required"), 400
+        try:
+            camera = server.add_camera(body["camId"], body["source"], body.get("zones"))
+        except ValueError as e:
+            return jsonify(error=str(e)), 409
+        except (AssertionError, KeyError, TypeError) as e:
+            return jsonify(error=str(e)), 422
+        return jsonify(camera.stats()), 201
+
+    @app.route("/cameras/<cam_id>/zones", methods=["PUT"])
+    def set_zones(cam_id):
+        """Replaces the restricted zones of a camera from a JSON body {"zones": [...]}."""
+        camera = server.cameras.get(cam_id)
+        if camera is None:
+            return jsonify(error=f"camera '{cam_id}' not found"), 404
+        body = request.get_json(force=True, silent=True) or {}
+        try:
+            camera.zones.set(body.get("zones", []))
+        except (AssertionError, KeyError, TypeError, ValueError) as e:
+            return jsonify(error=str(e)), 422
+        return jsonify(camera.zones.stats())
+
+    @app.route("/cameras/<cam_id>", methods=["DELETE"])
+    def remove_camera(cam_id):
+        """Stops and removes a camera, finalizing any recording in progress."""
+        try:
+            server.remove_camera(cam_id)
+        except KeyError:
+            return jsonify(error=f"camera '{cam_id}' not found"), 404
+        return jsonify(success=True)
+
+    return app
+
+
+def parse_opt():
+    """Parses command-line arguments for the detection server."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", nargs="+", type=str, default=ROOT / "best.pt", help="model path")
+    parser.add_argument("--source", nargs="*", default=[], help="initial camera sources, named cam0, cam1, ...")
+    parser.add_argument("--data", type=str, default=ROOT / "data/coco128.yaml", help="dataset.yaml path")
+    parser.add_argument("--imgsz", "--img", "--img-size", nargs="+", type=int, default=[640], help="inference size h,w")
+    parser.add_argument("--conf-thres", type=float, default=CONF_THRESHOLD, help="confidence threshold")
+    parser.add_argument("--iou-thres", type=float, default=0.45, help="NMS IoU threshold")
+    parser.add_argument("--max-det", type=int, default=1000, help="maximum detections per image")
+    parser.add_argument("--device", default="", help="cuda device, i.e. 0 or 0,1,2,3 or cpu")
+    parser.add_argument("--classes", nargs="+", type=int, help="filter by class: --classes 0, or --classes 0 2 3")
+    parser.add_argument("--agnostic-nms", action="store_true", help="class-agnostic NMS")
+    parser.add_argument("--line-thickness", default=2, type=int, help="bounding box thickness (pixels)")
+    parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
+    parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="max frames per inference batch")
+    parser.add_argument("--max-latency", type=float, default=MAX_LATENCY_MS, help="max ms a frame waits for a batch")
+    parser.add_argument("--latency-budget", type=float, default=0, help="adapt stride to this latency (ms), 0 off")
+    parser.add_argument("--zones", type=str, default=None, help="default restricted zones JSON file of cameras")
+    parser.add_argument("--host", default="0.0.0.0", help="HTTP host")
+    parser.add_argument("--port", type=int, default=8000, help="HTTP port")
+    opt = parser.parse_args()
+    opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
+    print_args(vars(opt))
+    return opt
+
+
+def main(opt):
+    """Starts the detection server with the initial cameras and serves the HTTP API until interrupted."""
+    check_requirements(ROOT / "requirements.txt", exclude=("tensorboard", "thop"))
+    setup_logging(LOGGER, LOG_FORMAT, LOG_QUEUE_SIZE)
+    sources, host, port = opt.source, opt.host, opt.port
+    for k in "source", "host", "port":
+        delattr(opt, k)
+    server = DetectionServer(**vars(opt)).start()
+    try:
+        for i, source in enumerate(sources):
+            server.add_camera(f"cam{i}", source)
+        create_app(server).run(host=host, port=port, threaded=True)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
@@ -6,10 +6,28 @@ import { existsSync } from 'fs'
 // Store running processes
 const processes: { [key: string]: any } = {}
 
+// URL of a running detect_server.py; when set, cameras are added to it instead of spawning detect.py per camera
+const detectionServerUrl = process.env.DETECTION_SERVER_URL
+
 export async function POST(request: Request) {
   try {
     const { camId, source } = await request.json()
 
+    if (detectionServerUrl) {
+      // Replace any existing camera with the same id
+      await fetch(`${detectionServerUrl}/cameras/${encodeURIComponent(camId)}`, { method: 'DELETE' })
+      const response = await fetch(`${detectionServerUrl}/cameras`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ camId, source: String(source) })
+      })
+      if (!response.ok) {
+        const { error } = await response.json()
+        throw new Error(error || `Detection server returned ${response.status}`)
+      }
+      return NextResponse.json({ success: true })
+    }
+
     // Kill any existing process for this camera
     if (processes[camId]) {
       processes[camId].kill()
@@ -3,10 +3,24 @@ import { NextResponse } from 'next/server'
 // Reference to the processes object from startDetection
 declare const processes: { [key: string]: any }
 
+// URL of a running detect_server.py, see startDetection
+const detectionServerUrl = process.env.DETECTION_SERVER_URL
+
 export async function POST(request: Request) {
   try {
     const { camId } = await request.json()
 
+    if (detectionServerUrl) {
+      const response = await fetch(`${detectionServerUrl}/cameras/${encodeURIComponent(camId)}`, { method: 'DELETE' })
+      if (response.ok) {
+        return NextResponse.json({ success: true })
+      }
+      return NextResponse.json(
+        { error: 'No running camera found' },
+        { status: 404 }
+      )
+    }
+
     if (processes[camId]) {
       processes[camId].kill()
       delete processes[camId]
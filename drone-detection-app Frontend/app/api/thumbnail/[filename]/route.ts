@@ -1,25 +1,25 @@
 import { type NextRequest, NextResponse } from "next/server"
 import fs from "fs"
 import path from "path"
-import { generateThumbnail } from "@/lib/thumbnail-generator"
 
+// Posters and sprite strips are written next to each recording by the detection engine when it is finalized
 export async function GET(request: NextRequest, { params }: { params: { filename: string } }) {
   const filename = params.filename
 
   try {
     // Sanitize the filename to prevent directory traversal attacks
     const sanitizedFilename = path.basename(filename)
-    const videoPath = path.join(process.cwd(), ".logs", sanitizedFilename)
+    const stem = sanitizedFilename.replace(/\.[^.]+$/, "")
+    const sprite = request.nextUrl.searchParams.get("sprite") !== null
+    const imagePath = path.join(process.cwd(), "public", "logs", sprite ? `${stem}_sprite.jpg` : `${stem}.jpg`)
 
-    // Check if the file exists
-    if (!fs.existsSync(videoPath)) {
-      return NextResponse.json({ error: "Video not found" }, { status: 404 })
+    // Check if the preview exists
+    if (!fs.existsSync(imagePath)) {
+      return NextResponse.json({ error: "Thumbnail not found" }, { status: 404 })
     }
 
-    // Generate or retrieve thumbnail
-    const thumbnailBuffer = await generateThumbnail(videoPath)
-
-    // Return the thumbnail
+    // Return the precomputed preview
+    const thumbnailBuffer = await fs.promises.readFile(imagePath)
     return new NextResponse(thumbnailBuffer, {
       status: 200,
       headers: {
@@ -28,7 +28,7 @@ export async function GET(request: NextRequest, { params }: { params: { filename
       },
     })
   } catch (error) {
-    console.error("Error generating thumbnail:", error)
-    return NextResponse.json({ error: "Failed to generate thumbnail" }, { status: 500 })
+    console.error("Error reading thumbnail:", error)
+    return NextResponse.json({ error: "Failed to read thumbnail" }, { status: 500 })
   }
 }
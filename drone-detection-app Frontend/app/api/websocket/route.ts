@@ -1,14 +1,39 @@
 import { NextResponse } from "next/server"
 
-// This is a placeholder for WebSocket functionality
-// In a real application, you would implement WebSocket server functionality
-// using a library like Socket.io or using Vercel's Edge Functions with WebSockets
-
-export async function GET() {
-  return NextResponse.json(
-    {
-      message: "WebSocket endpoint placeholder. In a production environment, this would be a WebSocket server.",
-    },
-    { status: 200 },
-  )
+// URL of a running detect_server.py (or detect.py --stream-port) whose /events feed is relayed to the browser
+const detectionServerUrl = process.env.DETECTION_SERVER_URL
+
+export const dynamic = "force-dynamic"
+
+// Relays the detection engine's Server-Sent Events feed; reconnecting EventSource clients send Last-Event-ID and are
+// replayed the events they missed
+export async function GET(request: Request) {
+  if (!detectionServerUrl) {
+    return NextResponse.json({ error: "DETECTION_SERVER_URL is not configured" }, { status: 503 })
+  }
+
+  const since = new URL(request.url).searchParams.get("since")
+  const lastEventId = request.headers.get("last-event-id")
+  const url = `${detectionServerUrl}/events${since !== null ? `?since=${encodeURIComponent(since)}` : ""}`
+
+  try {
+    const upstream = await fetch(url, {
+      headers: lastEventId ? { "Last-Event-ID": lastEventId } : {},
+      signal: request.signal,
+      cache: "no-store",
+    })
+    if (!upstream.ok || !upstream.body) {
+      return NextResponse.json({ error: `Detection server returned ${upstream.status}` }, { status: 502 })
+    }
+    return new Response(upstream.body, {
+      headers: {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-store",
+        Connection: "keep-alive",
+      },
+    })
+  } catch (error) {
+    console.error("Error connecting to detection event feed:", error)
+    return NextResponse.json({ error: "Detection server is not reachable" }, { status: 502 })
+  }
 }
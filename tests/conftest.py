@@ -0,0 +1,9 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Pytest configuration: makes the repository modules importable when tests are run from any directory."""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
@@ -0,0 +1,107 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests of the EventStore keyset pagination and query filters."""
+
+import time
+from datetime import datetime
+
+import pytest
+
+from utils.eventstore import EventStore
+from utils.snapshots import threat_level
+
+T0 = 1_700_000_000.0  # epoch seconds of the first test event
+
+
+def event(seq, cam="cam0", confidence=0.9, **extra):
+    """Returns an EventBus-style event dict numbered `seq`, emitted `seq` seconds after T0."""
+    return {
+        "seq": seq,
+        "type": "detection-start",
+        "timestamp": datetime.fromtimestamp(T0 + seq).isoformat(),
+        "camId": cam,
+        "confidence": confidence,
+        **extra,
+    }
+
+
+def seqs(page):
+    """Returns the sequence numbers of the events of a query page."""
+    return [e["seq"] for e in page["events"]]
+
+
+def add(store, events, timeout=5.0):
+    """Adds `events` and waits until the writer thread has stored them."""
+    n = store.written + len(events)
+    for e in events:
+        assert store.add(e)
+    deadline = time.time() + timeout
+    while store.written < n:
+        assert time.time() < deadline, "events not written in time"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Yields an EventStore in a temporary directory, closed after the test."""
+    store = EventStore(tmp_path / "events.db")
+    yield store
+    store.close()
+
+
+def test_pages_newest_first(store):
+    """Pages are returned newest first and the last page has no cursor."""
+    add(store, [event(i) for i in range(7)])
+    page = store.query(limit=3)
+    assert seqs(page) == [6, 5, 4]
+    page = store.query(limit=3, before=page["next"])
+    assert seqs(page) == [3, 2, 1]
+    page = store.query(limit=3, before=page["next"])
+    assert seqs(page) == [0]
+    assert page["next"] is None
+
+
+def test_cursor_stable_across_inserts(store):
+    """A `before` cursor keeps paging through the same events while newer ones are inserted."""
+    add(store, [event(i) for i in range(6)])
+    first = store.query(limit=2)
+    add(store, [event(i) for i in range(6, 10)])
+    assert seqs(store.query(limit=2, before=first["next"])) == [3, 2]
+    assert seqs(store.query(limit=2)) == [9, 8]
+
+
+def test_time_range(store):
+    """`start` is inclusive and `end` exclusive, given as epoch seconds or ISO 8601."""
+    add(store, [event(i) for i in range(10)])
+    assert seqs(store.query(start=T0 + 3, end=T0 + 6)) == [5, 4, 3]
+    start, end = (datetime.fromtimestamp(T0 + x).isoformat() for x in (7, 100))
+    assert seqs(store.query(start=start, end=end)) == [9, 8, 7]
+    assert seqs(store.query(start=T0 + 100)) == []
+    assert seqs(store.query(end=T0)) == []
+
+
+def test_time_range_pages(store):
+    """Pages of a time range stay within it."""
+    add(store, [event(i) for i in range(10)])
+    page = store.query(start=T0 + 2, end=T0 + 8, limit=4)
+    assert seqs(page) == [7, 6, 5, 4]
+    page = store.query(start=T0 + 2, end=T0 + 8, limit=4, before=page["next"])
+    assert seqs(page) == [3, 2]
+    assert page["next"] is None
+
+
+def test_level_filter(store):
+    """Threat levels are derived from the confidence and combine with the other filters."""
+    high, low = threat_level(0.95), threat_level(0.1)
+    assert high != low
+    add(store, [event(0, confidence=0.95), event(1, confidence=0.1), event(2, cam="cam1", confidence=0.95)])
+    assert seqs(store.query(level=high)) == [2, 0]
+    assert seqs(store.query(level=high, camId="cam0")) == [0]
+    assert seqs(store.query(level=low)) == [1]
+    assert seqs(store.query(level=low, start=T0 + 2)) == []
+
+
+def test_track_filter(store):
+    """Events are found by any of their track ids."""
+    add(store, [event(0, trackIds=[1, 2]), event(1, trackId=2), event(2, trackIds=[3])])
+    assert seqs(store.query(trackId=2)) == [1, 0]
+    assert seqs(store.query(trackId=3)) == [2]
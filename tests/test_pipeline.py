@@ -0,0 +1,100 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests of the threaded Pipeline and the drop policies of its StageQueues."""
+
+import itertools
+import threading
+import time
+
+import pytest
+
+from utils.pipeline import STOP, Pipeline, StageQueue
+
+
+def drain(q):
+    """Returns all items currently queued in `q`."""
+    return [q.get() for _ in range(len(q))]
+
+
+def test_drop_oldest():
+    """A full `drop_oldest` queue discards its oldest item to accept a new one."""
+    q = StageQueue(2, "drop_oldest")
+    assert all(q.put(i) for i in range(5))
+    assert drain(q) == [3, 4]
+    assert q.stats()["dropped"] == 3
+
+
+def test_drop_newest():
+    """A full `drop_newest` queue rejects new items."""
+    q = StageQueue(2, "drop_newest")
+    assert [q.put(i) for i in range(4)] == [True, True, False, False]
+    assert drain(q) == [0, 1]
+    assert q.stats()["dropped"] == 2
+
+
+def test_block():
+    """A full `block` queue makes the producer wait until an item is taken, dropping nothing."""
+    q = StageQueue(1, "block")
+    q.put(0)
+    done = []
+    producer = threading.Thread(target=lambda: done.append(q.put(1)), daemon=True)
+    producer.start()
+    time.sleep(0.1)
+    assert producer.is_alive() and not done
+    assert q.get() == 0
+    producer.join(2)
+    assert done == [True]
+    assert q.get() == 1
+    assert q.stats()["dropped"] == 0
+
+
+def test_close_wakes_blocked():
+    """Closing a queue releases a blocked producer and makes an empty queue return STOP."""
+    q = StageQueue(1, "block")
+    q.put(0)
+    done = []
+    producer = threading.Thread(target=lambda: done.append(q.put(1)), daemon=True)
+    producer.start()
+    time.sleep(0.1)
+    q.close()
+    producer.join(2)
+    assert done == [False]
+    assert q.get() == 0
+    assert q.get() is STOP
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "drop_newest"])
+def test_stop_never_dropped(policy):
+    """The stop sentinel is enqueued even on a full queue and later items never push it out."""
+    q = StageQueue(2, policy)
+    q.put(0)
+    q.put(1)
+    assert q.put(STOP, force=True)
+    assert len(q) == 3
+    assert drain(q)[-1] is STOP
+
+
+def test_pipeline_order():
+    """Items pass every stage in order and stages returning None filter items out."""
+    stages = [("double", lambda x: 2 * x, 2, "block"), ("filter", lambda x: x if x % 4 else None, 2, "block")]
+    pipeline = Pipeline(range(20), stages)
+    assert list(pipeline) == [x for x in range(2, 40, 2) if x % 4]
+    assert pipeline.stats()["double"]["processed"] == 20
+
+
+def test_stage_error_stops_pipeline():
+    """An exception in a stage stops all threads and is re-raised from iteration."""
+
+    def fail(x):
+        """Raises on the fifth item."""
+        if x == 5:
+            raise ValueError("bad item")
+        return x
+
+    pipeline = Pipeline(itertools.count(), [("fail", fail, 2, "block"), ("pass", lambda x: x, 2, "block")])
+    out = []
+    with pytest.raises(ValueError, match="bad item"):
+        for x in pipeline:
+            out.append(x)
+    assert out == list(range(len(out))) and len(out) <= 5
+    assert pipeline.stop_event.is_set()
+    assert not any(s.thread.is_alive() for s in [pipeline.capture, *pipeline.stages])
@@ -0,0 +1,119 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests of the RetentionManager eviction order, byte and age budgets and dry-run reports."""
+
+import os
+import time
+
+import pytest
+
+from utils.retention import RetentionManager
+
+DAY = 86400  # seconds
+
+
+def write(directory, name, nbytes=100):
+    """Writes a file of `nbytes` bytes named `name` in `directory` and returns its path."""
+    path = directory / name
+    path.write_bytes(b"\0" * nbytes)
+    return path
+
+
+def evicted(report, directory):
+    """Returns the (key, reason) of the items a report evicts from `directory`, in eviction order."""
+    return [(e["key"], e["reason"]) for e in report[str(directory.resolve())]["evict"]]
+
+
+@pytest.fixture
+def logs(tmp_path):
+    """Returns an empty recordings directory."""
+    (tmp_path / "logs").mkdir()
+    return tmp_path / "logs"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """Returns a factory of RetentionManagers sharing one index, closed after the test."""
+    managers = []
+
+    def manager(budgets):
+        """Opens the index with `budgets` {directory: (max bytes, max age days)}."""
+        managers.append(RetentionManager(tmp_path / "retention.db", budgets))
+        return managers[-1]
+
+    yield manager
+    for m in managers:
+        m.db.close()
+
+
+def test_index_existing_files(logs, manager):
+    """Files already on disk are indexed once, grouped by the recording they belong to."""
+    for name in ("drone_1_High.mp4", "drone_1_High.json", "drone_1_High_sprite.jpg", "drone_2.mp4"):
+        write(logs, name)
+    retention = manager({logs: (0, 0)})
+    assert retention.stats()["directories"][str(logs.resolve())] == {"bytes": 400, "items": 2}
+    assert manager({logs: (0, 0)}).stats() == retention.stats()  # not indexed again
+
+
+def test_byte_budget_evicts_oldest(logs, manager):
+    """Adding an item over the byte budget deletes the oldest items until the directory fits."""
+    retention = manager({logs: (250, 0)})
+    for i in range(3):
+        retention.add(logs, f"rec{i}", [write(logs, f"rec{i}.mp4"), write(logs, f"rec{i}.json", 20)], ts=1000 + i)
+    assert sorted(f.name for f in logs.iterdir()) == ["rec1.json", "rec1.mp4", "rec2.json", "rec2.mp4"]
+    assert retention.stats() == {
+        "directories": {str(logs.resolve()): {"bytes": 240, "items": 2}},
+        "evicted": 1,
+        "freedBytes": 120,
+    }
+
+
+def test_files_added_later(logs, manager):
+    """Files added to an existing item count towards its size and are deleted with it."""
+    retention = manager({logs: (250, 0)})
+    retention.add(logs, "rec0", [write(logs, "rec0.mp4")], ts=1000)
+    retention.add(logs, "rec1", [write(logs, "rec1.mp4")], ts=2000)
+    retention.add(logs, "rec0", [write(logs, "rec0_dvr.mp4")])
+    assert sorted(f.name for f in logs.iterdir()) == ["rec1.mp4"]
+
+
+def test_eviction_order(logs, manager):
+    """Items are evicted exported first, then lowest threat level, then oldest, without deleting on dry runs."""
+    retention = manager({logs: (0, 0)})
+    items = ("old", "Low", 100), ("high", "High", 200), ("low", "Low", 300), ("low2", "Low", 400), ("mid", "Medium", 50)
+    for key, level, ts in items:
+        retention.add(logs, key, [write(logs, f"{key}.mp4")], level=level, ts=ts)
+    assert retention.mark_exported(logs, ["low2"]) == 1
+
+    retention = manager({logs: (250, 0)})  # restarted with a smaller budget
+    report = retention.enforce(dry_run=True)
+    assert evicted(report, logs) == [("low2", "bytes"), ("old", "bytes"), ("low", "bytes")]
+    assert report[str(logs.resolve())]["freedBytes"] == 300
+    assert len(list(logs.iterdir())) == 5 and retention.stats()["evicted"] == 0
+    assert evicted(retention.enforce(), logs) == evicted(report, logs)
+    assert sorted(f.name for f in logs.iterdir()) == ["high.mp4", "mid.mp4"]
+    assert evicted(retention.enforce(dry_run=True), logs) == []
+
+
+def test_age_budget(logs, manager):
+    """Expired items are evicted first, oldest first, and count towards the byte budget."""
+    now = time.time()
+    retention = manager({logs: (0, 0)})
+    for key, level, age in ("a", "High", 3 * DAY), ("b", "High", 2 * DAY), ("c", "Low", 3600), ("d", "High", 7200):
+        retention.add(logs, key, [write(logs, f"{key}.mp4")], level=level, ts=now - age)
+
+    retention = manager({logs: (0, 1)})
+    assert evicted(retention.enforce(dry_run=True), logs) == [("a", "age"), ("b", "age")]
+    retention = manager({logs: (200, 1)})  # 200 bytes left after the expired items: fits
+    assert evicted(retention.enforce(dry_run=True), logs) == [("a", "age"), ("b", "age")]
+    retention = manager({logs: (150, 1)})
+    assert evicted(retention.enforce(), logs) == [("a", "age"), ("b", "age"), ("c", "bytes")]
+    assert sorted(f.name for f in logs.iterdir()) == ["d.mp4"]
+
+
+def test_index_uses_file_times(logs, manager):
+    """Indexed items are dated by their oldest file and ranked by the threat level in their name."""
+    now = time.time()
+    for name, age in ("drone_1_High.mp4", 2 * DAY), ("drone_2_Low.mp4", 3600), ("drone_3_High.mp4", 60):
+        os.utime(write(logs, name), (now - age, now - age))
+    retention = manager({logs: (150, 1)})
+    assert evicted(retention.enforce(dry_run=True), logs) == [("drone_1_High", "age"), ("drone_2_Low", "bytes")]
@@ -0,0 +1,130 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests of the Kalman/Hungarian Tracker: persistent ids, confirmation, expiry, track events and association."""
+
+import torch
+
+from utils.tracker import Tracker
+
+
+def det(*boxes, conf=0.9, cls=0):
+    """Returns an (n, 6) x1, y1, x2, y2, conf, cls detection tensor of `boxes`."""
+    return torch.tensor([[*box, conf, cls] for box in boxes], dtype=torch.float).reshape(-1, 6)
+
+
+def box(x, y, size=20):
+    """Returns the x1, y1, x2, y2 box of side `size` at top-left corner `x`, `y`."""
+    return x, y, x + size, y + size
+
+
+def events_of(events, kind):
+    """Returns the track ids of the events of `kind`."""
+    return [e["id"] for e in events if e["event"] == kind]
+
+
+def test_ids_persist():
+    """A moving object keeps its track id from frame to frame."""
+    tracker = Tracker(min_hits=1)
+    ids = set()
+    for i in range(20):
+        tracks, _ = tracker.update(det(box(100 + 5 * i, 50 + 2 * i)))
+        assert len(tracks) == 1
+        ids.add(int(tracks[0, 6]))
+    assert len(ids) == 1
+
+
+def test_tentative_track_confirmed():
+    """A track is only reported, with one `new` event, once it was matched `min_hits` times."""
+    tracker = Tracker(min_hits=3)
+    for _ in range(2):
+        tracks, events = tracker.update(det(box(100, 100)))
+        assert not len(tracks) and not events
+    assert len(tracker) == 0 and tracker.stats()["tentative"] == 1
+    tracks, events = tracker.update(det(box(100, 100)))
+    assert len(tracks) == 1 and len(tracker) == 1
+    assert events_of(events, "new") == [int(tracks[0, 6])]
+    _, events = tracker.update(det(box(100, 100)))
+    assert events_of(events, "updated") == [int(tracks[0, 6])] and not events_of(events, "new")
+
+
+def test_tentative_track_dropped():
+    """A tentative track that misses a frame is dropped without any event."""
+    tracker = Tracker(min_hits=2)
+    tracker.update(det(box(100, 100)))
+    tracks, events = tracker.update(det())
+    assert not len(tracks) and not events
+    assert len(tracker.info) == 0
+
+
+def test_lost_track_expires():
+    """A confirmed track is lost after `max_age` frames without a match, with one `lost` event."""
+    tracker = Tracker(min_hits=1, max_age=5)
+    tracks, _ = tracker.update(det(box(100, 100)))
+    track_id = int(tracks[0, 6])
+    for _ in range(5):
+        _, events = tracker.update(det())
+        assert not events
+    assert len(tracker) == 1  # still waiting for its object
+    _, events = tracker.update(det())
+    assert events_of(events, "lost") == [track_id]
+    assert len(tracker) == 0 and len(tracker.info) == 0
+
+
+def test_track_resumes_within_max_age():
+    """An object seen again before `max_age` continues its track."""
+    tracker = Tracker(min_hits=1, max_age=5)
+    tracks, _ = tracker.update(det(box(100, 100)))
+    for _ in range(3):
+        tracker.update(det())
+    tracks2, events = tracker.update(det(box(100, 100)))
+    assert int(tracks2[0, 6]) == int(tracks[0, 6])
+    assert events_of(events, "updated") == [int(tracks[0, 6])]
+
+
+def test_new_and_lost_emitted_once():
+    """Over a track's whole life `new` and `lost` are emitted exactly once each."""
+    tracker = Tracker(min_hits=2, max_age=3)
+    events = []
+    for i in range(10):
+        events += tracker.update(det(box(50 + 4 * i, 80)))[1]
+    for _ in range(10):
+        events += tracker.update(det())[1]
+    assert len(events_of(events, "new")) == 1
+    assert len(events_of(events, "lost")) == 1
+    assert events_of(events, "new") == events_of(events, "lost")
+    assert len(events_of(events, "updated")) == 8
+    assert tracker.counts == {"new": 1, "updated": 8, "lost": 1}
+
+
+def test_low_confidence_continues_but_never_starts():
+    """Detections below `high_thres` continue existing tracks but do not start new ones."""
+    tracker = Tracker(high_thres=0.5, min_hits=1)
+    tracks, _ = tracker.update(det(box(100, 100)))
+    track_id = int(tracks[0, 6])
+    tracks, _ = tracker.update(torch.cat((det(box(102, 100), conf=0.2), det(box(300, 300), conf=0.2))))
+    assert tracks[:, 6].tolist() == [track_id]
+    assert len(tracker.info) == 1
+
+
+def test_classes_not_associated():
+    """A detection of another class does not continue a track."""
+    tracker = Tracker(min_hits=1)
+    tracks, _ = tracker.update(det(box(100, 100), cls=0))
+    tracks2, _ = tracker.update(det(box(100, 100), cls=1))
+    assert int(tracks2[0, 6]) != int(tracks[0, 6])
+
+
+def test_crossing_targets():
+    """Two objects crossing paths keep their own ids, whatever the order of their detections."""
+    tracker = Tracker(min_hits=1, iou_thres=0.1)
+    right, left = None, None  # ids of the objects moving right and left
+    for i in range(30):
+        a, b = box(10 + 8 * i, 100), box(250 - 8 * i, 106)  # overlapping while crossing around i = 15
+        d = det(a, b) if i % 2 else det(b, a)
+        tracks, _ = tracker.update(d)
+        assert len(tracks) == 2
+        ids = {tuple(t[:4].tolist()): int(t[6]) for t in tracks}
+        if right is None:
+            right, left = ids[tuple(map(float, a))], ids[tuple(map(float, b))]
+        assert ids[tuple(map(float, a))] == right
+        assert ids[tuple(map(float, b))] == left
+    assert right != left
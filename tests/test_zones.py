@@ -0,0 +1,91 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Tests of the restricted-area Zones: summed-area overlaps, normalized points and zone entries."""
+
+import cv2
+import numpy as np
+import torch
+
+from utils.zones import Zones
+
+SHAPE = (240, 320, 3)  # frame h, w, channels
+L_SHAPE = [[40, 40], [200, 40], [200, 100], [100, 100], [100, 200], [40, 200]]  # concave polygon
+
+
+def tracks(*boxes):
+    """Returns an (n, 7) x1, y1, x2, y2, conf, cls, id tensor of `(box, id)` pairs."""
+    return torch.tensor([[*b, 0.9, 0, i] for b, i in boxes], dtype=torch.float).reshape(-1, 7)
+
+
+def test_overlap_matches_mask():
+    """Summed-area overlaps of a concave polygon equal brute-force pixel counts of its mask."""
+    zones = Zones([{"points": L_SHAPE}], max_side=max(SHAPE))
+    mask = np.zeros(SHAPE[:2], dtype=np.uint8)
+    cv2.fillPoly(mask, [np.array(L_SHAPE, dtype=np.int32)], 1)
+    rng = np.random.default_rng(0)
+    xy = rng.integers(0, (SHAPE[1] - 1, SHAPE[0] - 1), size=(200, 2))
+    wh = rng.integers(1, 120, size=(200, 2))
+    boxes = np.concatenate((xy, np.minimum(xy + wh, (SHAPE[1], SHAPE[0]))), 1)
+    boxes = np.concatenate((boxes, [[120, 120, 180, 180], [40, 40, 200, 200], [150, 60, 160, 160]]))  # notch cases
+    expected = [mask[y1:y2, x1:x2].mean() for x1, y1, x2, y2 in boxes]
+    np.testing.assert_allclose(zones.overlap(boxes, SHAPE)[:, 0], expected)
+    assert zones.overlap([[120, 120, 180, 180]], SHAPE)[0, 0] == 0  # inside the bounding box, outside the polygon
+
+
+def test_overlap_downscaled():
+    """Overlaps stay close to the full-resolution ones when the masks are downscaled."""
+    full, small = Zones([{"points": L_SHAPE}]), Zones([{"points": L_SHAPE}], max_side=80)
+    boxes = np.array([[50, 50, 90, 90], [150, 50, 250, 110], [60, 150, 160, 230], [120, 120, 180, 180]])
+    np.testing.assert_allclose(small.overlap(boxes, SHAPE), full.overlap(boxes, SHAPE), atol=0.1)
+
+
+def test_normalized_zone():
+    """Normalized points scale with the frame size, pixel points do not."""
+    points = np.array(L_SHAPE) / (SHAPE[1], SHAPE[0])
+    zones = Zones([{"points": points.tolist(), "normalized": True}, {"points": L_SHAPE}])
+    norm, pixels = zones.polygons(SHAPE)
+    np.testing.assert_array_equal(norm, L_SHAPE)
+    np.testing.assert_array_equal(pixels, L_SHAPE)
+    big = (SHAPE[0] * 2, SHAPE[1] * 2)
+    norm, pixels = zones.polygons(big)
+    np.testing.assert_array_equal(norm, np.array(L_SHAPE) * 2)
+    np.testing.assert_array_equal(pixels, L_SHAPE)
+    box = [[100, 300, 180, 380]]  # inside the doubled zone only
+    np.testing.assert_allclose(zones.overlap(box, big)[0], [1, 0])
+    assert not zones.overlap(box, SHAPE).any()
+
+
+def test_min_overlap():
+    """Zones with `minOverlap` only count boxes that far inside as hits."""
+    zones = Zones([{"points": L_SHAPE}, {"points": L_SHAPE, "minOverlap": 0.5}])
+    box = [[181, 50, 221, 90]]  # half inside, the polygon edge x = 200 included
+    np.testing.assert_allclose(zones.overlap(box, SHAPE)[0], [0.5, 0.5])
+    assert zones.hits(box, SHAPE).tolist() == [[True, True]]
+    assert zones.hits([[191, 50, 231, 90]], SHAPE).tolist() == [[True, False]]
+
+
+def test_zone_entry_once():
+    """A track entering a zone is reported once while it stays inside, and again after leaving it."""
+    zones = Zones([{"name": "yard", "points": L_SHAPE}])
+    inside, outside = (50, 50, 70, 70), (250, 150, 270, 170)
+    hits, entries = zones.update(tracks((outside, 1)), SHAPE)
+    assert not hits.any() and entries == []
+    hits, entries = zones.update(tracks((inside, 1)), SHAPE)
+    assert hits.tolist() == [[True]]
+    assert entries == [{"event": "zone-entry", "id": 1, "zone": "yard", "overlap": 1.0}]
+    for _ in range(3):
+        assert zones.update(tracks((inside, 1)), SHAPE)[1] == []
+    assert zones.update(tracks(), SHAPE)[1] == []  # missed detection: still inside
+    assert zones.update(tracks((inside, 1)), SHAPE)[1] == []
+    zones.update(tracks((outside, 1)), SHAPE)
+    assert [e["id"] for e in zones.update(tracks((inside, 1)), SHAPE)[1]] == [1]
+    assert zones.stats() == {"zones": 1, "inside": 1, "intrusions": 2}
+
+
+def test_zone_entry_after_lost():
+    """Lost tracks are forgotten, and each of several tracks entering is reported."""
+    zones = Zones([{"points": L_SHAPE}])
+    inside = (50, 50, 70, 70)
+    assert len(zones.update(tracks((inside, 1), (inside, 2)), SHAPE)[1]) == 2
+    zones.update(tracks(), SHAPE, lost={1})
+    assert zones.stats()["inside"] == 1
+    assert [e["id"] for e in zones.update(tracks((inside, 1), (inside, 2)), SHAPE)[1]] == [1]
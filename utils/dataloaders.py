@@ -13,7 +13,7 @@ import time
 from itertools import repeat
 from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
-from threading import Thread
+from threading import Condition, Thread
 from urllib.parse import urlparse
 
 import numpy as np
@@ -428,19 +428,56 @@ class LoadImages:
 
 class LoadStreams:
     # YOLOv5 streamloader, i.e. `python detect.py --source 'rtsp://example.com/media.mp4'  # RTSP, RTMP, HTTP streams`
-    def __init__(self, sources="file.streams", img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
+    def __init__(
+        self,
+        sources="file.streams",
+        img_size=640,
+        stride=32,
+        auto=True,
+        transforms=None,
+        vid_stride=1,
+        headless=False,
+        reconnect=(0.5, 30.0),
+        dead_after=0.0,
+        buffers=2,
+    ):
         """Initializes a stream loader for processing video streams with YOLOv5, supporting various sources including
-        YouTube.
+        YouTube; `headless=True` skips the OpenCV 'q' key check, which needs a display.
+
+        Each stream has a health state in `states`: 'live' while frames arrive, 'degraded' after a failed read,
+        'reconnecting' after repeated failures, reopened with an exponential backoff from `reconnect[0]` to
+        `reconnect[1]` seconds, and 'dead' when a video file ended or a stream stayed down for `dead_after` seconds
+        (0 to retry forever). Streams without a new frame, including dead ones, are left out of the `fresh` frames;
+        iteration stops when all streams are dead.
+
+        Every frame read is numbered and timestamped per stream; iterating waits until at least one stream has a frame
+        that was not returned yet, so no batch is made of stale frames only. After each batch, `fresh` tells which of
+        its frames are new and `capture_times` when they were captured; `dropped` counts per stream the frames
+        overwritten by a newer one before they were returned.
+
+        Without `transforms`, frames are letterboxed on their capture threads, in parallel, and written to their slot
+        of one of `buffers` preallocated contiguous batch arrays, which `__next__` returns as is and cycles through: a
+        returned batch is filled again `buffers - 1` batches later, so consumers holding on to batches for longer, i.e.
+        through pipeline queues, need more buffers. Slots of streams without a new frame are not refreshed and hold an
+        older frame of the stream; skip them using `fresh`.
         """
         torch.backends.cudnn.benchmark = True  # faster for fixed-size inference
         self.mode = "stream"
+        self.headless = headless
         self.img_size = img_size
         self.stride = stride
         self.vid_stride = vid_stride  # video frame-rate stride
         sources = Path(sources).read_text().rsplit() if os.path.isfile(sources) else [sources]
         n = len(sources)
+        self.vid_strides = [vid_stride] * n  # per-stream stride, may be changed while running
         self.sources = [clean_str(x) for x in sources]  # clean source names for later
         self.imgs, self.fps, self.frames, self.threads = [None] * n, [0] * n, [0] * n, [None] * n
+        self.seqs, self.times, self.dropped = [0] * n, [0.0] * n, [0] * n  # frame number, capture time, drop count
+        self.consumed = [0] * n  # frame numbers of the last batch
+        self.fresh, self.capture_times = [True] * n, [0.0] * n  # new frames of the last batch, their capture times
+        self.new_frame = Condition()  # notified when a stream has a new frame or its thread stops
+        self.states, self.reconnects = ["live"] * n, [0] * n  # health state, reconnection attempts
+        self.reconnect, self.dead_after = reconnect, dead_after
         for i, s in enumerate(sources):  # index, source
             # Start thread to read frames from video stream
             st = f"{i + 1}/{n}: {s}... "
@@ -463,9 +500,9 @@ class LoadStreams:
             self.fps[i] = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
 
             _, self.imgs[i] = cap.read()  # guarantee first frame
+            self.seqs[i], self.times[i] = 1, time.time()
             self.threads[i] = Thread(target=self.update, args=([i, cap, s]), daemon=True)
             LOGGER.info(f"{st} Success ({self.frames[i]} frames {w}x{h} at {self.fps[i]:.2f} FPS)")
-            self.threads[i].start()
         LOGGER.info("")  # newline
 
         # check for common shapes
@@ -476,21 +513,81 @@ class LoadStreams:
         if not self.rect:
             LOGGER.warning("WARNING ⚠️ Stream shapes differ. For optimal performance supply similarly-shaped streams.")
 
+        # Batch arrays filled by the capture threads in turn, all frames having the letterboxed shape of the first one
+        self.shape = letterbox(self.imgs[0], img_size, stride=stride, auto=self.auto)[0].shape[:2]
+        self.batches = [] if transforms else [np.empty((n, 3, *self.shape), dtype=np.uint8) for _ in range(buffers)]
+        for batch in self.batches:  # contiguous BCHW, every slot starting with the stream's first frame
+            for i, x in enumerate(self.imgs):
+                batch[i] = self.preprocess(x)
+        self.filling = 0  # index of the batch being filled
+        self.batch = self.batches[0] if self.batches else None
+        for thread in self.threads:
+            thread.start()
+
+    def preprocess(self, im):
+        """Returns BGR HWC image `im` letterboxed to the batch shape as an RGB CHW view, copied once into the batch."""
+        im = letterbox(im, self.shape, stride=self.stride, auto=False)[0]
+        return im[..., ::-1].transpose((2, 0, 1))  # BGR to RGB, HWC to CHW
+
     def update(self, i, cap, stream):
-        """Reads frames from stream `i`, updating imgs array; handles stream reopening on signal loss."""
+        """Reads frames from stream `i`, updating imgs array; reconnects with exponential backoff on signal loss. Video
+        files are read at their frame rate, like a live camera, so recordings can be replayed as streams.
+        """
         n, f = 0, self.frames[i]  # frame number, frame array
-        while cap.isOpened() and n < f:
+        is_file, t0 = isinstance(stream, str) and os.path.isfile(stream), time.time()
+        failures, delay, down = 0, self.reconnect[0], None  # consecutive failed reads, next backoff, time went down
+        while n < f:
+            if not cap.isOpened() or failures >= 5:  # reopen the stream after 5 failed reads, backing off each time
+                down = down or time.time()
+                if self.dead_after and time.time() - down > self.dead_after:
+                    break
+                self.set_state(i, "reconnecting", f"reopening in {delay:.1f}s, backing off to {self.reconnect[1]:g}s")
+                time.sleep(delay)
+                self.reconnects[i] += 1
+                cap.release()
+                cap.open(stream)
+                failures, delay = 0, min(delay * 2, self.reconnect[1])
+                continue
             n += 1
-            cap.grab()  # .read() = .grab() followed by .retrieve()
-            if n % self.vid_stride == 0:
+            success = grabbed = cap.grab()  # .read() = .grab() followed by .retrieve()
+            t = time.time()  # capture time, grab() returns when the frame arrived
+            if grabbed and n % self.vid_strides[i] == 0:
                 success, im = cap.retrieve()
                 if success:
-                    self.imgs[i] = im
-                else:
-                    LOGGER.warning("WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.")
-                    self.imgs[i] = np.zeros_like(self.imgs[i])
-                    cap.open(stream)  # re-open stream if signal was lost
-            time.sleep(0.0)  # wait time
+                    self.set_state(i, "live")  # before the frame is published, so new frames are from live streams
+                    x = None if self.transforms else self.preprocess(im)  # in parallel with the other streams
+                    with self.new_frame:
+                        self.dropped[i] += self.seqs[i] > self.consumed[i]  # the previous frame was never returned
+                        self.imgs[i], self.times[i] = im, t
+                        if x is not None:
+                            self.batch[i] = x
+                        self.seqs[i] += 1
+                        self.new_frame.notify_all()
+            if success:
+                failures, delay, down = 0, self.reconnect[0], None
+                self.set_state(i, "live")
+            elif is_file:
+                if not grabbed:
+                    break  # end of the video file, frames that fail to decode are skipped
+            else:
+                failures += 1
+                self.set_state(i, "degraded", "video stream unresponsive, please check your IP camera connection")
+                time.sleep(1 / self.fps[i])  # retry at the frame rate instead of spinning
+            time.sleep(max(t0 + n / self.fps[i] - time.time(), 0.0) if is_file else 0.0)  # wait time
+        cap.release()
+        self.set_state(i, "dead", "stream ended" if n >= f or is_file else f"down for over {self.dead_after:.0f}s")
+        with self.new_frame:
+            self.new_frame.notify_all()  # wake up __next__ to batch the other streams or stop
+
+    def set_state(self, i, state, reason=""):
+        """Sets the health state of stream `i`, logging changes."""
+        if self.states[i] != state:
+            self.states[i] = state
+            msg = f"{i + 1}/{len(self.states)}: {self.sources[i]} {state}" + (f", {reason}" if reason else "")
+            if state == "live":
+                LOGGER.info(msg)
+            else:
+                LOGGER.warning(f"WARNING ⚠️ {msg}")
 
     def __iter__(self):
         """Resets and returns the iterator for iterating over video frames or images in a dataset."""
@@ -502,17 +599,26 @@ class LoadStreams:
         done.
         """
         self.count += 1
-        if not all(x.is_alive() for x in self.threads) or cv2.waitKey(1) == ord("q"):  # q to quit
+        if not any(x.is_alive() for x in self.threads):
+            raise StopIteration
+        if not self.headless and cv2.waitKey(1) == ord("q"):  # q to quit
             cv2.destroyAllWindows()
             raise StopIteration
 
-        im0 = self.imgs.copy()
+        with self.new_frame:
+            while self.seqs == self.consumed:  # wait for a frame not returned yet
+                if not any(x.is_alive() for x in self.threads):
+                    raise StopIteration
+                self.new_frame.wait(0.1)
+            im0, self.capture_times = self.imgs.copy(), self.times.copy()
+            self.fresh = [s > c for s, c in zip(self.seqs, self.consumed)]
+            self.consumed = self.seqs.copy()
+            if not self.transforms:  # hand off the batch filled by the capture threads, filling the next one
+                im = self.batch
+                self.filling = (self.filling + 1) % len(self.batches)
+                self.batch = self.batches[self.filling]
         if self.transforms:
             im = np.stack([self.transforms(x) for x in im0])  # transforms
-        else:
-            im = np.stack([letterbox(x, self.img_size, stride=self.stride, auto=self.auto)[0] for x in im0])  # resize
-            im = im[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
-            im = np.ascontiguousarray(im)  # contiguous
 
         return self.sources, im, im0, None, ""
 
@@ -0,0 +1,274 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Disk-backed DVR ring of short Motion-JPEG segments per camera, cut into event clips without re-encoding."""
+
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+
+from utils.general import LOGGER
+from utils.pipeline import StageQueue
+
+
+def _chunk(fourcc, data):
+    """Returns a RIFF chunk, padded to an even size."""
+    return fourcc + struct.pack("<I", len(data)) + data + b"\0" * (len(data) & 1)
+
+
+def _list(kind, data):
+    """Returns a RIFF LIST of `kind`."""
+    return b"LIST" + struct.pack("<I", len(data) + 4) + kind + data
+
+
+class AviWriter:
+    """
+    YOLOv5 AviWriter class. Minimal Motion-JPEG AVI muxer writing already-encoded JPEG frames as they are, so frames
+    are stored and moved between files without being decoded or re-encoded. The headers have a fixed size and are
+    rewritten with the final frame count by `close()`, which also appends the frame index.
+
+        avi = AviWriter("clip.avi", 30, (1280, 720))
+        avi.write(cv2.imencode(".jpg", im0)[1].tobytes())
+        avi.close()
+    """
+
+    def __init__(self, path, fps, size):
+        """Creates the file at `path` for `size` (w, h) frames at `fps`."""
+        self.file = open(path, "wb")
+        self.fps, self.size = fps, size
+        self.index = []  # (offset of the frame chunk from the 'movi' fourcc, size)
+        self.max_size = 0
+        self.file.write(self._header())
+        self.movi = self.file.tell() - 4  # position of the 'movi' fourcc, idx1 offsets are relative to it
+
+    def __len__(self):
+        """Returns the number of frames written."""
+        return len(self.index)
+
+    def _header(self, movi_size=4, riff_size=0):
+        """Returns the RIFF, hdrl and movi headers, always of the same size."""
+        (w, h), frames = self.size, len(self.index)
+        avih = struct.pack("<14I", round(1e6 / self.fps), 0, 0, 0x10, frames, 0, 1, self.max_size, w, h, 0, 0, 0, 0)
+        strh = b"vidsMJPG" + struct.pack("<IHH8I4h", 0, 0, 0, 0, 1000, round(self.fps * 1000), 0, frames,
+                                         self.max_size, 0, 0, 0, 0, w, h)
+        strf = struct.pack("<IiiHH4sIiiII", 40, w, h, 1, 24, b"MJPG", w * h * 3, 0, 0, 0, 0)
+        hdrl = _list(b"hdrl", _chunk(b"avih", avih) + _list(b"strl", _chunk(b"strh", strh) + _chunk(b"strf", strf)))
+        movi = b"LIST" + struct.pack("<I", movi_size) + b"movi"
+        return b"RIFF" + struct.pack("<I", riff_size) + b"AVI " + hdrl + movi
+
+    def write(self, jpeg):
+        """Appends one JPEG-encoded frame."""
+        self.index.append((self.file.tell() - self.movi, len(jpeg)))
+        self.max_size = max(self.max_size, len(jpeg))
+        self.file.write(_chunk(b"00dc", jpeg))
+
+    def close(self):
+        """Writes the frame index and final headers, and closes the file."""
+        movi_size = self.file.tell() - self.movi
+        self.file.write(_chunk(b"idx1", b"".join(struct.pack("<4sIII", b"00dc", 0x10, o, n) for o, n in self.index)))
+        riff_size = self.file.tell() - 8
+        self.file.seek(0)
+        self.file.write(self._header(movi_size, riff_size))
+        self.file.close()
+
+
+def read_avi_index(path):
+    """Returns the (w, h) frame size and the (file offset, size) of every frame of an AVI written by AviWriter."""
+    with open(path, "rb") as f:
+        riff, _, kind = struct.unpack("<4sI4s", f.read(12))
+        assert riff == b"RIFF" and kind == b"AVI ", f"{path} is not an AVI file"
+        f.seek(64)  # avih width and height, the AviWriter headers have a fixed layout
+        size = struct.unpack("<II", f.read(8))
+        pos, movi = 12, None
+        f.seek(pos)
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                return size, []
+            fourcc, n = struct.unpack("<4sI", head)
+            if fourcc == b"LIST" and f.read(4) == b"movi":
+                movi = pos + 8
+            elif fourcc == b"idx1":
+                entries = struct.iter_unpack("<4sIII", f.read(n))
+                return size, [(movi + offset + 8, length) for _, _, offset, length in entries]
+            pos += 8 + n + (n & 1)
+            f.seek(pos)
+
+
+class SegmentRing:
+    """
+    YOLOv5 SegmentRing class. Continuously records one camera into fixed-duration Motion-JPEG segments kept as a
+    bounded ring on disk, so pre-roll can span minutes with constant memory and survives a crash of the process.
+
+    `append()` JPEG-encodes the frame on the calling thread, like the jpeg PrerollBuffer, and queues the encoded bytes;
+    a writer thread appends them to the current segment, starts a new segment every `segment_seconds`, and deletes the
+    oldest segments beyond `seconds` of video or `budget` bytes. Segments are named after the times of their first and
+    last frames and are picked up again after a restart. `clip()` cuts an event clip out of the segments covering a
+    time range by copying their JPEG frames into a new AVI on the writer thread: a file operation, not an encode.
+    Frames recorded below `fps`, i.e. read at a higher vid_stride, are repeated in the clip so it plays in real time.
+
+    The ring stands in for a PrerollBuffer: its in-memory `snapshot()` is empty and pre-roll comes from `clip()`.
+
+        ring = SegmentRing("logs/dvr/0", fps=30, segment_seconds=4, seconds=600)
+        ring.append(im0)
+        ring.clip("logs/event_dvr.avi", time.time() - 120, time.time())
+        ring.shutdown()
+    """
+
+    def __init__(
+        self, directory, fps=30, segment_seconds=4, seconds=600, budget=4 << 30, quality=90, maxsize=120,
+        name="dvr", on_clip=None,
+    ):
+        """Initializes the ring in `directory`, recovering its segments, and starts the writer thread; `maxsize`
+        bounds the encoded frames queued for writing and `on_clip(path, info)` is called after each clip is written.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fps = fps or 30
+        self.segment_seconds = segment_seconds
+        self.seconds = seconds
+        self.budget = int(budget)
+        self.quality = int(quality)
+        self.name = name
+        self.on_clip = on_clip
+        self.queue = StageQueue(maxsize, "drop_newest", name=name)
+        self.segments = deque()  # (path, first frame time, last frame time, bytes) of finished segments, oldest first
+        self.nbytes = 0
+        self.writer = None  # AviWriter of the current segment, only touched by the writer thread
+        self.current = None  # [path, first frame time, last frame time] of the current segment
+        self.written, self.clips = 0, 0
+        self._recover()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        """Returns the number of finished segments."""
+        return len(self.segments)
+
+    def append(self, frame, t=None):
+        """Encodes and queues `frame` (BGR uint8) captured at epoch seconds `t` (default now), returning False if it
+        was dropped due to back-pressure.
+        """
+        jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])[1].tobytes()
+        return self.queue.put(("frame", jpeg, (frame.shape[1], frame.shape[0]), time.time() if t is None else t))
+
+    def snapshot(self):
+        """Returns the in-memory pre-roll, always empty: pre-roll is cut from the segments by `clip()`."""
+        return ()
+
+    def clip(self, path, start, end):
+        """Queues writing the frames recorded between epoch seconds `start` and `end` to the AVI file `path`."""
+        self.queue.put(("clip", Path(path), start, end), force=True)
+
+    def shutdown(self, timeout=None):
+        """Writes everything queued and finishes the current segment, then stops the writer thread."""
+        self.queue.put(("stop",), force=True)
+        self.thread.join(timeout)
+
+    def stats(self):
+        """Returns the segment count, seconds and bytes held on disk, frames written, frames dropped and clips cut."""
+        seconds = self.segments[-1][2] - self.segments[0][1] if self.segments else 0.0
+        return {
+            "segments": len(self.segments),
+            "seconds": round(seconds, 1),
+            "bytes": self.nbytes,
+            "written": self.written,
+            "dropped": self.queue.dropped,
+            "clips": self.clips,
+        }
+
+    def _recover(self):
+        """Loads the finished segments left in the directory and deletes unfinished ones."""
+        for path in self.directory.glob("*.part"):
+            path.unlink()
+        for path in sorted(self.directory.glob("seg_*.avi")):
+            start, end = (int(x) / 1e3 for x in path.stem.split("_")[1:3])
+            self.segments.append((path, start, end, path.stat().st_size))
+            self.nbytes += path.stat().st_size
+        self._evict()
+
+    def _run(self):
+        """Writer thread loop dispatching queued frame/clip/stop commands."""
+        while True:
+            cmd, *args = self.queue.get()
+            try:
+                if cmd == "frame":
+                    self._write(*args)
+                elif cmd == "clip":
+                    self._clip(*args)
+                elif cmd == "stop":
+                    self._finish()
+                    break
+            except Exception as e:
+                LOGGER.error(f"{self.name}: error handling '{cmd}': {e}")
+
+    def _write(self, jpeg, size, t):
+        """Appends one encoded frame, starting a new segment when the current one is full or the frame size changed."""
+        if self.writer is not None and (t - self.current[1] >= self.segment_seconds or size != self.writer.size):
+            self._finish()
+        if self.writer is None:
+            path = self.directory / f"seg_{round(t * 1e3)}.part"
+            self.writer, self.current = AviWriter(path, self.fps, size), [path, t, t]
+        self.writer.write(jpeg)
+        self.current[2] = t
+        self.written += 1
+
+    def _finish(self):
+        """Closes the current segment, renames it after its first and last frame times and trims the ring."""
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        path, start, end = self.current
+        final = path.with_name(f"seg_{round(start * 1e3)}_{round(end * 1e3)}.avi")
+        path.rename(final)
+        self.segments.append((final, start, end, final.stat().st_size))
+        self.nbytes += self.segments[-1][3]
+        self._evict()
+
+    def _evict(self):
+        """Deletes the oldest segments while the ring holds more than `seconds` of video or `budget` bytes."""
+        while len(self.segments) > 1 and (
+            self.segments[-1][2] - self.segments[0][1] > self.seconds or self.nbytes > self.budget
+        ):
+            path, *_, nbytes = self.segments.popleft()
+            path.unlink(missing_ok=True)
+            self.nbytes -= nbytes
+
+    def _clip(self, path, start, end):
+        """Copies the frames recorded between `start` and `end` into the AVI file `path`."""
+        if self.current is not None and self.current[1] <= end:
+            self._finish()  # the frames of the current segment are needed
+        avi, first, last = None, None, None
+        for segment, t0, t1, _ in self.segments:
+            if t1 < start or t0 > end:
+                continue
+            size, index = read_avi_index(segment)
+            if avi is not None and size != avi.size:
+                continue  # the frame size changed, an AVI holds frames of one size
+            step = (t1 - t0) / max(len(index) - 1, 1)  # frame times are interpolated within a segment
+            with open(segment, "rb") as f:
+                for i, (offset, n) in enumerate(index):
+                    t = t0 + i * step
+                    if not start <= t <= end:
+                        continue
+                    if avi is None:
+                        avi = AviWriter(path, self.fps, size)
+                    else:  # hold the previous frame until this one's time comes, at least one frame apart
+                        for _ in range(round((t - first) * self.fps) - len(avi)):
+                            avi.write(jpeg)
+                    f.seek(offset)
+                    jpeg = f.read(n)
+                    avi.write(jpeg)
+                    first, last = first or t, t
+        if avi is None:
+            LOGGER.warning(f"WARNING ⚠️ {self.name}: no frames recorded for {path}, nothing to clip")
+            return
+        avi.close()
+        self.clips += 1
+        info = {"frames": len(avi), "start": first, "end": last, "durationSeconds": round(last - first, 2)}
+        LOGGER.info(f"{self.name}: saved {path} ({len(avi)} frames, {last - first:.1f}s)")
+        if self.on_clip is not None:
+            self.on_clip(path, info)
@@ -0,0 +1,123 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Push-based detection event feed served as Server-Sent Events, with sequence numbers and replay from an offset."""
+
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+from flask import Response, jsonify, request
+
+EVENT_TYPES = (
+    "detection-start",
+    "detection-update",
+    "recording-started",
+    "recording-extended",
+    "recording-stopped",
+    "recording-finalized",
+    "snapshot-saved",
+    "zone-intrusion",
+)
+
+
+class EventBus:
+    """
+    YOLOv5 EventBus class. Numbers emitted events and keeps the last `maxlen` of them for replay.
+
+    `emit()` never blocks on clients: an event is JSON-encoded once and appended to a bounded history shared by all
+    subscribers. A reconnecting client passes the last sequence number it received and is replayed everything after
+    it; if part of that range has already been evicted it first receives a `gap` event and should re-fetch state. With
+    an EventStore `store`, every event is also handed to it for permanent, queryable storage.
+
+        events = EventBus()
+        events.emit("detection-start", camId="cam0", confidence=0.91)
+        events.since(0)  # [{"seq": 1, "type": "detection-start", ...}]
+    """
+
+    def __init__(self, maxlen=1000, store=None):
+        """Initializes an empty bus keeping at most `maxlen` events for replay and storing all of them in `store`."""
+        self.store = store
+        self.history = deque(maxlen=max(int(maxlen), 1))  # (event, encoded SSE message)
+        self.cond = threading.Condition()
+        self.seq = 0  # sequence number of the last emitted event
+        self.closed = False
+
+    def emit(self, event_type, **data):
+        """Publishes an event of `event_type` with JSON-serializable `data`, returning the event dict."""
+        with self.cond:
+            self.seq += 1
+            event = {"seq": self.seq, "type": event_type, "timestamp": datetime.now().isoformat(), **data}
+            message = f"id: {self.seq}\nevent: {event_type}\ndata: {json.dumps(event, default=str)}\n\n".encode()
+            self.history.append((event, message))
+            if self.store is not None:
+                self.store.add(event)  # under the lock, so events are stored in sequence order
+            self.cond.notify_all()
+        return event
+
+    def close(self):
+        """Ends all subscriber streams."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def _after(self, seq):
+        """Returns (first missing seq or None, [(event, message)]) for events after `seq`; call with `cond` held."""
+        first = self.history[0][0]["seq"] if self.history else self.seq + 1
+        gap = seq + 1 if seq + 1 < first else None
+        return gap, list(islice(self.history, max(seq + 1 - first, 0), None))
+
+    def since(self, seq=0, limit=None):
+        """Returns the retained events with sequence numbers greater than `seq`, oldest first, at most `limit`."""
+        with self.cond:
+            events = [e for e, _ in self._after(seq)[1]]
+        return events[:limit] if limit else events
+
+    def subscribe(self, seq=None, heartbeat=15.0):
+        """Generator of encoded SSE messages after `seq` (None: only new events), with keep-alive comments when idle."""
+        yield b"retry: 1000\n\n"
+        with self.cond:
+            seq = self.seq if seq is None else max(min(seq, self.seq), 0)
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.seq > seq or self.closed, timeout=heartbeat)
+                if self.closed:
+                    break
+                gap, items = self._after(seq)
+            if gap is not None:
+                missed = {"type": "gap", "from": gap, "to": items[0][0]["seq"] - 1}  # evicted before being replayed
+                yield f"event: gap\ndata: {json.dumps(missed)}\n\n".encode()
+            if not items:
+                yield b": keep-alive\n\n"
+                continue
+            yield b"".join(message for _, message in items)
+            seq = items[-1][0]["seq"]
+
+
+def add_event_routes(app, events):
+    """
+    Adds event feed routes for EventBus `events` to Flask `app`.
+
+    GET /events[?since=<seq>]                  Server-Sent Events; `since` or the Last-Event-ID header replays
+    GET /events/history[?since=<seq>&limit=N]  retained events as JSON
+    """
+
+    @app.route("/events")
+    def event_stream():
+        """Streams events as Server-Sent Events, replaying those after `since` or Last-Event-ID if given."""
+        seq = request.args.get("since", type=int)
+        if seq is None and request.headers.get("Last-Event-ID", "").isnumeric():
+            seq = int(request.headers["Last-Event-ID"])
+        return Response(
+            events.subscribe(seq),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+        )
+
+    @app.route("/events/history")
+    def event_history():
+        """Returns the retained events after `since`, oldest first."""
+        since = request.args.get("since", 0, type=int)
+        return jsonify(seq=events.seq, events=events.since(since, request.args.get("limit", type=int)))
+
+    return app
@@ -0,0 +1,212 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Indexed SQLite store of detection, recording and snapshot events with paginated time-range queries."""
+
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+from flask import jsonify, request
+
+from utils.general import LOGGER
+from utils.pipeline import StageQueue
+from utils.snapshots import threat_level
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    cam TEXT,
+    level TEXT,
+    confidence REAL,
+    recording TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS event_tracks (
+    track INTEGER NOT NULL,
+    event INTEGER NOT NULL,
+    PRIMARY KEY (track, event)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_type ON events (type, id);
+CREATE INDEX IF NOT EXISTS events_cam ON events (cam, id);
+CREATE INDEX IF NOT EXISTS events_level ON events (level, id);
+CREATE INDEX IF NOT EXISTS events_recording ON events (recording, id);
+"""
+COLUMNS = "ts, type, cam, level, confidence, recording, data"
+FILTERS = {"type": "type", "camId": "cam", "level": "level", "recording": "recording"}  # query arg -> column
+
+
+def parse_time(value):
+    """Returns the epoch seconds of `value`, given as epoch seconds or an ISO 8601 string, or None if empty."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def index_fields(event):
+    """Returns the (camId, threat level, confidence, recording, track ids) of an EventBus `event` dict."""
+    detection = event.get("detection") or {}  # snapshot-saved events carry the snapshot metadata
+    frame_info = detection.get("frameInfo") or {}
+    confidence = event.get("confidence", detection.get("confidence"))
+    level = event.get("threatLevel") or detection.get("threatLevel")
+    if level is None and confidence is not None:
+        level = threat_level(confidence)
+    recording = event.get("recording") or frame_info.get("recordingFile")
+    tracks = event.get("trackIds") or frame_info.get("trackIds") or []
+    if event.get("trackId") is not None:
+        tracks = [event["trackId"]]
+    return event.get("camId"), level, confidence, recording, sorted({int(x) for x in tracks})
+
+
+class EventStore:
+    """
+    YOLOv5 EventStore class. Appends every event to a local SQLite database indexed by time, camera, type, threat
+    level, recording and track id, and answers filtered, paginated queries from it.
+
+    `add()` never blocks the detection loop: events are queued and inserted by a writer thread in one transaction per
+    batch, and under sustained overload the newest events are dropped and counted rather than stalling inference.
+    `query()` pages newest first by event id (keyset pagination); a time range is first resolved to an id range on the
+    time index, so every page is an index range scan whose cost does not grow with the size of the archive. Events
+    are stored in emit order, which is also time order.
+
+        store = EventStore("logs/events.db")
+        store.add({"seq": 1, "type": "detection-start", "timestamp": "...", "camId": "cam0", "trackIds": [3]})
+        page = store.query(camId="cam0", start="2024-05-01T00:00:00", limit=50)
+        store.query(camId="cam0", start="2024-05-01T00:00:00", limit=50, before=page["next"])
+        store.close()
+    """
+
+    def __init__(self, path, maxsize=10000, batch=256, name="eventstore"):
+        """Opens or creates the database at `path` and starts the writer thread; `maxsize` bounds the queued events
+        and `batch` the events inserted per transaction.
+        """
+        self.path = str(path)
+        self.batch = max(int(batch), 1)
+        self.name = name
+        self.queue = StageQueue(maxsize, "drop_newest", name=name)
+        self.written = 0
+        with closing(sqlite3.connect(self.path)) as db:  # a connection's context manager commits but does not close
+            db.execute("PRAGMA journal_mode=WAL")  # readers never block the writer and vice versa
+            db.executescript(SCHEMA)
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def add(self, event):
+        """Queues EventBus `event` dict for storage, returning False if it was dropped due to back-pressure."""
+        return self.queue.put(event)
+
+    def close(self, timeout=None):
+        """Writes everything queued, then stops the writer thread."""
+        self.queue.put(None, force=True)
+        self.thread.join(timeout)
+
+    def _connection(self):
+        """Returns a new read-only connection, to be closed by the caller; sqlite3 connections are not shareable
+        between threads, and a connection per query is not left open by short-lived request threads.
+        """
+        return closing(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True))
+
+    def query(
+        self, type=None, camId=None, level=None, recording=None, trackId=None, start=None, end=None, limit=50,
+        before=None,
+    ):
+        """Returns {"events": [...], "next": cursor} with at most `limit` events matching all given filters, newest
+        first; `start` and `end` bound the event time (epoch seconds or ISO 8601) and `before` is the `next` cursor
+        of the previous page, None on the last page.
+        """
+        limit = min(max(int(limit), 1), 1000)
+        where, args = [], []
+        for column, value in zip(FILTERS.values(), (type, camId, level, recording)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if trackId is not None:
+            where.append("id IN (SELECT event FROM event_tracks WHERE track = ?)")
+            args.append(int(trackId))
+
+        if before is not None:
+            where.append("id < ?")
+            args.append(int(before))
+
+        with self._connection() as db:
+            # Resolve the time range to an id range on the time index, so pages are scanned in id order on one index
+            start, end = parse_time(start), parse_time(end)
+            if start is not None:
+                first = db.execute("SELECT id FROM events WHERE ts >= ? ORDER BY ts LIMIT 1", (start,)).fetchone()
+                where.append("id >= ?")
+                args.append(first[0] if first else float("inf"))
+            if end is not None:
+                last = db.execute("SELECT id FROM events WHERE ts < ? ORDER BY ts DESC LIMIT 1", (end,)).fetchone()
+                where.append("id <= ?")
+                args.append(last[0] if last else 0)
+            sql = "SELECT id, data FROM events" + (" WHERE " + " AND ".join(where) if where else "")
+            rows = db.execute(f"{sql} ORDER BY id DESC LIMIT ?", (*args, limit + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {"events": [json.loads(data) for _, data in rows], "next": rows[-1][0] if more else None}
+
+    def count(self):
+        """Returns the number of stored events."""
+        with self._connection() as db:
+            return db.execute("SELECT count(*) FROM events").fetchone()[0]
+
+    def stats(self):
+        """Returns counts of written, queued and dropped events."""
+        return {"written": self.written, "queued": len(self.queue), "dropped": self.queue.dropped}
+
+    def _run(self):
+        """Writer thread loop inserting queued events in batches."""
+        with closing(sqlite3.connect(self.path)) as db:
+            db.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, enough for an event log in WAL mode
+            done = False
+            while not done:
+                item = self.queue.get()
+                events = [item]
+                while len(events) < self.batch and len(self.queue):
+                    events.append(self.queue.get())
+                done = None in events
+                events = [e for e in events if e is not None]
+                try:
+                    self._insert(db, events)
+                except Exception as e:
+                    LOGGER.error(f"{self.name}: error storing {len(events)} events: {e}")
+
+    def _insert(self, db, events):
+        """Inserts `events` and their track ids in one transaction."""
+        with db:
+            for event in events:
+                cam, level, confidence, recording, tracks = index_fields(event)
+                ts = datetime.fromisoformat(event["timestamp"]).timestamp()
+                row = (ts, event["type"], cam, level, confidence, recording, json.dumps(event, default=str))
+                cursor = db.execute(f"INSERT INTO events ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                rows = [(track, cursor.lastrowid) for track in tracks]
+                db.executemany("INSERT OR IGNORE INTO event_tracks VALUES (?, ?)", rows)
+        self.written += len(events)
+
+
+def add_store_routes(app, store):
+    """
+    Adds event query routes for EventStore `store` to Flask `app`.
+
+    GET /events/query[?type=&camId=&level=&recording=&trackId=&start=&end=&limit=N&before=<cursor>]
+        stored events newest first, `start`/`end` as epoch seconds or ISO 8601, `before` the `next` cursor of the
+        previous page
+    """
+
+    @app.route("/events/query")
+    def event_query():
+        """Returns one page of stored events matching the query filters."""
+        args = {k: request.args.get(k) for k in (*FILTERS, "trackId", "start", "end", "before")}
+        try:
+            page = store.query(limit=request.args.get("limit", 50, type=int), **args)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        return jsonify(**page)
+
+    return app
@@ -0,0 +1,196 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Rate-limited structured logging for per-frame and per-detection messages, with an asynchronous log handler."""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+from utils.general import LOGGER
+from utils.telemetry import METRICS
+
+
+def key_name(key):
+    """Returns the display name of a rate-limit key, i.e. 'new:cam0' for ('new', 'cam0')."""
+    return ":".join(str(k) for k in key if k != "") if isinstance(key, tuple) else str(key)
+
+
+class RateLimitedLogger:
+    """
+    YOLOv5 RateLimitedLogger class. Samples and aggregates high-frequency log messages per key.
+
+    `log()` emits at most `burst` messages per key every `interval` seconds and counts the others; the next message
+    emitted for the key, or the periodic sweep if none follows, reports how many were suppressed. `count()` emits no
+    message per occurrence but one aggregate per key and window, i.e. "drone track #7: 312 detections in last 10s".
+
+    Formatting is deferred until a record is actually emitted: messages are %-format strings whose arguments are only
+    applied by the handler, and a callable message is only called when emitted, so suppressed messages cost a dict
+    lookup. Keyword fields are attached to the records as `record.fields` for structured (JSON) output. `interval=0`
+    disables rate limiting.
+
+        rlog = RateLimitedLogger(LOGGER, interval=10)
+        rlog.info("frame", lambda: summary(det))
+        rlog.count(("track", 7), "drone track #%(track)d: %(count)d detections in last %(seconds).0fs", track=7)
+        rlog.flush()
+    """
+
+    def __init__(self, logger=LOGGER, interval=10.0, burst=1, sweep=1.0):
+        """Initializes the limiter for `logger`; expired windows are swept at most every `sweep` seconds."""
+        self.logger = logger
+        self.interval = interval
+        self.burst = burst
+        self.sweep = sweep
+        self.lock = threading.Lock()
+        self.windows = {}  # key -> [window start, emitted, suppressed, level]
+        self.aggregates = {}  # key -> [window start, count, max value, level, msg, fields]
+        self.swept = time.monotonic()
+        self.emitted, self.suppressed = 0, 0
+
+    def log(self, level, key, msg, *args, burst=None, **fields):
+        """Logs `msg % args` (or `msg()` if callable) at `level` unless `key` already logged `burst` messages in the
+        current window.
+        """
+        now = time.monotonic()
+        pending = self._sweep(now)
+        with self.lock:
+            w = self.windows.get(key)
+            if w is None or now - w[0] >= self.interval:
+                if w is not None and w[2]:
+                    fields["suppressed"] = w[2]  # reported with this message instead of by the sweep
+                w = self.windows[key] = [now, 0, 0, level]
+            emit = w[1] < (burst or self.burst)
+            if emit:
+                w[1] += 1
+                self.emitted += 1
+            else:
+                w[2] += 1
+                self.suppressed += 1
+        self._emit(pending)
+        if emit:
+            if callable(msg):
+                msg = msg()
+            if fields.get("suppressed"):
+                msg = msg if args else msg.replace("%", "%%")  # preformatted messages may contain a literal %
+                msg, args = f"{msg} (+%d similar in last %.0fs)", (*args, fields["suppressed"], self.interval)
+            self.logger.log(level, msg, *args, extra={"fields": {"key": key_name(key), **fields}})
+
+    def info(self, key, msg, *args, **fields):
+        """Rate-limited `log()` at INFO level."""
+        self.log(logging.INFO, key, msg, *args, **fields)
+
+    def warning(self, key, msg, *args, **fields):
+        """Rate-limited `log()` at WARNING level."""
+        self.log(logging.WARNING, key, msg, *args, **fields)
+
+    def count(self, key, msg, n=1, value=None, level=logging.INFO, **fields):
+        """Adds `n` occurrences (and the optional `value`, whose max is kept) to the aggregate `key`, logged once per
+        window as `msg % {count, seconds, max, **fields}`.
+        """
+        now = time.monotonic()
+        pending = self._sweep(now)
+        with self.lock:
+            a = self.aggregates.get(key)
+            if a is None:
+                a = self.aggregates[key] = [now, 0, value, level, msg, fields]
+            a[1] += n
+            if value is not None:
+                a[2] = value if a[2] is None else max(a[2], value)
+            if not self.interval or now - a[0] >= self.interval:
+                del self.aggregates[key]
+                pending.append(self._aggregate(a, now))
+        self._emit(pending)
+
+    def flush(self):
+        """Logs all pending aggregates and suppression counts, i.e. at exit."""
+        self._emit(self._sweep(time.monotonic(), force=True))
+
+    def stats(self):
+        """Returns counts of emitted and suppressed messages and of the active keys."""
+        return {"emitted": self.emitted, "suppressed": self.suppressed, "keys": len(self.windows),
+                "aggregates": len(self.aggregates)}
+
+    @staticmethod
+    def _aggregate(a, now):
+        """Returns the (level, msg, mapping) record of the aggregate `a`."""
+        start, count, value, level, msg, fields = a
+        return level, msg, {**fields, "count": count, "seconds": now - start, "max": value}
+
+    def _sweep(self, now, force=False):
+        """Removes the windows and aggregates expired by `now` (all if `force`), returning the records they owe."""
+        if not force and now - self.swept < self.sweep:
+            return []
+        pending = []
+        with self.lock:
+            self.swept = now
+            for key in [k for k, w in self.windows.items() if force or now - w[0] >= self.interval]:
+                start, _, suppressed, level = self.windows.pop(key)
+                if suppressed:
+                    msg = "%(key)s: %(count)d similar messages suppressed in last %(seconds).0fs"
+                    pending.append((level, msg, {"key": key_name(key), "count": suppressed, "seconds": now - start}))
+            for key in [k for k, a in self.aggregates.items() if force or now - a[0] >= self.interval]:
+                pending.append(self._aggregate(self.aggregates.pop(key), now))
+        return pending
+
+    def _emit(self, pending):
+        """Logs `pending` (level, msg, mapping) records outside of the lock, the mapping formatting the message."""
+        for level, msg, data in pending:
+            self.logger.log(level, msg, data, extra={"fields": {k: v for k, v in data.items() if v is not None}})
+
+
+class JsonFormatter(logging.Formatter):
+    # YOLOv5 JsonFormatter class. Formats records as one JSON object per line, including their structured `fields`
+    def format(self, record):
+        """Returns the JSON line of `record`."""
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    # YOLOv5 AsyncHandler class. Queues records for a listener thread; records are dropped and counted when it is full
+    def __init__(self, maxsize=10000):
+        """Initializes the handler with a bounded queue of `maxsize` records."""
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Returns `record` unformatted, so its message is only formatted on the listener thread."""
+        return record
+
+    def enqueue(self, record):
+        """Queues `record` without blocking, dropping it when the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(logger=LOGGER, fmt="text", maxsize=10000):
+    """Moves the handlers of `logger` behind an AsyncHandler of `maxsize` records (0 to keep logging synchronous) and
+    switches them to JSON lines with `fmt` 'json'; returns the QueueListener writing the records, stopped at exit.
+    """
+    handlers = list(logger.handlers)
+    if fmt == "json":
+        for h in handlers:
+            h.setFormatter(JsonFormatter())
+    if not maxsize or not handlers:
+        return None
+    handler = AsyncHandler(maxsize)
+    listener = logging.handlers.QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    for h in handlers:
+        logger.removeHandler(h)
+    logger.addHandler(handler)
+    listener.start()
+    atexit.register(listener.stop)  # write the queued records before the process exits
+    METRICS.counter("log_records_dropped", lambda: handler.dropped)
+    return listener
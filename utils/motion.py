@@ -0,0 +1,95 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Motion gating deciding per frame whether a stream needs a full model inference."""
+
+import time
+
+import cv2
+import numpy as np
+
+GATE_REASONS = "motion", "tracking", "forced", "skipped"  # why a frame was (not) sent to the model
+
+
+class MotionGate:
+    """
+    YOLOv5 MotionGate class. Compares a downscaled, blurred grayscale copy of each frame against a running-average
+    background and lets the frame through to the model only when enough pixels changed.
+
+    A frame is inferred when the changed-pixel fraction reaches `threshold`, while a detection was reported through
+    `update()` within the last `hold` frames, or when `force_every` frames have passed since the last inference, so
+    static scenes are still checked at a reduced rate. Everything else is skipped. The gate is not thread-safe: call
+    `check()` and `update()` in frame order from one thread.
+
+        gate = MotionGate()
+        if gate.check(im0):
+            det = model(im)
+            gate.update(len(det))
+    """
+
+    def __init__(self, width=320, threshold=0.0005, pixel_threshold=25, force_every=30, hold=15, alpha=0.05):
+        """Initializes the gate; the background model is created from the first frame."""
+        self.width = width  # width of the downscaled frame compared against the background
+        self.threshold = threshold  # fraction of changed pixels counted as motion
+        self.pixel_threshold = pixel_threshold  # gray level difference counted as a changed pixel
+        self.force_every = max(int(force_every), 1)
+        self.hold = hold
+        self.alpha = alpha  # background learning rate
+        self.background = None  # float32 running average
+        self.motion = 0.0  # changed-pixel fraction of the last frame
+        self.since = 0  # frames since the last inference
+        self.hold_left = 0  # frames left in which the model runs regardless of motion
+        self.counts = dict.fromkeys(GATE_REASONS, 0)
+        self.gate_t = 0.0  # accumulated seconds spent in check()
+
+    def check(self, im0):
+        """Returns True if the model should run on BGR frame `im0`, updating the background model."""
+        t = time.time()
+        h, w = im0.shape[:2]
+        small = cv2.resize(im0, (self.width, max(round(h * self.width / w), 1)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.motion = 1.0  # no background yet, treat the first frame as motion
+        else:
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            self.motion = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+            cv2.accumulateWeighted(gray, self.background, self.alpha)
+
+        self.since += 1
+        self.hold_left -= 1
+        if self.motion >= self.threshold:
+            reason = "motion"
+        elif self.hold_left >= 0:
+            reason = "tracking"
+        elif self.since >= self.force_every:
+            reason = "forced"
+        else:
+            reason = "skipped"
+        if reason != "skipped":
+            self.since = 0
+        self.counts[reason] += 1
+        self.gate_t += time.time() - t
+        return reason != "skipped"
+
+    def update(self, detections):
+        """Reports the number of detections of the last inferred frame; any detection keeps the model running."""
+        if detections:
+            self.hold_left = self.hold
+
+    def stats(self):
+        """Returns a dict with frame counts per gating decision, the skip rate and the mean gating time (ms)."""
+        frames = sum(self.counts.values())
+        return {
+            **self.counts,
+            "frames": frames,
+            "skip_rate": self.counts["skipped"] / max(frames, 1),
+            "motion_fraction": self.motion,
+            "gate_ms": self.gate_t / max(frames, 1) * 1e3,
+        }
+
+    def summary(self):
+        """Returns a one-line human-readable summary of the gating decisions."""
+        s = self.stats()
+        return (
+            f"motion gate: {s['skip_rate']:.0%} of {s['frames']} frames skipped (motion {s['motion']}, tracking "
+            f"{s['tracking']}, forced {s['forced']}), {s['gate_ms']:.2f}ms/frame"
+        )
@@ -0,0 +1,242 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Multi-stage threaded pipeline with bounded queues and explicit drop policies."""
+
+import threading
+import time
+from collections import deque
+
+from utils.general import LOGGER
+
+DROP_POLICIES = "block", "drop_oldest", "drop_newest"  # behaviour of StageQueue.put() when the queue is full
+STOP = object()  # end-of-stream sentinel, never dropped
+
+
+class StageQueue:
+    # YOLOv5 StageQueue class. Bounded FIFO between two pipeline stages with a drop policy and wait-time accounting
+    def __init__(self, maxsize=4, policy="block", name="queue"):
+        """Initializes a bounded queue; `policy` selects what happens on a full queue, see `DROP_POLICIES`."""
+        assert policy in DROP_POLICIES, f"invalid drop policy '{policy}', valid policies are {DROP_POLICIES}"
+        self.maxsize = max(int(maxsize), 1)
+        self.policy = policy
+        self.name = name
+        self.items = deque()  # (item, enqueue time)
+        self.cond = threading.Condition()
+        self.closed = False
+        self.put_count, self.get_count, self.dropped, self.max_depth = 0, 0, 0, 0
+        self.wait_t = 0.0  # accumulated seconds items spent queued
+
+    def put(self, item, force=False):
+        """Enqueues `item` applying the drop policy; `force=True` always enqueues (used for the stop sentinel)."""
+        with self.cond:
+            if not force and len(self.items) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                if self.policy == "drop_oldest":
+                    self.items.popleft()
+                    self.dropped += 1
+                else:  # block
+                    while len(self.items) >= self.maxsize and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return False
+            self.items.append((item, time.time()))
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.cond.notify_all()
+            return True
+
+    def get(self):
+        """Dequeues the oldest item, blocking until one is available; returns the stop sentinel once closed."""
+        with self.cond:
+            while not self.items:
+                if self.closed:
+                    return STOP
+                self.cond.wait()
+            item, t = self.items.popleft()
+            self.get_count += 1
+            self.wait_t += time.time() - t
+            self.cond.notify_all()
+            return item
+
+    def close(self):
+        """Closes the queue, waking all blocked producers and consumers."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        """Returns the current queue depth."""
+        return len(self.items)
+
+    def stats(self):
+        """Returns a dict with depth, throughput, drop and mean wait time (ms) statistics for this queue."""
+        with self.cond:
+            return {
+                "depth": len(self.items),
+                "max_depth": self.max_depth,
+                "maxsize": self.maxsize,
+                "policy": self.policy,
+                "put": self.put_count,
+                "dropped": self.dropped,
+                "wait_ms": self.wait_t / max(self.get_count, 1) * 1e3,
+            }
+
+
+class Stage:
+    # YOLOv5 Stage class. One worker thread applying `fn` to every item of its input queue
+    def __init__(self, name, fn, inq, outq):
+        """Initializes a stage; `fn(item)` returns the item for the next stage, or None to filter it out."""
+        self.name = name
+        self.fn = fn
+        self.inq, self.outq = inq, outq
+        self.count = 0
+        self.busy_t, self.idle_t = 0.0, 0.0  # seconds spent in fn() and waiting for input
+        self.thread = None
+
+    def stats(self):
+        """Returns a dict with processed count, mean service time (ms) and idle fraction of this stage."""
+        total = self.busy_t + self.idle_t
+        return {
+            "processed": self.count,
+            "service_ms": self.busy_t / max(self.count, 1) * 1e3,
+            "idle": self.idle_t / total if total else 0.0,
+        }
+
+
+class Pipeline:
+    """
+    YOLOv5 Pipeline class running `source` and every stage in its own thread, connected by bounded `StageQueue`s.
+
+    Steady-state throughput is bounded by the slowest stage rather than the sum of all stages. The caller consumes the
+    output of the last stage by iterating the pipeline, e.g.
+
+        pipeline = Pipeline(dataset, [("infer", infer, 4, "block"), ("annotate", annotate, 2, "drop_oldest")])
+        for item in pipeline:
+            ...
+
+    where each stage is a `(name, fn, maxsize, policy)` tuple describing the worker and its *input* queue. The output
+    of the last stage is buffered in a queue of size `out_size` with policy `out_policy`.
+    """
+
+    def __init__(self, source, stages, out_size=2, out_policy="block", name="pipeline"):
+        """Builds queues and stages; threads are started on iteration."""
+        self.source = source
+        self.name = name
+        self.queues, self.stages = [], []
+        for stage_name, fn, maxsize, policy in stages:
+            self.queues.append(StageQueue(maxsize, policy, name=stage_name))
+        self.queues.append(StageQueue(out_size, out_policy, name="output"))
+        for i, (stage_name, fn, _, _) in enumerate(stages):
+            self.stages.append(Stage(stage_name, fn, self.queues[i], self.queues[i + 1]))
+        self.stop_event = threading.Event()
+        self.error = None
+        self.started = False
+        self.capture = Stage("capture", None, None, self.queues[0])
+
+    def _capture(self):
+        """Feeds items from `source` into the first queue until exhausted or stopped."""
+        stage = self.capture
+        try:
+            it = iter(self.source)
+            while not self.stop_event.is_set():
+                t = time.time()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                stage.idle_t += time.time() - t
+                stage.count += 1
+                stage.outq.put(item)
+        except Exception as e:
+            self._fail(stage, e)
+        finally:
+            stage.outq.put(STOP, force=True)
+
+    def _work(self, stage):
+        """Runs `stage.fn` over every item until the stop sentinel arrives, then forwards the sentinel."""
+        try:
+            while True:
+                t0 = time.time()
+                item = stage.inq.get()
+                t1 = time.time()
+                stage.idle_t += t1 - t0
+                if item is STOP:
+                    break
+                if self.stop_event.is_set():
+                    continue  # drain without processing
+                item = stage.fn(item)
+                stage.busy_t += time.time() - t1
+                stage.count += 1
+                if item is not None:
+                    stage.outq.put(item)
+        except Exception as e:
+            self._fail(stage, e)
+        finally:
+            stage.outq.put(STOP, force=True)
+
+    def _fail(self, stage, e):
+        """Records the first stage error and stops the pipeline."""
+        LOGGER.error(f"{self.name}: error in stage '{stage.name}': {e}")
+        if self.error is None:
+            self.error = e
+        self.stop()
+
+    def start(self):
+        """Starts the capture and stage worker threads."""
+        if self.started:
+            return self
+        self.started = True
+        for stage in self.stages:
+            stage.thread = threading.Thread(target=self._work, args=(stage,), name=stage.name, daemon=True)
+            stage.thread.start()
+        self.capture.thread = threading.Thread(target=self._capture, name="capture", daemon=True)
+        self.capture.thread.start()
+        return self
+
+    def stop(self):
+        """Signals all threads to stop; queued items are drained without being processed."""
+        self.stop_event.set()
+        for q in self.queues:
+            q.close()
+
+    def join(self, timeout=5.0):
+        """Waits for all worker threads to exit."""
+        for stage in [self.capture, *self.stages]:
+            if stage.thread is not None:
+                stage.thread.join(timeout)
+
+    def __iter__(self):
+        """Starts the pipeline and yields the output of the last stage; re-raises the first stage error, if any."""
+        self.start()
+        out = self.queues[-1]
+        try:
+            while True:
+                item = out.get()
+                if item is STOP:
+                    break
+                yield item
+        finally:
+            self.stop()
+            self.join()
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        """Returns per-stage statistics, each stage merged with the stats of its input queue."""
+        stats = {"capture": self.capture.stats()}
+        for stage in self.stages:
+            stats[stage.name] = {**stage.stats(), "queue": stage.inq.stats()}
+        stats["output"] = {"queue": self.queues[-1].stats()}
+        return stats
+
+    def summary(self):
+        """Returns a one-line human-readable summary of queue depths, drops and wait times per stage."""
+        parts = []
+        for stage in self.stages:
+            s, q = stage.stats(), stage.inq.stats()
+            parts.append(
+                f"{stage.name}[q {q['depth']}/{q['maxsize']}, wait {q['wait_ms']:.1f}ms, "
+                f"{s['service_ms']:.1f}ms, dropped {q['dropped']}]"
+            )
+        return f"{self.name}: " + " -> ".join(parts)
@@ -0,0 +1,162 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Memory-bounded pre-roll frame buffers holding the seconds of video preceding a detection."""
+
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from utils.general import LOGGER
+
+PREROLL_FORMATS = "jpeg", "raw"  # JPEG-encoded frames or a preallocated raw numpy ring
+
+
+class PrerollBuffer:
+    """
+    YOLOv5 PrerollBuffer class. Keeps the frames captured in the last `seconds` within a fixed byte `budget`.
+
+    With `fmt="jpeg"` every frame is JPEG-encoded on append (~20-40x smaller than raw BGR) and kept in a deque whose
+    total size never exceeds `budget`. With `fmt="raw"` frames are copied into one preallocated `(n, h, w, 3)` ring
+    whose slots are reused, `n` being the frames that fit in `seconds` at `fps` capped by `budget`.
+
+    `snapshot()` returns a sized iterable of BGR frames, oldest first, that can be consumed from another thread (i.e.
+    by `AsyncRecorder`) while frames keep being appended: JPEG frames are immutable, and raw slots overwritten before
+    they are read are skipped. Frames arriving below `fps`, i.e. read at a higher vid_stride, are repeated by their
+    capture times so the snapshot plays back in real time at `fps`.
+    """
+
+    def __init__(self, seconds=15, fps=30, budget=256 << 20, fmt="jpeg", quality=90):
+        """Initializes an empty buffer; the raw ring is allocated on the first append, once the frame shape is known."""
+        assert fmt in PREROLL_FORMATS, f"invalid pre-roll format '{fmt}', valid formats are {PREROLL_FORMATS}"
+        self.fps = fps if fps and np.isfinite(fps) else 30
+        self.seconds = seconds
+        self.maxlen = max(int(round(seconds * self.fps)), 1)  # frames wanted for `seconds` at the stream fps
+        self.budget = int(budget)
+        self.fmt = fmt
+        self.quality = int(quality)
+        self.lock = threading.Lock()
+        self.frames = deque()  # jpeg: (encoded frame, capture time)
+        self.nbytes = 0  # bytes currently held (jpeg) or allocated (raw)
+        self.ring = None  # raw: (n, h, w, c) uint8 slots
+        self.seqs = None  # raw: sequence number of the frame held by each slot, -1 while being written
+        self.times = None  # raw: capture time of the frame held by each slot
+        self.seq = 0  # total frames appended
+
+    def __len__(self):
+        """Returns the number of frames currently buffered."""
+        return len(self.frames) if self.fmt == "jpeg" else min(self.seq, 0 if self.ring is None else len(self.ring))
+
+    def append(self, frame, t=None):
+        """Adds `frame` (BGR uint8) captured at epoch seconds `t` (default now), evicting the oldest frames to stay
+        within `seconds`, `maxlen` and `budget`.
+        """
+        t = time.time() if t is None else t
+        if self.fmt == "jpeg":
+            buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])[1]
+            with self.lock:
+                self.frames.append((buf, t))
+                self.nbytes += buf.nbytes
+                while len(self.frames) > 1 and (
+                    len(self.frames) > self.maxlen or self.nbytes > self.budget or t - self.frames[0][1] > self.seconds
+                ):
+                    self.nbytes -= self.frames.popleft()[0].nbytes
+                self.seq += 1
+            return
+
+        if self.ring is None or self.ring.shape[1:] != frame.shape:
+            self._allocate(frame.shape)
+        i = self.seq % len(self.ring)
+        self.seqs[i] = -1  # mark slot as being written for concurrent readers
+        np.copyto(self.ring[i], frame)
+        self.times[i] = t
+        self.seqs[i] = self.seq
+        self.seq += 1
+
+    def _allocate(self, shape):
+        """Allocates the raw ring for frames of `shape`, capping its length by the byte budget."""
+        frame_bytes = int(np.prod(shape))
+        n = min(self.maxlen, max(self.budget // frame_bytes, 1))
+        if n < self.maxlen:
+            LOGGER.warning(
+                f"WARNING ⚠️ pre-roll budget {self.budget / (1 << 20):.0f} MB holds {n / self.fps:.1f}s of "
+                f"{shape[1]}x{shape[0]} raw frames instead of {self.maxlen / self.fps:.1f}s, consider fmt='jpeg'"
+            )
+        self.ring = np.empty((n, *shape), dtype=np.uint8)
+        self.seqs = np.full(n, -1, dtype=np.int64)
+        self.times = np.zeros(n)
+        self.nbytes = self.ring.nbytes
+        self.seq = 0
+
+    def snapshot(self):
+        """Returns a sized iterable over the currently buffered frames, oldest first, decoded lazily on iteration."""
+        if self.fmt == "jpeg":
+            with self.lock:
+                frames, times = zip(*self.frames) if self.frames else ((), ())
+            return _JpegFrames(frames, self.repeats(times))
+        if self.ring is None:
+            return _JpegFrames([])
+        n = len(self.ring)
+        seqs = range(max(self.seq - n, 0), self.seq)
+        times = self.times[[seq % n for seq in seqs]]
+        if len(times):  # frames captured within `seconds` of the newest one
+            k = int(np.searchsorted(times, times[-1] - self.seconds))
+            seqs, times = seqs[k:], times[k:]
+        return _RingFrames(self, seqs, self.repeats(times))
+
+    def repeats(self, times):
+        """Returns how many times each frame captured at `times` is played at `fps` to last until the next one."""
+        if not len(times):
+            return []
+        i = np.arange(len(times))
+        slots = np.round((np.asarray(times, dtype=float) - times[0]) * self.fps)  # frame index of each capture time
+        slots = np.maximum.accumulate(slots - i) + i  # every frame played at least once
+        return np.diff(slots, append=slots[-1] + 1).astype(int).tolist()
+
+
+class _JpegFrames:
+    # Immutable list of JPEG-encoded frames decoded on iteration, each yielded its number of repeats
+    def __init__(self, frames, repeats=None):
+        """Holds references to encoded frames."""
+        self.frames = frames
+        self.repeats = [1] * len(frames) if repeats is None else repeats
+
+    def __len__(self):
+        """Returns the number of frames, repeats included."""
+        return sum(self.repeats)
+
+    def __iter__(self):
+        """Yields decoded BGR frames."""
+        for buf, n in zip(self.frames, self.repeats):
+            im = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+            for _ in range(n):
+                yield im
+
+
+class _RingFrames:
+    # View over a range of sequence numbers of a raw PrerollBuffer ring, skipping slots overwritten before being read
+    def __init__(self, buffer, seqs, repeats=None):
+        """Holds the ring buffer, the sequence numbers to read and how many times each frame is yielded."""
+        self.buffer, self.seqs = buffer, seqs
+        self.repeats = [1] * len(seqs) if repeats is None else repeats
+        self.skipped = 0
+
+    def __len__(self):
+        """Returns the number of frames in the view, repeats included."""
+        return sum(self.repeats)
+
+    def __iter__(self):
+        """Yields copies of the frames still present in the ring, in order."""
+        ring, slot_seqs = self.buffer.ring, self.buffer.seqs
+        for seq, n in zip(self.seqs, self.repeats):
+            i = seq % len(ring)
+            if slot_seqs[i] != seq:
+                self.skipped += 1
+                continue
+            im = ring[i].copy()
+            if slot_seqs[i] != seq:  # overwritten while copying
+                self.skipped += 1
+                continue
+            for _ in range(n):
+                yield im
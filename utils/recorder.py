@@ -0,0 +1,195 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Asynchronous event recorder writing video files, their previews and metadata off the inference thread."""
+
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from utils.general import LOGGER
+from utils.pipeline import StageQueue
+from utils.telemetry import METRICS
+
+
+class AsyncRecorder:
+    """
+    YOLOv5 AsyncRecorder class. Owns a `cv2.VideoWriter` on a background thread fed by a bounded frame queue.
+
+    `open()` hands over the pre-roll frames (any iterable safe to consume from another thread, i.e.
+    `PrerollBuffer.snapshot()`) and returns immediately; they are decoded and flushed by the writer thread.
+    `write()` never blocks: when the queue is full the frame is dropped and counted, and `pressure` reports how full the
+    queue is. `close()` releases the writer and writes the metadata JSON next to the video, also on the writer thread.
+
+    Previews are built from the frames passing through the writer thread, without decoding the video again: the frame
+    written with the highest detection confidence becomes the poster JPEG (`event.jpg`, at most `poster_width` wide)
+    and `sprite_frames` evenly spaced frames, `sprite_width` wide each, form a horizontal sprite strip
+    (`event_sprite.jpg`). Sprite frames are sampled at a stride that doubles whenever 2 * `sprite_frames` thumbnails
+    are held, so only O(sprite_frames) small thumbnails are kept for recordings of any length.
+
+        recorder = AsyncRecorder()
+        recorder.open("event.mp4", fps, (w, h), preroll=frames, meta={"droneType": "drone"})
+        recorder.write(im0, confidence=0.91)
+        recorder.close(maxDronesSpotted=2)
+        recorder.shutdown()
+    """
+
+    def __init__(
+        self, maxsize=120, fourcc="mp4v", name="recorder", on_close=None, poster_width=640, sprite_frames=10,
+        sprite_width=160,
+    ):
+        """Initializes the recorder and starts its writer thread; `maxsize` is the frame queue capacity and
+        `on_close(path, meta)` is called on the writer thread after each recording is finalized. A `poster_width` or
+        `sprite_frames` of 0 disables the poster or the sprite strip.
+        """
+        self.queue = StageQueue(maxsize, "drop_newest", name=name)
+        self.fourcc = fourcc
+        self.name = name
+        self.on_close = on_close
+        self.poster_width = poster_width
+        self.sprite_frames = sprite_frames
+        self.sprite_width = sprite_width
+        self.poster = None  # (confidence, frame index, frame) of the best frame so far, only touched by the writer
+        self.samples, self.stride = [], 1  # (frame index, thumbnail) sampled every `stride` frames
+        self.writer = None  # only touched by the writer thread
+        self.path = None  # path of the recording being written, as seen by the caller
+        self.meta = None
+        self.written, self.files = 0, 0  # frames written to the current file, files finalized
+        self.dropped_at_open = 0  # queue drop count when the current recording was opened
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    @property
+    def pressure(self):
+        """Returns the frame queue fill ratio in [0, 1]; 1 means new frames are being dropped."""
+        return len(self.queue) / self.queue.maxsize
+
+    def open(self, path, fps, size, preroll=(), meta=None):
+        """Starts a new recording at `path`; `preroll` frames are written first by the writer thread."""
+        self.path = Path(path)
+        self.dropped_at_open = self.queue.dropped
+        self.queue.put(("open", self.path, fps, size, preroll, dict(meta or {})), force=True)
+
+    def write(self, frame, confidence=None):
+        """Queues `frame` for the current recording, returning False if it was dropped due to back-pressure;
+        `confidence` is the frame's highest detection confidence, used to choose the poster.
+        """
+        if self.queue.put(("frame", frame, confidence)):
+            return True
+        dropped = self.queue.dropped - self.dropped_at_open
+        if dropped == 1 or dropped % 100 == 0:
+            LOGGER.warning(f"WARNING ⚠️ {self.name}: queue full, {dropped} frame(s) dropped from {self.path}")
+        return False
+
+    def close(self, **meta):
+        """Finalizes the current recording, merging `meta` into the metadata written next to the video."""
+        meta["droppedFrames"] = self.queue.dropped - self.dropped_at_open
+        self.queue.put(("close", meta), force=True)
+        self.path = None
+
+    def shutdown(self, timeout=None):
+        """Finalizes any open recording after flushing queued frames, then stops the writer thread."""
+        if self.path is not None:
+            self.close()
+        self.queue.put(("stop",), force=True)
+        self.thread.join(timeout)
+
+    def stats(self):
+        """Returns queue statistics plus the number of frames written to the current file and files finalized."""
+        return {**self.queue.stats(), "pressure": self.pressure, "written": self.written, "files": self.files}
+
+    def _run(self):
+        """Writer thread loop dispatching queued open/frame/close commands."""
+        while True:
+            cmd, *args = self.queue.get()
+            try:
+                if cmd == "open":
+                    self._open(*args)
+                elif cmd == "frame":
+                    if self.writer is not None:
+                        with METRICS.time("write", recorder=self.name):
+                            self.writer.write(args[0])
+                        self._sample(*args)
+                        self.written += 1
+                elif cmd == "close":
+                    self._close(*args)
+                elif cmd == "stop":
+                    break
+            except Exception as e:
+                LOGGER.error(f"{self.name}: error handling '{cmd}': {e}")
+
+    def _open(self, path, fps, size, preroll, meta):
+        """Creates the video writer and flushes the pre-roll frames."""
+        if self.writer is not None:
+            self._close({})
+        self.writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*self.fourcc), fps, size)
+        self.meta = {"path": path, "fps": fps, "start": datetime.now(), **meta}
+        self.written = 0
+        self.poster, self.samples, self.stride = None, [], 1
+        for frame in preroll:
+            self.writer.write(frame)
+            self._sample(frame)
+            self.written += 1
+        self.meta["prerollFrames"] = self.written
+
+    def _close(self, meta):
+        """Releases the video writer and writes the recording metadata JSON."""
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        self.files += 1
+        info = self.meta
+        path, fps, start = info.pop("path"), info.pop("fps"), info.pop("start")
+        info.update(meta)
+        info.update(
+            frames=self.written, durationSeconds=round(self.written / fps, 2), endTime=datetime.now().isoformat()
+        )
+        info.setdefault("timestamp", start.isoformat())
+        try:
+            info.update(self._save_previews(path))
+        except Exception as e:
+            LOGGER.error(f"{self.name}: error saving previews of {path}: {e}")
+        self.poster, self.samples = None, []
+        with open(path.with_suffix(".json"), "w") as f:
+            json.dump(info, f, indent=2)
+        LOGGER.info(f"{self.name}: saved {path} ({self.written} frames)")
+        if self.on_close is not None:
+            self.on_close(path, info)
+
+    def _sample(self, frame, confidence=None):
+        """Keeps `frame` as the poster if it is the most confident so far and samples it for the sprite strip."""
+        if self.poster_width and (self.poster is None or (confidence or 0) > self.poster[0]):
+            # Frames are not modified after being written, so the poster is kept by reference until the recording ends
+            self.poster = confidence or 0, self.written, frame
+        if self.sprite_frames and self.written % self.stride == 0:
+            h, w = frame.shape[:2]
+            size = self.sprite_width, max(round(h * self.sprite_width / w), 1)
+            self.samples.append((self.written, cv2.resize(frame, size, interpolation=cv2.INTER_AREA)))
+            if len(self.samples) >= 2 * self.sprite_frames:
+                self.stride *= 2
+                self.samples = [x for x in self.samples if x[0] % self.stride == 0]
+
+    def _save_previews(self, path):
+        """Writes the poster and sprite strip of the recording at `path`, returning their metadata."""
+        info = {}
+        if self.poster is not None:
+            confidence, index, frame = self.poster
+            h, w = frame.shape[:2]
+            if w > self.poster_width:
+                size = self.poster_width, max(round(h * self.poster_width / w), 1)
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            poster = path.with_suffix(".jpg")
+            if cv2.imwrite(str(poster), frame, [cv2.IMWRITE_JPEG_QUALITY, 85]):
+                info["poster"] = {"filename": poster.name, "frame": index, "confidence": round(confidence, 4)}
+        if self.samples:
+            # Evenly spaced among the samples, which are themselves evenly spaced over the recording
+            keep = np.unique(np.linspace(0, len(self.samples) - 1, self.sprite_frames).round().astype(int))
+            frames, thumbs = zip(*(self.samples[i] for i in keep))
+            sprite = path.with_name(f"{path.stem}_sprite.jpg")
+            if cv2.imwrite(str(sprite), np.hstack(thumbs), [cv2.IMWRITE_JPEG_QUALITY, 80]):
+                h, w = thumbs[0].shape[:2]
+                info["sprite"] = {"filename": sprite.name, "frames": list(frames), "tileWidth": w, "tileHeight": h}
+        return info
@@ -0,0 +1,216 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Storage retention for recordings and snapshots: byte and age budgets enforced from a persistent file index."""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from flask import jsonify, request
+
+from utils.general import LOGGER
+
+LEVELS = {"Low": 0, "Medium": 1, "High": 2}  # threat levels, lowest evicted first
+SUFFIXES = "_sprite", "_dvr"  # files of a recording named after it, i.e. event_sprite.jpg
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    dir TEXT NOT NULL,
+    key TEXT NOT NULL,
+    ts REAL NOT NULL,
+    level INTEGER NOT NULL,
+    exported INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL,
+    files TEXT NOT NULL,
+    PRIMARY KEY (dir, key)
+);
+CREATE INDEX IF NOT EXISTS items_order ON items (dir, exported DESC, level, ts);
+CREATE INDEX IF NOT EXISTS items_ts ON items (dir, ts);
+"""
+
+
+def level_of(name):
+    """Returns the threat level rank of a recording or snapshot named with its threat level, 0 if unknown."""
+    return next((rank for level, rank in reversed(LEVELS.items()) if f"_{level}" in name), 0)
+
+
+def recording_files(path, meta):
+    """Returns the files of the recording at `path` with metadata `meta`: video, metadata JSON and previews/clips."""
+    path = Path(path)
+    files = [path, path.with_suffix(".json")]
+    files += [path.with_name(meta[k]["filename"]) for k in ("poster", "sprite") if k in meta]
+    files += [path.with_name(meta["dvrClip"])] if meta.get("dvrClip") else []
+    return files
+
+
+class RetentionManager:
+    """
+    YOLOv5 RetentionManager class. Keeps each managed directory within a byte budget and a maximum age.
+
+    Every recording or snapshot is one item of the index, with all its files (video, metadata, previews), its time,
+    threat level, size and whether it was exported. Items are added as they are written, so the byte totals are kept
+    incrementally and the directories are only scanned once, to build the index of a new database. Expired items are
+    evicted first; then, while a directory is over budget, items are evicted in index order: exported first, then
+    lowest threat level, then oldest. `enforce(dry_run=True)` reports what would be evicted without deleting anything.
+
+        retention = RetentionManager("logs/retention.db", {"logs": (20 << 30, 30), "snapshots": (2 << 30, 0)})
+        retention.add("logs", "event", ["logs/event.mp4", "logs/event.json"], level="High")
+        retention.mark_exported("logs", ["event"])
+        report = retention.enforce(dry_run=True)
+    """
+
+    def __init__(self, path, budgets):
+        """Opens or creates the index at `path` for `budgets` {directory: (max bytes, max age days)}, 0 for no limit,
+        indexing the existing files of directories not indexed yet.
+        """
+        self.budgets = {str(Path(d).resolve()): (int(b), float(days)) for d, (b, days) in budgets.items()}
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), check_same_thread=False)  # shared by recorder and writer threads
+        self.db.executescript(SCHEMA)
+        self.evicted, self.freed = 0, 0
+        with self.lock:
+            for d in self.budgets:
+                if not self.db.execute("SELECT 1 FROM items WHERE dir = ? LIMIT 1", (d,)).fetchone():
+                    self._index(Path(d))
+            rows = self.db.execute("SELECT dir, sum(bytes), count(*) FROM items GROUP BY dir").fetchall()
+            self.totals = {d: [n or 0, c] for d, n, c in rows}  # directory -> [bytes, items]
+
+    def _index(self, directory):
+        """Indexes the recordings and snapshots already in `directory`, grouping files named after the same item."""
+        items = {}
+        for f in directory.glob("drone_*"):
+            if f.is_file():
+                stem = next((f.stem[: -len(s)] for s in SUFFIXES if f.stem.endswith(s)), f.stem)
+                items.setdefault(stem, []).append(f)
+        rows = [
+            (str(directory), key, min(f.stat().st_mtime for f in files), level_of(key), 0,
+             sum(f.stat().st_size for f in files), json.dumps([f.name for f in files]))
+            for key, files in items.items()
+        ]
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        LOGGER.info(f"retention: indexed {len(rows)} items in {directory}")
+
+    def add(self, directory, key, files, level=None, ts=None):
+        """Adds `files` to item `key` of `directory` with threat `level` (i.e. 'High'), creating the item if needed,
+        then enforces the budget of `directory`. Files written later, i.e. a clip, are added to the same key.
+        """
+        d = str(Path(directory).resolve())
+        files = {Path(f).name: Path(f).stat().st_size for f in files if Path(f).exists()}
+        with self.lock:
+            old = self.db.execute("SELECT bytes, files FROM items WHERE dir = ? AND key = ?", (d, key)).fetchone()
+            known = json.loads(old[1]) if old else []
+            nbytes = sum(n for f, n in files.items() if f not in known)
+            names = known + [f for f in files if f not in known]
+            with self.db:
+                if old:
+                    self.db.execute(
+                        "UPDATE items SET bytes = bytes + ?, files = ? WHERE dir = ? AND key = ?",
+                        (nbytes, json.dumps(names), d, key),
+                    )
+                else:
+                    row = (d, key, ts or time.time(), LEVELS.get(level, level_of(key)), 0, nbytes, json.dumps(names))
+                    self.db.execute("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            total = self.totals.setdefault(d, [0, 0])
+            total[0] += nbytes
+            total[1] += 0 if old else 1
+        if d in self.budgets:
+            self.enforce(directories=(d,))
+
+    def mark_exported(self, directory, keys):
+        """Marks items `keys` of `directory` as exported, making them the first to be evicted; returns the count."""
+        d = str(Path(directory).resolve())
+        with self.lock, self.db:
+            rows = [(d, k) for k in keys]
+            cursor = self.db.executemany("UPDATE items SET exported = 1 WHERE dir = ? AND key = ?", rows)
+        return cursor.rowcount
+
+    def _plan(self, d, now):
+        """Returns the (key, bytes, files, reason) of the items of directory `d` to evict, in eviction order."""
+        budget, days = self.budgets[d]
+        evict = []
+        if days:
+            rows = self.db.execute(
+                "SELECT key, bytes, files FROM items WHERE dir = ? AND ts < ? ORDER BY ts", (d, now - days * 86400)
+            )
+            evict += [(*row, "age") for row in rows]
+        excess = self.totals.get(d, [0])[0] - sum(e[1] for e in evict) - budget
+        if budget and excess > 0:
+            expired = {e[0] for e in evict}
+            rows = self.db.execute(
+                "SELECT key, bytes, files FROM items WHERE dir = ? ORDER BY exported DESC, level, ts", (d,)
+            )
+            for row in rows:  # streamed from the index, stops as soon as the directory fits its budget
+                if excess <= 0:
+                    break
+                if row[0] not in expired:
+                    evict.append((*row, "bytes"))
+                    excess -= row[1]
+        return evict
+
+    def enforce(self, dry_run=False, directories=None):
+        """Evicts items over the age and byte budgets, or only reports them with `dry_run`; returns a report dict."""
+        report = {}
+        now = time.time()
+        with self.lock:
+            for d in directories or self.budgets:
+                evict = self._plan(d, now)
+                freed = sum(e[1] for e in evict)
+                total = self.totals.setdefault(d, [0, 0])
+                report[d] = {
+                    "bytes": total[0],
+                    "items": total[1],
+                    "budgetBytes": self.budgets[d][0],
+                    "maxAgeDays": self.budgets[d][1],
+                    "evict": [{"key": k, "bytes": n, "reason": reason} for k, n, _, reason in evict],
+                    "freedBytes": freed,
+                }
+                if dry_run or not evict:
+                    continue
+                for key, _, files, _ in evict:
+                    for name in json.loads(files):
+                        (Path(d) / name).unlink(missing_ok=True)
+                with self.db:
+                    self.db.executemany("DELETE FROM items WHERE dir = ? AND key = ?", [(d, e[0]) for e in evict])
+                total[0] -= freed
+                total[1] -= len(evict)
+                self.evicted += len(evict)
+                self.freed += freed
+                LOGGER.info(f"retention: evicted {len(evict)} items ({freed / (1 << 20):.1f} MB) from {d}")
+        return report
+
+    def stats(self):
+        """Returns the indexed bytes and items per directory and the items and bytes evicted so far."""
+        return {
+            "directories": {d: {"bytes": n, "items": c} for d, (n, c) in self.totals.items()},
+            "evicted": self.evicted,
+            "freedBytes": self.freed,
+        }
+
+
+def add_retention_routes(app, retention, directories):
+    """
+    Adds retention routes for RetentionManager `retention` to Flask `app`; `directories` maps the names used in
+    requests to managed directories, i.e. {"recordings": LOGS_DIR, "snapshots": SNAPSHOT_DIR}.
+
+    GET  /retention                        dry-run report of the items that would be evicted now
+    POST /retention/<name>/exported        {"keys": [...]} marks items as exported, evicted first
+    """
+
+    @app.route("/retention")
+    def retention_report():
+        """Returns the dry-run retention report and index statistics."""
+        return jsonify(report=retention.enforce(dry_run=True), **retention.stats())
+
+    @app.route("/retention/<name>/exported", methods=["POST"])
+    def retention_exported(name):
+        """Marks items of a managed directory as exported."""
+        if name not in directories:
+            return jsonify(error=f"unknown directory '{name}', valid names are {list(directories)}"), 404
+        keys = (request.get_json(silent=True) or {}).get("keys")
+        if not isinstance(keys, list):
+            return jsonify(error="'keys' list required"), 400
+        return jsonify(marked=retention.mark_exported(directories[name], [str(k) for k in keys]))
+
+    return app
@@ -0,0 +1,126 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Track-guided region-of-interest scheduling: full-frame detection every K frames, target crops in between."""
+
+import numpy as np
+
+
+class RoiScheduler:
+    """
+    YOLOv5 RoiScheduler class. Decides per frame whether one stream needs a full-frame inference or only
+    native-resolution crops around the predicted positions of the targets it is following.
+
+    `plan()` returns None for a full frame, which happens every `every` frames, while no target is followed, when more
+    than `max_crops` crops would be needed, or after a crop lost its target. Otherwise it returns one `size` x `size`
+    crop (larger for large targets) per target, centred on its position extrapolated at constant velocity. `update()`
+    takes the frame's detections in frame coordinates and re-associates them with the targets. The scheduler is not
+    thread-safe, and `plan()` expects the previous frame's `update()` to have run: call both in frame order from one
+    thread.
+
+        roi = RoiScheduler(every=10)
+        regions = roi.plan(im0.shape, frame)  # None or [(x1, y1, x2, y2), ...]
+        ...
+        roi.update(det, frame, regions)
+    """
+
+    def __init__(self, every=10, size=640, max_crops=4, conf_thres=0.5):
+        """Initializes the scheduler; `size` is the native crop side, normally the model input size."""
+        self.every = max(int(every), 1)
+        self.size = size
+        self.max_crops = max_crops
+        self.conf_thres = conf_thres  # detections starting a target on full frames
+        self.targets = np.zeros((0, 7))  # x1, y1, x2, y2, vx, vy, frame of the last sighting
+        self.since_full = self.every  # frames since the last full-frame inference, forces one on the first frame
+        self.force_full = False  # set when a crop lost its target
+        self.full_frames, self.crop_frames, self.crops, self.losses = 0, 0, 0, 0
+
+    def predict(self, frame):
+        """Returns the (n, 4) target boxes extrapolated to `frame`."""
+        t = self.targets
+        d = (frame - t[:, 6:7]) * t[:, 4:6]
+        return t[:, :4] + np.concatenate((d, d), 1)
+
+    def plan(self, shape, frame):
+        """Returns the crop regions to infer for a frame of `shape` at `frame`, or None for a full-frame inference."""
+        h, w = shape[:2]
+        if self.force_full or self.since_full >= self.every or not len(self.targets) or min(h, w) <= self.size:
+            return self._full()
+        regions = []
+        for x1, y1, x2, y2 in self.predict(frame):
+            if any(rx1 <= x1 and ry1 <= y1 and x2 <= rx2 and y2 <= ry2 for rx1, ry1, rx2, ry2 in regions):
+                continue  # already inside another crop
+            side = int(min(max(self.size, 1.25 * max(x2 - x1, y2 - y1)), h, w))
+            cx = int(np.clip((x1 + x2) / 2 - side / 2, 0, w - side))
+            cy = int(np.clip((y1 + y2) / 2 - side / 2, 0, h - side))
+            regions.append((cx, cy, cx + side, cy + side))
+        if len(regions) > self.max_crops:
+            return self._full()
+        self.since_full += 1
+        self.crop_frames += 1
+        self.crops += len(regions)
+        return regions
+
+    def _full(self):
+        """Records a planned full-frame inference and returns None."""
+        self.since_full, self.force_full = 1, False
+        self.full_frames += 1
+        return None
+
+    def update(self, det, frame, regions=None):
+        """Associates the detections of `frame` (tensor or array of x1, y1, x2, y2, conf, cls in frame coordinates)
+        with the targets, `regions` being what `plan()` returned for that frame; on crop frames a target without a
+        detection in its crop forces a full frame next.
+        """
+        det = det.cpu().numpy() if hasattr(det, "cpu") else np.asarray(det)
+        det = det[det[:, 4] >= self.conf_thres] if len(det) else np.zeros((0, 6))
+        centers = (det[:, :2] + det[:, 2:4]) / 2
+        if regions is None:  # full frame: every confident detection is a target
+            prev = self.targets
+            self.targets = np.zeros((len(det), 7))
+            self.targets[:, :4], self.targets[:, 6] = det[:, :4], frame
+            if len(prev) and len(det):  # keep velocities of targets seen before, matched by nearest centre
+                pc = (prev[:, :2] + prev[:, 2:4]) / 2
+                dist = np.linalg.norm(centers[:, None] - pc[None], axis=2)
+                j = dist.argmin(1)
+                near = dist[np.arange(len(det)), j] < self.size / 2
+                dt = np.maximum(frame - prev[j, 6], 1)[:, None]
+                self.targets[near, 4:6] = ((centers - pc[j]) / dt)[near]
+            return
+
+        for k, box in enumerate(self.predict(frame)):
+            pc = (box[:2] + box[2:]) / 2
+            inside = np.zeros(len(det), dtype=bool)  # detections in the crop the target was predicted in
+            for x1, y1, x2, y2 in regions:
+                if x1 <= pc[0] < x2 and y1 <= pc[1] < y2:
+                    cx, cy = centers[:, 0], centers[:, 1]
+                    inside = (x1 <= cx) & (cx < x2) & (y1 <= cy) & (cy < y2)
+                    break
+            if not inside.any():
+                self.force_full = True  # target lost, look at the whole frame again
+                self.losses += 1
+                continue
+            candidates = np.flatnonzero(inside)
+            i = candidates[np.linalg.norm(centers[candidates] - pc, axis=1).argmin()]
+            t = self.targets[k]
+            dt = max(frame - t[6], 1)
+            t[4:6] = (centers[i] - (t[:2] + t[2:4]) / 2) / dt
+            t[:4], t[6] = det[i, :4], frame
+
+    def stats(self):
+        """Returns a dict with full-frame and crop-frame counts, crops per crop frame and target losses."""
+        frames = self.full_frames + self.crop_frames
+        return {
+            "targets": len(self.targets),
+            "full_frames": self.full_frames,
+            "crop_frames": self.crop_frames,
+            "crop_rate": self.crop_frames / max(frames, 1),
+            "crops_per_frame": self.crops / max(self.crop_frames, 1),
+            "losses": self.losses,
+        }
+
+    def summary(self):
+        """Returns a one-line human-readable summary of the scheduling decisions."""
+        s = self.stats()
+        return (
+            f"roi: {s['crop_rate']:.0%} of {s['full_frames'] + s['crop_frames']} frames as crops "
+            f"({s['crops_per_frame']:.1f} crops/frame, {s['losses']} losses, {s['targets']} targets)"
+        )
@@ -0,0 +1,188 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Background snapshot writer keeping the best-scored frames of each detection event."""
+
+import json
+import math
+import platform
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+from utils.general import LOGGER
+from utils.pipeline import StageQueue
+
+# Static system metadata, queried once per process instead of once per snapshot
+SYSTEM_INFO = {
+    "deviceInfo": {"platform": platform.system(), "version": platform.version(), "machine": platform.machine()},
+    "detectionSystem": "YOLOv5",
+}
+
+
+def threat_level(confidence):
+    """Returns the threat level of a detection with `confidence`."""
+    return "High" if confidence > 0.8 else "Medium" if confidence > 0.65 else "Low"
+
+
+def sharpness(im, box, side=128):
+    """Returns the sharpness of the `box` region of BGR image `im` in [0, 1), from the variance of its Laplacian on a
+    grayscale copy downscaled to at most `side` pixels.
+    """
+    h, w = im.shape[:2]
+    x1, y1, x2, y2 = (int(v) for v in box)
+    x1, y1 = min(max(x1, 0), w - 1), min(max(y1, 0), h - 1)
+    crop = im[y1 : max(y2, y1 + 1), x1 : max(x2, x1 + 1)]
+    r = side / max(crop.shape[:2])
+    if r < 1:
+        crop = cv2.resize(crop, (max(round(crop.shape[1] * r), 1), max(round(crop.shape[0] * r), 1)))
+    v = cv2.Laplacian(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY), cv2.CV_32F).var()
+    return float(v / (v + 100))  # 100 is roughly the variance of a slightly soft edge
+
+
+class SnapshotWriter:
+    """
+    YOLOv5 SnapshotWriter class. Selects and writes the best `k` snapshots of every detection event off the calling
+    thread.
+
+    `offer()` scores a frame from its most confident box as a weighted sum of confidence, box size relative to the
+    frame and sharpness of the box region. Frames that cannot beat the worst kept candidate are rejected before the
+    sharpness is computed, and candidates less than `min_gap` frames apart compete for one slot, so near-duplicate
+    frames are not kept together. `end()` hands the kept candidates to the writer thread, which JPEG-encodes them and
+    writes their metadata JSON; `on_save(key, metadata)` is called there after each snapshot.
+
+        snapshots = SnapshotWriter("snapshots", k=3)
+        snapshots.offer(("cam0", "event.mp4"), im0, tracks, names, {"frameNumber": 12})
+        snapshots.end(("cam0", "event.mp4"))
+        snapshots.shutdown()
+    """
+
+    WEIGHTS = 0.5, 0.25, 0.25  # confidence, box size, sharpness
+
+    def __init__(self, directory, k=3, min_gap=15, maxsize=32, name="snapshots", on_save=None):
+        """Initializes the writer and starts its thread; `maxsize` bounds the events queued for writing."""
+        self.directory = Path(directory)
+        self.k = max(int(k), 1)
+        self.min_gap = min_gap
+        self.on_save = on_save
+        self.name = name
+        self.lock = threading.Lock()  # guards candidates, offer() may be called from several camera threads
+        self.candidates = {}  # event key -> [(score, frame number, im, metadata), ...]
+        self.queue = StageQueue(maxsize, "block", name=name)
+        self.offered, self.scored, self.saved = 0, 0, 0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def offer(self, key, im, tracks, names, frame_info):
+        """Offers frame `im` of event `key` with its (n, 7) x1, y1, x2, y2, conf, cls, id `tracks`, returning True if
+        it is kept as a candidate. `frame_info` (with at least `frameNumber`) is stored in the snapshot metadata.
+        """
+        if not len(tracks):
+            return False
+        self.offered += 1
+        j = int(tracks[:, 4].argmax())
+        *box, conf, cls, _ = tracks[j].tolist()
+        h, w = im.shape[:2]
+        size = min(math.sqrt(max(box[2] - box[0], 0) * max(box[3] - box[1], 0) / (h * w)), 1.0)
+        wc, ws, wsharp = self.WEIGHTS
+        partial = wc * conf + ws * size
+        frame = frame_info.get("frameNumber", 0)
+        with self.lock:
+            kept = self.candidates.setdefault(key, [])
+            if len(kept) >= self.k and partial + wsharp <= kept[-1][0]:
+                return False  # cannot beat the worst candidate even if perfectly sharp
+        sharp = sharpness(im, box)
+        self.scored += 1
+        score = partial + wsharp * sharp
+        with self.lock:
+            kept = self.candidates.setdefault(key, [])
+            near = [c for c in kept if abs(c[1] - frame) < self.min_gap]
+            if any(c[0] >= score for c in near):
+                return False
+            quality = {"score": round(score, 4), "size": round(size, 4), "sharpness": round(sharp, 4)}
+            meta = {
+                "time": datetime.now(),
+                "droneType": names[int(cls)],
+                "confidence": conf,
+                "coordinates": tracks[:, :4].tolist(),
+                "frameInfo": dict(frame_info),
+                "quality": quality,
+            }
+            # Frames are not modified after being offered, so they are kept by reference like recorder frames
+            kept = [c for c in kept if abs(c[1] - frame) >= self.min_gap] + [(score, frame, im, meta)]
+            self.candidates[key] = sorted(kept, key=lambda c: -c[0])[: self.k]
+        return True
+
+    def end(self, key):
+        """Ends event `key`, queueing its kept candidates for writing."""
+        with self.lock:
+            kept = self.candidates.pop(key, [])
+        if kept:
+            self.queue.put((key, kept), force=True)
+
+    def shutdown(self, timeout=None):
+        """Ends all open events, writes everything queued, then stops the writer thread."""
+        for key in list(self.candidates):
+            self.end(key)
+        self.queue.put(None, force=True)
+        self.thread.join(timeout)
+
+    def stats(self):
+        """Returns counts of offered, scored and saved frames and of open events."""
+        return {"offered": self.offered, "scored": self.scored, "saved": self.saved, "events": len(self.candidates)}
+
+    def _run(self):
+        """Writer thread loop saving queued events."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            key, kept = item
+            for rank, (_, _, im, meta) in enumerate(kept, 1):
+                try:
+                    metadata = self._save(im, meta, rank)
+                except Exception as e:
+                    LOGGER.error(f"{self.name}: error saving snapshot: {e}")
+                    continue
+                if metadata is not None and self.on_save is not None:
+                    self.on_save(key, metadata)
+
+    def _save(self, im, meta, rank):
+        """Writes one snapshot JPEG and its metadata JSON, returning the metadata or None on failure."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        t, conf = meta["time"], meta["confidence"]
+        level = threat_level(conf)
+        info = meta["frameInfo"]
+        suffix = f"_{info['camId']}" if info.get("camId") else ""
+        filename = (
+            f"drone_snapshot_{t.strftime('%Y%m%d_%H%M%S')}_{meta['droneType']}_{level}_{conf:.2f}{suffix}_"
+            f"{info.get('frameNumber', 0)}_{rank}.jpg"
+        )
+        path = self.directory / filename
+        if len(im.shape) == 2:  # If grayscale
+            im = cv2.cvtColor(im, cv2.COLOR_GRAY2BGR)
+        if not cv2.imwrite(str(path), im):
+            LOGGER.error(f"Failed to save image to {path}")
+            return None
+        metadata = {
+            "image": {
+                "filename": filename,
+                "timestamp": t.isoformat(),
+                "dimensions": {"width": im.shape[1], "height": im.shape[0], "channels": im.shape[2]},
+                "format": "jpg",
+            },
+            "detection": {
+                "droneType": meta["droneType"],
+                "confidence": conf,
+                "threatLevel": level,
+                "coordinates": meta["coordinates"],
+                "frameInfo": meta["frameInfo"],
+                "quality": {**meta["quality"], "rank": rank},
+            },
+            "system": {"captureTime": t.isoformat(), **SYSTEM_INFO},
+        }
+        with open(path.with_suffix(".json"), "w") as f:  # written after the image, readers pair them by name
+            json.dump(metadata, f)
+        self.saved += 1
+        LOGGER.info(f"Successfully saved snapshot to {path}")
+        return metadata
@@ -0,0 +1,164 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""MJPEG-over-HTTP live streaming of annotated frames with encode-once fan-out to all clients."""
+
+import logging
+import threading
+import time
+
+import cv2
+from flask import Response, jsonify, request
+
+from utils.general import LOGGER
+
+BOUNDARY = "frame"  # multipart boundary of the MJPEG stream
+
+
+class FrameBroadcaster:
+    """
+    YOLOv5 FrameBroadcaster class. Holds the latest annotated frame of one stream and serves it as JPEG to clients.
+
+    `publish()` only stores a reference, so inference never waits on clients. Each published frame is JPEG-encoded at
+    most once per requested output width, by whichever client asks first, and the bytes are shared by all clients.
+    Every client waits for the next frame after the one it last sent; a slow client therefore skips the frames it
+    missed instead of queueing them.
+    """
+
+    def __init__(self, fps=15, quality=80, max_widths=4):
+        """Initializes an empty broadcaster publishing at most `fps` frames per second."""
+        self.interval = 1 / fps
+        self.quality = quality
+        self.max_widths = max_widths  # distinct output widths cached per frame
+        self.cond = threading.Condition()
+        self.frame, self.seq, self.t = None, 0, 0.0  # latest frame, its sequence number and publish time
+        self.cache = {}  # width -> (seq, jpeg bytes)
+        self.encode_lock = threading.Lock()
+        self.clients, self.encoded, self.closed = 0, 0, False
+
+    def wants_frame(self):
+        """Returns True if a client is connected and the publish interval has elapsed."""
+        return self.clients > 0 and time.time() - self.t >= self.interval
+
+    def publish(self, frame):
+        """Publishes `frame` (BGR) to all clients; the frame must not be modified afterwards."""
+        with self.cond:
+            self.frame, self.t = frame, time.time()
+            self.seq += 1
+            self.cond.notify_all()
+
+    def close(self):
+        """Ends all client streams."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def jpeg(self, width=None):
+        """Returns (seq, JPEG bytes) of the latest frame resized to `width`, encoding it only if not cached yet."""
+        with self.cond:
+            frame, seq = self.frame, self.seq
+            cached = self.cache.get(width)
+        if frame is None:
+            return seq, None
+        if cached and cached[0] == seq:
+            return cached
+        with self.encode_lock:  # concurrent clients wait for one encode instead of encoding the same frame
+            cached = self.cache.get(width)
+            if cached and cached[0] == seq:
+                return cached
+            h, w = frame.shape[:2]
+            if width and width < w:
+                frame = cv2.resize(frame, (width, round(h * width / w)), interpolation=cv2.INTER_AREA)
+            buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])[1].tobytes()
+            if width not in self.cache and len(self.cache) >= self.max_widths:
+                self.cache.pop(next(iter(self.cache)))
+            self.cache[width] = seq, buf
+            self.encoded += 1
+            return seq, buf
+
+    def stream(self, width=None):
+        """Generator of multipart MJPEG chunks for one client, yielding each new frame at most once."""
+        with self.cond:
+            self.clients += 1
+        last = 0
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.seq > last or self.closed, timeout=5.0)
+                    if self.closed:
+                        break
+                    if self.seq == last:
+                        continue
+                last, buf = self.jpeg(width)
+                if buf is not None:
+                    yield b"--" + BOUNDARY.encode() + b"\r\nContent-Type: image/jpeg\r\n\r\n" + buf + b"\r\n"
+        finally:
+            with self.cond:
+                self.clients -= 1
+
+    def status(self):
+        """Returns a JSON-serializable status dict of this stream."""
+        frame, age = self.frame, time.time() - self.t
+        return {
+            "camera_status": frame is not None and age < 5.0,
+            "frames": self.seq,
+            "lastFrameAge": round(age, 3) if frame is not None else None,
+            "width": frame.shape[1] if frame is not None else None,
+            "height": frame.shape[0] if frame is not None else None,
+            "clients": self.clients,
+            "encoded": self.encoded,
+        }
+
+
+def add_stream_routes(app, lookup):
+    """
+    Adds MJPEG routes to Flask `app`; `lookup(cam_id)` returns the FrameBroadcaster of `cam_id`, or None if unknown,
+    with `cam_id=None` selecting the default stream.
+
+    GET /video_feed[/<cam_id>][?width=640]   MJPEG stream
+    GET /test_image[/<cam_id>][?width=640]   latest frame as a single JPEG
+    GET /camera_status[/<cam_id>]            stream status
+    """
+
+    @app.route("/video_feed", defaults={"cam_id": None})
+    @app.route("/video_feed/<cam_id>")
+    def video_feed(cam_id):
+        """Streams annotated frames as multipart MJPEG."""
+        broadcaster = lookup(cam_id)
+        if broadcaster is None:
+            return jsonify(error=f"stream '{cam_id}' not found"), 404
+        return Response(
+            broadcaster.stream(request.args.get("width", type=int)),
+            mimetype=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
+            headers={"Cache-Control": "no-store"},
+        )
+
+    @app.route("/test_image", defaults={"cam_id": None})
+    @app.route("/test_image/<cam_id>")
+    def test_image(cam_id):
+        """Returns the latest annotated frame as a JPEG."""
+        broadcaster = lookup(cam_id)
+        _, buf = broadcaster.jpeg(request.args.get("width", type=int)) if broadcaster else (0, None)
+        if buf is None:
+            return jsonify(error=f"no frame available for stream '{cam_id}'"), 404
+        return Response(buf, mimetype="image/jpeg", headers={"Cache-Control": "no-store"})
+
+    @app.route("/camera_status", defaults={"cam_id": None})
+    @app.route("/camera_status/<cam_id>")
+    def camera_status(cam_id):
+        """Returns the stream status; camera_status is False for unknown or stalled streams."""
+        broadcaster = lookup(cam_id)
+        if broadcaster is None:
+            return jsonify(camera_status=False, error=f"stream '{cam_id}' not found"), 404
+        return jsonify(broadcaster.status())
+
+    return app
+
+
+def serve(app, host="0.0.0.0", port=8000):
+    """Serves Flask `app` on a daemon thread, returning the server; call `server.shutdown()` to stop it."""
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request access log lines in the console
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+    LOGGER.info(f"Serving HTTP on http://{host}:{port}")
+    return server
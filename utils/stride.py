@@ -0,0 +1,73 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Adaptive frame-rate control adjusting a stream's vid_stride to keep per-frame latency within a budget."""
+
+import time
+
+
+class StrideController:
+    """
+    YOLOv5 StrideController class. Tracks an exponential moving average of end-to-end frame latency and returns the
+    vid_stride a stream should be read at.
+
+    Over budget the stride doubles, so load spikes are shed within one or two steps; below `headroom * budget` it
+    steps back down by one towards `min_stride`. Changes are at least `cooldown` seconds apart so queues can settle
+    before the latency is judged again. While a drone is tracked, and for `hold` frames after, the stream runs at
+    `min_stride` regardless of latency.
+
+        controller = StrideController(budget_ms=200)
+        dataset.vid_stride = controller.update(latency, tracking=len(det) > 0)
+    """
+
+    def __init__(self, budget_ms=200, min_stride=1, max_stride=8, hold=30, headroom=0.5, cooldown=1.0, alpha=0.2):
+        """Initializes the controller at `min_stride`."""
+        self.budget = budget_ms / 1e3
+        self.min_stride, self.max_stride = max(int(min_stride), 1), max(int(max_stride), int(min_stride), 1)
+        self.hold = hold
+        self.headroom = headroom
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.stride = self.min_stride
+        self.latency = None  # EMA of latency in seconds
+        self.hold_left = 0  # frames left at full rate after the last tracked drone
+        self.changed = 0.0  # time of the last stride change
+        self.changes, self.frames, self.strided_frames = 0, 0, 0
+
+    def update(self, latency, tracking=False):
+        """Adds one frame's end-to-end `latency` (s) and whether a drone is tracked, returning the stride to use."""
+        self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+        self.frames += 1
+        self.strided_frames += self.stride > self.min_stride
+        if tracking:
+            self.hold_left = self.hold
+        stride = self.stride
+        if self.hold_left > 0:
+            self.hold_left -= 1
+            stride = self.min_stride
+        elif time.time() - self.changed < self.cooldown:
+            return self.stride
+        elif self.latency > self.budget:
+            stride = min(self.stride * 2, self.max_stride)
+        elif self.latency < self.budget * self.headroom:
+            stride = max(self.stride - 1, self.min_stride)
+        if stride != self.stride:
+            self.stride, self.changed = stride, time.time()
+            self.changes += 1
+        return self.stride
+
+    def stats(self):
+        """Returns a dict with the current stride, latency EMA (ms) and adjustment counts."""
+        return {
+            "stride": self.stride,
+            "latency_ms": (self.latency or 0.0) * 1e3,
+            "budget_ms": self.budget * 1e3,
+            "changes": self.changes,
+            "strided": self.strided_frames / max(self.frames, 1),
+        }
+
+    def summary(self):
+        """Returns a one-line human-readable summary of the controller state."""
+        s = self.stats()
+        return (
+            f"vid_stride {s['stride']} (latency {s['latency_ms']:.0f}/{s['budget_ms']:.0f}ms, {s['changes']} changes, "
+            f"{s['strided']:.0%} of frames strided)"
+        )
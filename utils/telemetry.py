@@ -0,0 +1,255 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Latency histograms, counters and gauges of the detection loop, exposed through a pull-based metrics endpoint."""
+
+import math
+import threading
+import time
+
+import numpy as np
+from flask import Response, jsonify, request
+
+from utils.general import Profile
+
+QUANTILES = 0.5, 0.95, 0.99
+
+
+class Histogram:
+    """
+    YOLOv5 Histogram class. Constant-memory latency histogram with log-spaced buckets.
+
+    Buckets are `per_decade` per factor of 10 between `low` and `high` seconds, so quantiles have a relative error of
+    at most 10 ** (1 / per_decade) - 1 (~12% by default) at any scale. `observe()` is O(1). Quantiles are computed over
+    a sliding `window` of seconds, kept as `slots` rotating sub-windows, so they follow the current behaviour of a
+    long-running process; the count and sum cover its whole lifetime.
+    """
+
+    def __init__(self, low=1e-5, high=100.0, per_decade=20, window=60.0, slots=6):
+        """Initializes empty buckets."""
+        self.low, self.per_decade = low, per_decade
+        n = math.ceil(math.log10(high / low) * per_decade) + 2  # plus underflow and overflow buckets
+        self.bounds = low * 10 ** (np.arange(n - 1) / per_decade)  # upper bounds, the last bucket is unbounded
+        self.slot_seconds = window / slots
+        self.counts = np.zeros((slots, n), dtype=np.int64)
+        self.epochs = np.full(slots, -1, dtype=np.int64)  # sub-window number held by each slot
+        self.count, self.sum = 0, 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Records one duration in seconds."""
+        i = 0 if seconds <= self.low else min(int(math.log10(seconds / self.low) * self.per_decade) + 1,
+                                              self.counts.shape[1] - 1)
+        epoch = int(time.time() / self.slot_seconds)
+        slot = epoch % len(self.epochs)
+        with self.lock:
+            if self.epochs[slot] != epoch:  # reuse the slot of an expired sub-window
+                self.counts[slot] = 0
+                self.epochs[slot] = epoch
+            self.counts[slot, i] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def window_counts(self):
+        """Returns the bucket counts over the sliding window."""
+        epoch = int(time.time() / self.slot_seconds)
+        with self.lock:
+            return self.counts[self.epochs > epoch - len(self.epochs)].sum(0)
+
+    def quantiles(self, qs=QUANTILES, counts=None):
+        """Returns the quantiles `qs` in seconds over the sliding window, or of bucket `counts` (i.e. the difference of
+        two `window_counts()`), None if there are no observations.
+        """
+        counts = self.window_counts() if counts is None else counts
+        total = counts.sum()
+        if not total:
+            return [None] * len(qs)
+        cum = counts.cumsum()
+        out = []
+        for q in qs:
+            i = int(np.searchsorted(cum, q * total))
+            upper = self.bounds[min(i, len(self.bounds) - 1)]
+            lower = self.bounds[i - 1] if 0 < i <= len(self.bounds) else upper
+            out.append(float(math.sqrt(lower * upper)))  # geometric bucket midpoint
+        return out
+
+
+class Metrics:
+    """
+    YOLOv5 Metrics class. Registry of latency histograms, counters and gauges identified by name and labels.
+
+    Histograms and counters are updated where things happen; gauges and callback counters are functions evaluated
+    only when metrics are read, i.e. queue depths or buffer sizes, so they cost nothing on the hot path. `prometheus()`
+    renders everything in the Prometheus text format (histograms as summaries with p50/p95/p99) and `snapshot()` as a
+    JSON-serializable dict. `METRICS` is the process-wide registry.
+
+        METRICS.observe("forward", 0.012)
+        METRICS.inc("frames_processed", stream="0")
+        METRICS.gauge("queue_depth", lambda: len(queue), queue="infer")
+        with METRICS.time("forward", device=model.device):
+            pred = model(im)
+    """
+
+    def __init__(self, prefix="drone_", window=60.0):
+        """Initializes an empty registry; `prefix` is prepended to metric names in the Prometheus output and `window` is
+        the sliding window in seconds of histograms created from now on.
+        """
+        self.prefix = prefix
+        self.window = window
+        self.histograms, self.counters, self.gauges = {}, {}, {}  # (name, labels) -> Histogram, value or fn
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        """Returns the registry key of metric `name` with `labels`."""
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def histogram(self, name, **labels):
+        """Returns the latency histogram `name` with `labels`, creating it if needed."""
+        key = self._key(name, labels)
+        h = self.histograms.get(key)
+        if h is None:
+            with self.lock:
+                h = self.histograms.setdefault(key, Histogram(window=self.window))
+        return h
+
+    def observe(self, name, seconds, **labels):
+        """Records a duration of `seconds` in histogram `name`."""
+        self.histogram(name, **labels).observe(seconds)
+
+    def time(self, name, device=None, **labels):
+        """Returns a context manager timing its block into histogram `name`, synchronizing CUDA `device` if given."""
+        return Timer(self.histogram(name, **labels), device)
+
+    def iterate(self, iterable, name, **labels):
+        """Yields the items of `iterable`, timing the wait for each one into histogram `name`."""
+        h = self.histogram(name, **labels)
+        it = iter(iterable)
+        while True:
+            t = time.time()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            h.observe(time.time() - t)
+            yield item
+
+    def inc(self, name, n=1, **labels):
+        """Adds `n` to counter `name`."""
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def counter(self, name, fn, **labels):
+        """Registers counter `name` whose value is read from `fn()`, i.e. an existing drop count."""
+        with self.lock:
+            self.counters[self._key(name, labels)] = fn
+
+    def gauge(self, name, fn, **labels):
+        """Registers gauge `name` whose value is read from `fn()`."""
+        with self.lock:
+            self.gauges[self._key(name, labels)] = fn
+
+    def remove(self, **labels):
+        """Removes all metrics having `labels`, i.e. those of a removed camera."""
+        match = set((k, str(v)) for k, v in labels.items())
+        with self.lock:
+            for metrics in (self.histograms, self.counters, self.gauges):
+                for key in [k for k in metrics if match <= set(k[1])]:
+                    del metrics[key]
+
+    def _values(self, metrics):
+        """Returns [(key, value)] of counters or gauges, calling the registered functions."""
+        with self.lock:
+            items = list(metrics.items())
+        values = []
+        for key, v in items:
+            try:
+                values.append((key, float(v() if callable(v) else v)))
+            except Exception:
+                continue  # the object behind a callback is gone or not ready
+        return values
+
+    def snapshot(self):
+        """Returns all metrics as a dict with latencies in ms at p50, p95 and p99."""
+        with self.lock:
+            histograms = list(self.histograms.items())
+        latency = []
+        for (name, labels), h in histograms:
+            p = [None if x is None else round(x * 1e3, 3) for x in h.quantiles()]
+            mean = round(h.sum / h.count * 1e3, 3) if h.count else None
+            latency.append({"name": name, **dict(labels), "count": h.count, "mean_ms": mean,
+                            "p50_ms": p[0], "p95_ms": p[1], "p99_ms": p[2]})
+        return {
+            "latency": latency,
+            "counters": [{"name": n, **dict(labels), "value": v} for (n, labels), v in self._values(self.counters)],
+            "gauges": [{"name": n, **dict(labels), "value": v} for (n, labels), v in self._values(self.gauges)],
+        }
+
+    def prometheus(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+
+        def series(name, labels, extra=()):
+            s = ",".join(f'{k}="{v}"' for k, v in (*labels, *extra))
+            return f"{self.prefix}{name}{{{s}}}" if s else f"{self.prefix}{name}"
+
+        lines, typed = [], set()
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        for (name, labels), h in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {self.prefix}{name}_seconds summary")
+            for q, v in zip(QUANTILES, h.quantiles()):
+                v = "NaN" if v is None else f"{v:.6g}"
+                lines.append(f"{series(name + '_seconds', labels, [('quantile', q)])} {v}")
+            lines.append(f"{series(name + '_seconds_sum', labels)} {h.sum:.6g}")
+            lines.append(f"{series(name + '_seconds_count', labels)} {h.count}")
+        for kind, metrics, suffix in (("counter", self.counters, "_total"), ("gauge", self.gauges, "")):
+            for (name, labels), v in sorted(self._values(metrics)):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {self.prefix}{name}{suffix} {kind}")
+                lines.append(f"{series(name + suffix, labels)} {v:.6g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, names=None):
+        """Returns a one-line human-readable summary of the p50/p95/p99 latencies of histograms `names` (all)."""
+        parts = []
+        for row in self.snapshot()["latency"]:
+            if row["p50_ms"] is not None and (names is None or row["name"] in names):
+                labels = ",".join(str(v) for k, v in row.items() if k not in ("name", "count") and "_ms" not in k)
+                name = f"{row['name']}[{labels}]" if labels else row["name"]
+                parts.append(f"{name} {row['p50_ms']:.1f}/{row['p95_ms']:.1f}/{row['p99_ms']:.1f}")
+        return "latency p50/p95/p99 ms: " + (", ".join(parts) or "no samples")
+
+
+class Timer(Profile):
+    # YOLOv5 Timer class. Profile observing the duration of every 'with' block into a Histogram
+    def __init__(self, histogram, device=None):
+        """Initializes the timer; a CUDA `device` is synchronized on entry and exit so GPU work is attributed."""
+        super().__init__(device=device)
+        self.histogram = histogram
+
+    def __exit__(self, type, value, traceback):
+        """Stops timing and observes the duration."""
+        super().__exit__(type, value, traceback)
+        self.histogram.observe(self.dt)
+
+
+METRICS = Metrics()  # process-wide registry
+
+
+def add_metrics_routes(app, metrics=METRICS):
+    """
+    Adds metrics routes for `metrics` to Flask `app`.
+
+    GET /metrics[?format=json]  Prometheus text format, or JSON with p50/p95/p99 latencies in ms
+    """
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        """Returns all metrics, in the Prometheus text format unless `format=json`."""
+        if request.args.get("format") == "json":
+            return jsonify(metrics.snapshot())
+        return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+    return app
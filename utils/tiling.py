@@ -0,0 +1,119 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Sliced inference: overlapping native-resolution tiles run as one batch, merged back into frame coordinates."""
+
+import math
+
+import numpy as np
+import torch
+import torchvision
+
+from utils.augmentations import letterbox
+from utils.general import scale_boxes
+from utils.metrics import box_iou
+
+TILE_MERGES = "nms", "fuse"  # keep the best box of each overlapping cluster, or its confidence-weighted average
+
+
+def tile_grid(h, w, size=640, overlap=0.2, max_tiles=16):
+    """Returns (x1, y1, x2, y2) tiles of side `size` covering an `h` x `w` frame with at least `overlap` (fraction)
+    between neighbours; the tile side grows until at most `max_tiles` tiles are needed.
+    """
+    while True:
+        step = max(int(size * (1 - overlap)), 1)
+        nx = math.ceil(max(w - size, 0) / step) + 1
+        ny = math.ceil(max(h - size, 0) / step) + 1
+        if nx * ny <= max_tiles or size >= max(h, w):
+            break
+        size = int(size * 1.25)  # larger tiles, downscaled to the model input size
+    xs = np.linspace(0, max(w - size, 0), nx).round().astype(int)
+    ys = np.linspace(0, max(h - size, 0), ny).round().astype(int)
+    return [(x, y, min(x + size, w), min(y + size, h)) for y in ys.tolist() for x in xs.tolist()]
+
+
+def crop_batch(im0s, regions, size=640):
+    """Crops `regions[i]` (x1, y1, x2, y2) from each BGR frame `im0s[i]` and letterboxes them to `size` x `size`,
+    downscaling but never upscaling them, returning a (n, 3, size, size) RGB uint8 batch and the (frame index, region,
+    (ratio, pad)) of every crop.
+    """
+    crops, index = [], []
+    for i, (im0, boxes) in enumerate(zip(im0s, regions)):
+        for x1, y1, x2, y2 in boxes:
+            im, ratio, pad = letterbox(im0[y1:y2, x1:x2], size, auto=False, scaleup=False)
+            crops.append(im)
+            index.append((i, (x1, y1, x2, y2), (ratio, pad)))
+    im = np.stack(crops)[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
+    return np.ascontiguousarray(im), index
+
+
+def merge_crops(preds, index, n, size=640, iou_thres=0.45, agnostic=False, max_det=1000, merge="nms"):
+    """Maps per-crop detections `preds` (NMS output for a `crop_batch()` batch) back to frame coordinates and merges
+    duplicates from overlapping crops, returning one (k, 6) detection tensor per frame for `n` frames.
+    """
+    assert merge in TILE_MERGES, f"invalid tile merge '{merge}', valid merges are {TILE_MERGES}"
+    per_frame = [[] for _ in range(n)]
+    for det, (i, (x1, y1, x2, y2), ratio_pad) in zip(preds, index):
+        if len(det):  # small crops are padded rather than scaled up, so map back with their own ratio and padding
+            det[:, :4] = scale_boxes((size, size), det[:, :4], (y2 - y1, x2 - x1), ratio_pad)
+            det[:, [0, 2]] += x1
+            det[:, [1, 3]] += y1
+            per_frame[i].append(det)
+
+    out = []
+    for dets in per_frame:
+        if not dets:
+            out.append(preds[0].new_zeros((0, 6)))
+            continue
+        det = torch.cat(dets)
+        c = det[:, 5:6] * (0 if agnostic else 7680)  # class offsets so boxes only suppress boxes of their class
+        keep = torchvision.ops.nms(det[:, :4] + c, det[:, 4], iou_thres)[:max_det]
+        if merge == "fuse":  # confidence-weighted average of every box overlapping a kept box
+            boxes = det[:, :4] + c
+            cluster = box_iou(boxes[keep], boxes) > iou_thres
+            cluster[torch.arange(len(keep)), keep] = True  # degenerate boxes still fuse with themselves
+            w = cluster * det[:, 4]
+            fused = det[keep].clone()
+            fused[:, :4] = (w @ det[:, :4]) / w.sum(1, keepdim=True)
+            out.append(fused)
+        else:
+            out.append(det[keep])
+    return out
+
+
+class Tiler:
+    """
+    YOLOv5 Tiler class. Cuts frames into overlapping native-resolution tiles, plus an optional downscaled full-frame
+    view for large targets, so that all of them run through the model as one `size` x `size` batch.
+
+        tiler = Tiler(640, overlap=0.2, max_tiles=16)
+        im, index = tiler.batch(im0s)
+        pred = non_max_suppression(model(preprocess(im, model)), conf_thres, iou_thres)
+        dets = tiler.merge(pred, index, len(im0s), iou_thres)  # per-frame detections in im0 coordinates
+    """
+
+    def __init__(self, size=640, overlap=0.2, max_tiles=16, full_frame=True, merge="nms"):
+        """Initializes the tiler; `size` is the model input size and the native tile side."""
+        assert merge in TILE_MERGES, f"invalid tile merge '{merge}', valid merges are {TILE_MERGES}"
+        self.size = size
+        self.overlap = overlap
+        self.max_tiles = max_tiles
+        self.full_frame = full_frame
+        self.merge_mode = merge
+        self.grids = {}  # (h, w) -> tiles
+
+    def regions(self, shape):
+        """Returns the tiles, and the full frame if enabled, for frames of `shape`."""
+        h, w = shape[:2]
+        if (h, w) not in self.grids:
+            tiles = tile_grid(h, w, self.size, self.overlap, self.max_tiles)
+            if self.full_frame and len(tiles) > 1:
+                tiles.append((0, 0, w, h))
+            self.grids[(h, w)] = tiles
+        return self.grids[(h, w)]
+
+    def batch(self, im0s):
+        """Returns the crop batch for frames `im0s` and the (frame index, region, (ratio, pad)) of each crop."""
+        return crop_batch(im0s, [self.regions(im0.shape) for im0 in im0s], self.size)
+
+    def merge(self, preds, index, n, iou_thres=0.45, agnostic=False, max_det=1000):
+        """Returns one detection tensor per frame in frame coordinates, see `merge_crops()`."""
+        return merge_crops(preds, index, n, self.size, iou_thres, agnostic, max_det, self.merge_mode)
@@ -0,0 +1,193 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Multi-object tracking with Kalman prediction and two-stage IoU/Hungarian association (SORT/ByteTrack style)."""
+
+import itertools
+import time
+
+import torch
+from scipy.optimize import linear_sum_assignment
+
+from utils.metrics import box_iou
+
+TRACK_EVENTS = "new", "updated", "lost"
+_ids = itertools.count(1)  # track ids are unique across all trackers of the process
+
+# Constant-velocity model over (cx, cy, w, h, vcx, vcy, vw, vh), process noise relative to the box size as in ByteTrack
+_F = torch.eye(8)
+_F[:4, 4:] = torch.eye(4)
+_STD_POSITION, _STD_VELOCITY = 1 / 20, 1 / 160
+
+
+def xyxy2cxcywh(boxes):
+    """Converts (n, 4) boxes from x1, y1, x2, y2 to cx, cy, w, h."""
+    return torch.cat(((boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]), 1)
+
+
+def cxcywh2xyxy(boxes):
+    """Converts (n, 4) boxes from cx, cy, w, h to x1, y1, x2, y2."""
+    return torch.cat((boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2), 1)
+
+
+class Tracker:
+    """
+    YOLOv5 Tracker class. Follows detections across frames and gives every object a persistent track id.
+
+    All tracks are held as stacked tensors: one batched Kalman predict per frame, one (tracks x detections) IoU matrix
+    from `box_iou` per association stage solved with the Hungarian algorithm, and one batched Kalman update for all
+    matches. Detections at or above `high_thres` are associated first and may start tracks; lower-confidence
+    detections can only continue existing tracks (ByteTrack). A track is confirmed after `min_hits` matches and lost
+    after `max_age` frames without one.
+
+    `update()` returns the tracks matched in the frame as (n, 7) x1, y1, x2, y2, conf, cls, id rows, and the frame's
+    track events as dicts: `new` when a track is confirmed, `updated` for every confirmed match and `lost` when a
+    confirmed track ends.
+
+        tracker = Tracker(high_thres=0.5)
+        tracks, events = tracker.update(det)  # det in frame coordinates
+    """
+
+    def __init__(self, high_thres=0.5, iou_thres=0.2, min_hits=2, max_age=30):
+        """Initializes an empty tracker."""
+        self.high_thres = high_thres
+        self.iou_thres = iou_thres  # minimum IoU between a predicted track box and its detection
+        self.min_hits = min_hits
+        self.max_age = max_age
+        self.frame = 0
+        self.mean = torch.zeros((0, 8))  # Kalman state per track
+        self.cov = torch.zeros((0, 8, 8))
+        self.info = torch.zeros((0, 8))  # id, cls, conf, max conf, hits, misses, first frame, confirmed
+        self.counts = dict.fromkeys(TRACK_EVENTS, 0)
+        self.track_t = 0.0  # accumulated seconds spent in update()
+
+    def __len__(self):
+        """Returns the number of confirmed tracks."""
+        return int(self.info[:, 7].sum())
+
+    def predict(self):
+        """Advances every track one frame, returning the predicted (n, 4) x1, y1, x2, y2 boxes."""
+        if len(self.mean):
+            size = self.mean[:, 2:4].repeat(1, 2)  # w, h, w, h
+            q = torch.cat((_STD_POSITION * size, _STD_VELOCITY * size), 1) ** 2
+            self.mean = self.mean @ _F.T
+            self.cov = _F @ self.cov @ _F.T + torch.diag_embed(q)
+        return cxcywh2xyxy(self.mean[:, :4])
+
+    def _correct(self, i, boxes):
+        """Kalman update of tracks `i` with measured (n, 4) x1, y1, x2, y2 `boxes`."""
+        z = xyxy2cxcywh(boxes)
+        r = torch.diag_embed((_STD_POSITION * z[:, 2:4].repeat(1, 2)) ** 2)
+        cov = self.cov[i]
+        s = cov[:, :4, :4] + r  # innovation covariance
+        k = cov[:, :, :4] @ torch.linalg.inv(s)  # Kalman gain
+        self.mean[i] = self.mean[i] + (k @ (z - self.mean[i, :4])[..., None])[..., 0]
+        self.cov[i] = cov - k @ cov[:, :4, :]
+
+    def _match(self, tracks, predicted, det):
+        """Returns (track index, detection index) pairs of an optimal IoU assignment above `iou_thres`."""
+        if not len(tracks) or not len(det):
+            return torch.zeros(0, dtype=torch.long), torch.zeros(0, dtype=torch.long)
+        iou = box_iou(predicted[tracks], det[:, :4])
+        iou *= self.info[tracks, 1:2] == det[None, :, 5]  # only associate boxes of the same class
+        t, d = linear_sum_assignment(-iou.numpy())
+        t, d = torch.as_tensor(t, dtype=torch.long), torch.as_tensor(d, dtype=torch.long)
+        ok = iou[t, d] >= self.iou_thres
+        return tracks[t[ok]], d[ok]
+
+    def update(self, det):
+        """Associates (n, 6) x1, y1, x2, y2, conf, cls detections with the tracks, returning (tracks, events)."""
+        t = time.time()
+        self.frame += 1
+        det = det[:, :6].detach().float().cpu()
+        predicted = self.predict()
+        all_tracks = torch.arange(len(self.mean))
+
+        # Two-stage association: confident detections against all tracks, then the rest against unmatched tracks
+        high = det[:, 4] >= self.high_thres
+        ti, di = self._match(all_tracks, predicted, det[high])
+        di = torch.nonzero(high)[:, 0][di]
+        unmatched = torch.ones(len(all_tracks), dtype=torch.bool)
+        unmatched[ti] = False
+        ti2, di2 = self._match(all_tracks[unmatched], predicted, det[~high])
+        di2 = torch.nonzero(~high)[:, 0][di2]
+        ti, di = torch.cat((ti, ti2)), torch.cat((di, di2))
+
+        # Update matched tracks
+        info = self.info
+        if len(ti):
+            self._correct(ti, det[di, :4])
+            info[ti, 1], info[ti, 2] = det[di, 5], det[di, 4]
+            info[ti, 3] = torch.maximum(info[ti, 3], det[di, 4])
+            info[ti, 4] += 1
+            info[ti, 5] = 0
+        missed = torch.ones(len(info), dtype=torch.bool)
+        missed[ti] = False
+        info[missed, 5] += 1
+        confirmed_before = info[:, 7].bool()
+        info[:, 7] = (info[:, 7].bool() | (info[:, 4] >= self.min_hits)).float()
+
+        # Start tentative tracks from unmatched confident detections
+        new = high.clone()
+        new[di] = False
+        n = int(new.sum())
+        if n:
+            z = xyxy2cxcywh(det[new, :4])
+            size = z[:, 2:4].repeat(1, 2)
+            self.mean = torch.cat((self.mean, torch.cat((z, torch.zeros_like(z)), 1)))
+            std = torch.cat((2 * _STD_POSITION * size, 10 * _STD_VELOCITY * size), 1)
+            self.cov = torch.cat((self.cov, torch.diag_embed(std**2)))
+            ids = torch.tensor([next(_ids) for _ in range(n)], dtype=torch.float)
+            first = torch.full((n,), float(self.frame))
+            c, conf, ones = det[new, 5], det[new, 4], torch.ones(n)
+            confirmed = (ones >= self.min_hits).float()
+            info = torch.cat((info, torch.stack((ids, c, conf, conf, ones, 0 * ones, first, confirmed), 1)))
+            ti = torch.cat((ti, torch.arange(len(self.mean) - n, len(self.mean))))
+            di = torch.cat((di, torch.nonzero(new)[:, 0]))
+            confirmed_before = torch.cat((confirmed_before, torch.zeros(n, dtype=torch.bool)))
+
+        # Events, then drop lost confirmed tracks and tentative tracks that missed a frame
+        confirmed = info[:, 7].bool()
+        events = [
+            self._event("updated" if confirmed_before[i] else "new", info[i], det[d, :4])
+            for i, d in zip(ti.tolist(), di.tolist())
+            if confirmed[i]
+        ]
+        dead = (info[:, 5] > self.max_age) | (~confirmed & (info[:, 5] > 0))
+        boxes = cxcywh2xyxy(self.mean[:, :4])
+        events += [self._event("lost", info[i], boxes[i]) for i in torch.nonzero(dead & confirmed)[:, 0].tolist()]
+        shown = confirmed[ti]
+        tracks = torch.cat((det[di[shown]], info[ti[shown], :1]), 1)
+        self.mean, self.cov, self.info = self.mean[~dead], self.cov[~dead], info[~dead]
+        for e in events:
+            self.counts[e["event"]] += 1
+        self.track_t += time.time() - t
+        return tracks, events
+
+    def _event(self, kind, info, box):
+        """Returns a JSON-serializable track event dict."""
+        return {
+            "event": kind,
+            "id": int(info[0]),
+            "cls": int(info[1]),
+            "conf": float(info[2]),
+            "maxConf": float(info[3]),
+            "hits": int(info[4]),
+            "frames": self.frame - int(info[6]) + 1,
+            "box": [round(float(x), 1) for x in box],
+        }
+
+    def stats(self):
+        """Returns a dict with the live track count, track event counts and the mean update time (ms)."""
+        return {
+            "tracks": len(self),
+            "tentative": len(self.info) - len(self),
+            **self.counts,
+            "track_ms": self.track_t / max(self.frame, 1) * 1e3,
+        }
+
+    def summary(self):
+        """Returns a one-line human-readable summary of the tracker state."""
+        s = self.stats()
+        return (
+            f"tracker: {s['tracks']} tracks ({s['tentative']} tentative), {s['new']} new, {s['lost']} lost, "
+            f"{s['track_ms']:.2f}ms/frame"
+        )
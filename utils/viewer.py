@@ -0,0 +1,72 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Optional OpenCV viewer sampling annotated frames at display rate on its own thread."""
+
+import threading
+import time
+
+import cv2
+
+from utils.general import LOGGER
+
+
+class Viewer:
+    """
+    YOLOv5 Viewer class. Shows the most recent submitted frame in an OpenCV window at up to `fps` frames per second.
+
+    All GUI calls (`namedWindow`, `imshow`, `waitKey`) happen on the viewer thread, so the detection loop never waits
+    on the window system. The loop asks `wants_frame()` before rendering annotations and hands frames over with
+    `submit()`; frames submitted faster than `fps` replace each other. Pressing 'q' in the window sets `stop_event`.
+    """
+
+    def __init__(self, name="Drone Detection", fps=30, size=(1280, 720), stop_event=None):
+        """Initializes the viewer and starts its display thread."""
+        self.name = name
+        self.interval = 1 / fps
+        self.size = size
+        self.stop_event = stop_event or threading.Event()
+        self.frame = None
+        self.last = 0.0  # time the last frame was sampled
+        self.cond = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="viewer", daemon=True)
+        self.thread.start()
+
+    def wants_frame(self):
+        """Returns True if a frame submitted now would be displayed, i.e. the display interval has elapsed."""
+        return time.time() - self.last >= self.interval
+
+    def submit(self, frame):
+        """Offers `frame` for display; ignored unless `wants_frame()`. The frame must not be modified afterwards."""
+        if not self.wants_frame():
+            return
+        with self.cond:
+            self.frame = frame
+            self.last = time.time()
+            self.cond.notify()
+
+    def close(self):
+        """Closes the window and stops the display thread."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join(2.0)
+
+    def _run(self):
+        """Display thread: shows frames as they arrive and polls the keyboard for 'q'."""
+        try:
+            cv2.namedWindow(self.name, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(self.name, *self.size)
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.frame is not None or self.closed, timeout=self.interval)
+                    frame, self.frame = self.frame, None
+                    if self.closed:
+                        break
+                if frame is not None:
+                    cv2.imshow(self.name, frame)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    self.stop_event.set()
+            cv2.destroyWindow(self.name)
+            cv2.waitKey(1)
+        except cv2.error as e:
+            LOGGER.warning(f"WARNING ⚠️ viewer disabled, cv2.imshow() is not supported: {e}")
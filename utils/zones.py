@@ -0,0 +1,147 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""Restricted-area zones: polygons rasterized once into summed-area tables for O(1) box overlaps."""
+
+import json
+import threading
+
+import cv2
+import numpy as np
+
+
+def load_zones(path):
+    """Loads zones from a JSON file holding a list of zones or {"zones": [...]}, each zone a dict with `points`
+    ([[x, y], ...] in pixels, or fractions of the frame size with `"normalized": true`) and optional `name` and
+    `minOverlap` (fraction of a box inside the zone counted as a hit, default 0: any overlap).
+    """
+    with open(path) as f:
+        zones = json.load(f)
+    return zones["zones"] if isinstance(zones, dict) else zones
+
+
+class Zones:
+    """
+    YOLOv5 Zones class. Tests boxes against any number of arbitrary polygons of one camera.
+
+    When zones are set or the frame size changes, every polygon is drawn once into a mask (at most `max_side` pixels
+    on the long side) and a summed-area table is built from it, one per zone. The pixel count of a box
+    inside a zone is then four table lookups, so `overlap()` costs O(zones) per box regardless of the box size and
+    is vectorized over all boxes and zones. `update()` additionally reports when a track enters a zone, as
+    `zone-entry` track events. Zones may be replaced from another thread while frames are processed.
+
+        zones = Zones(load_zones("zones.json"))
+        hits, entries = zones.update(tracks, im0.shape)  # (n, zones) bool, [{"event": "zone-entry", ...}, ...]
+        zones.draw(im0, hits.any(0))
+    """
+
+    def __init__(self, zones=(), max_side=960):
+        """Initializes the zones; see `load_zones()` for the zone format."""
+        assert max_side > 0, "max_side must be positive"
+        self.max_side = max_side
+        self.lock = threading.Lock()  # guards the zones and their masks
+        self.intrusions = 0
+        self.set(zones)
+
+    def __len__(self):
+        """Returns the number of zones."""
+        return len(self.zones)
+
+    def set(self, zones):
+        """Replaces the zones, invalidating the rasterized masks."""
+        zones = [
+            {
+                "name": z.get("name", f"zone{i}"),
+                "points": np.asarray(z["points"], dtype=np.float64).reshape(-1, 2),
+                "normalized": bool(z.get("normalized", False)),
+                "minOverlap": float(z.get("minOverlap", 0.0)),
+            }
+            for i, z in enumerate(zones)
+        ]
+        with self.lock:
+            self.zones = zones
+            self.names = [z["name"] for z in zones]
+            self.min_overlap = np.array([z["minOverlap"] for z in zones])
+            self.raster = None  # (frame h, w), scale, summed-area tables
+            self.inside = set()  # (track id, zone index) of tracks currently inside a zone
+
+    def polygons(self, shape):
+        """Returns the zone polygons as int32 (k, 2) pixel arrays for frames of `shape`."""
+        h, w = shape[:2]
+        return [(z["points"] * ((w, h) if z["normalized"] else 1)).round().astype(np.int32) for z in self.zones]
+
+    def rasterize(self, shape):
+        """Returns the (scale, summed-area tables) of frames of `shape`, rebuilding them on size change."""
+        h, w = shape[:2]
+        if self.raster is None or self.raster[0] != (h, w):
+            scale = min(self.max_side / max(h, w), 1.0)
+            rh, rw = max(round(h * scale), 1), max(round(w * scale), 1)
+            sat = np.zeros((len(self.zones), rh + 1, rw + 1), dtype=np.int32)
+            mask = np.zeros((rh, rw), dtype=np.uint8)
+            for i, points in enumerate(self.polygons(shape)):
+                mask[:] = 0
+                cv2.fillPoly(mask, [(points * scale).round().astype(np.int32)], 1)
+                sat[i] = cv2.integral(mask)
+            self.raster = (h, w), scale, sat
+        return self.raster[1:]
+
+    def overlap(self, boxes, shape):
+        """Returns the (n, zones) fraction of each x1, y1, x2, y2 box in frame coordinates lying inside each zone."""
+        boxes = boxes.cpu().numpy() if hasattr(boxes, "cpu") else np.asarray(boxes)
+        if not len(self.zones) or not len(boxes):
+            return np.zeros((len(boxes), len(self.zones)))
+        scale, sat = self.rasterize(shape)
+        rh, rw = sat.shape[1] - 1, sat.shape[2] - 1
+        b = boxes[:, :4] * scale
+        x1 = np.clip(np.floor(b[:, 0]), 0, rw - 1).astype(int)
+        y1 = np.clip(np.floor(b[:, 1]), 0, rh - 1).astype(int)
+        x2 = np.clip(np.ceil(b[:, 2]), x1 + 1, rw).astype(int)  # at least one pixel per box
+        y2 = np.clip(np.ceil(b[:, 3]), y1 + 1, rh).astype(int)
+        inside = sat[:, y2, x2] - sat[:, y1, x2] - sat[:, y2, x1] + sat[:, y1, x1]  # (zones, n) pixel counts
+        return (inside / ((x2 - x1) * (y2 - y1))).T
+
+    def hits(self, boxes, shape):
+        """Returns an (n, zones) bool array of boxes overlapping each zone by more than its `minOverlap`."""
+        overlap = self.overlap(boxes, shape)
+        return np.where(self.min_overlap > 0, overlap >= self.min_overlap, overlap > 0)
+
+    def update(self, tracks, shape, lost=()):
+        """Tests (n, 7) x1, y1, x2, y2, conf, cls, id `tracks` against the zones, returning the (n, zones) hits and
+        a list of zone entries by tracks not inside that zone before; `lost` track ids are forgotten.
+        """
+        with self.lock:
+            overlap = self.overlap(tracks, shape)
+            hits = np.where(self.min_overlap > 0, overlap >= self.min_overlap, overlap > 0)
+            ids = [int(x) for x in tracks[:, 6].tolist()] if len(tracks) else []
+            pairs = list(zip(*(x.tolist() for x in np.nonzero(hits))))  # (track index, zone index)
+            current = {(ids[k], i) for k, i in pairs}
+            entries = [
+                {"event": "zone-entry", "id": ids[k], "zone": self.names[i], "overlap": round(float(overlap[k, i]), 3)}
+                for k, i in pairs
+                if (ids[k], i) not in self.inside
+            ]
+            # Tracks missing from this frame stay inside until they are seen outside or lost
+            seen = set(ids)
+            self.inside = {x for x in self.inside if x[0] not in seen and x[0] not in lost} | current
+            self.intrusions += len(entries)
+        return hits, entries
+
+    def draw(self, im0, active=None, line_thickness=2):
+        """Draws the zone outlines on `im0`, red with a warning for zones flagged in the bool array `active`."""
+        with self.lock:
+            polygons, names = self.polygons(im0.shape), self.names
+        for i, (points, name) in enumerate(zip(polygons, names)):
+            color = (0, 0, 255) if active is not None and active[i] else (0, 255, 0)
+            cv2.polylines(im0, [points], True, color, line_thickness)
+            x, y = points.min(0)
+            cv2.putText(im0, name, (int(x), max(int(y) - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        if active is not None and np.any(active):
+            warning = "Warning: Drone Detected Under Restricted Area! " + ", ".join(np.array(names)[active])
+            cv2.putText(im0, warning, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    def stats(self):
+        """Returns a dict with the zone count, tracks currently inside a zone and total zone entries."""
+        return {"zones": len(self.zones), "inside": len(self.inside), "intrusions": self.intrusions}
+
+    def summary(self):
+        """Returns a one-line human-readable summary of the zone state."""
+        s = self.stats()
+        return f"zones: {s['zones']} zones, {s['inside']} tracks inside, {s['intrusions']} intrusions"